@@ -4,12 +4,15 @@
 from serial.tools.list_ports import comports as list_comports
 
 import sys
+import threading
 
+from pocs.utils import current_time
 from pocs.utils.database import PanDB
 from pocs.utils.config import load_config
 from pocs.utils.logger import get_root_logger
 from pocs.utils.messaging import PanMessaging
 from pocs.utils.rs232 import SerialData
+from pocs.utils.telemetry import TelemetryArchive
 
 
 class ArduinoSerialMonitor(object):
@@ -17,9 +20,15 @@ class ArduinoSerialMonitor(object):
 
     Checks for the `camera_box` and `computer_box` entries in the config and tries to connect.
     Values are updated in the mongo db.
+
+    After `start` each board is read by its own thread, so that a slow board doesn't delay
+    the others. Each reading is time stamped as it arrives, kept as the latest reading of
+    its board (see `latest_readings`) and sent as a message straight away. Every
+    `aggregation_period` seconds the new readings of all the boards are stored together
+    in the db, as for `capture`.
     """
 
-    def __init__(self, auto_detect=False, *args, **kwargs):
+    def __init__(self, auto_detect=False, aggregation_period=None, *args, **kwargs):
         self.config = load_config(config_files='peas')
         self.logger = get_root_logger()
 
@@ -28,8 +37,21 @@ class ArduinoSerialMonitor(object):
             self.logger.warning('Environment config variable not set correctly. No sensors listed')
 
         self.db = None
+        self.archive = None
         self.messaging = None
 
+        if aggregation_period is None:
+            aggregation_period = self.config['environment'].get('aggregation_period', 60)
+        self.aggregation_period = aggregation_period
+
+        self._latest_readings = dict()
+        self._new_readings = set()
+        self._readings_lock = threading.Lock()
+        self._messaging_lock = threading.Lock()
+        self._stop_event = threading.Event()
+        self._store_result = False
+        self._threads = list()
+
         # Store each serial reader
         self.serial_readers = dict()
 
@@ -69,15 +91,98 @@ class ArduinoSerialMonitor(object):
             return None
 
     def disconnect(self):
+        self.stop()
         for sensor_name, reader_info in self.serial_readers.items():
             reader = reader_info['reader']
-            reader.stop()
+            if reader is not None:
+                reader.disconnect()
 
     def send_message(self, msg, topic='environment'):
-        if self.messaging is None:
-            self.messaging = PanMessaging.create_publisher(6510)
+        # The board threads share the publisher.
+        with self._messaging_lock:
+            if self.messaging is None:
+                self.messaging = PanMessaging.create_publisher(
+                    6510, encoding=self.config.get('messaging', {}).get('encoding', 'json'))
+
+            self.messaging.send_message(topic, msg)
+
+    @property
+    def is_running(self):
+        """True if the boards are being read by `start` """
+        return len(self._threads) > 0
+
+    def start(self, store_result=True, send_message=True):
+        """Read each board in its own thread until `stop` is called.
+
+        Args:
+            store_result (bool, optional): Store the new readings in the db every
+                `aggregation_period` seconds, default True.
+            send_message (bool, optional): Send each reading as it arrives, default True.
+        """
+        if self.is_running:
+            self.logger.debug('ArduinoSerialMonitor already running')
+            return
+
+        self._stop_event.clear()
+        self._store_result = store_result
+        for sensor_name, reader_info in self.serial_readers.items():
+            if reader_info['reader'] is None:
+                continue
+            self._threads.append(threading.Thread(
+                target=self._read_loop, name='read_{}'.format(sensor_name),
+                args=(sensor_name, reader_info['reader'], send_message), daemon=True))
+
+        if store_result:
+            self._threads.append(threading.Thread(
+                target=self._aggregate_loop, name='aggregate_environment', daemon=True))
+
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout=10):
+        """Stop the threads of `start`.
+
+        Args:
+            timeout (float, optional): Seconds to wait for each thread, which finishes
+                after its current read.
+        """
+        self._stop_event.set()
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+
+        # Store what arrived since the last period.
+        if self._store_result and self.is_running:
+            self.aggregate()
+
+        self._threads = list()
+
+    def latest_readings(self):
+        """The latest reading of each board.
+
+        Returns:
+            dict: Values of the latest reading, including its `date`, by board name.
+        """
+        with self._readings_lock:
+            return {name: dict(data) for name, data in self._latest_readings.items()}
+
+    def aggregate(self, store_result=True):
+        """Store the readings that arrived since the last call.
+
+        Args:
+            store_result (bool, optional): Store the readings in the db, default True.
+
+        Returns:
+            dict: The new readings by board name.
+        """
+        with self._readings_lock:
+            sensor_data = {name: dict(self._latest_readings[name])
+                           for name in self._new_readings}
+            self._new_readings.clear()
+
+        if store_result and len(sensor_data) > 0:
+            self._store(sensor_data)
 
-        self.messaging.send_message(topic, msg)
+        return sensor_data
 
     def capture(self, store_result=True, send_message=True):
         """
@@ -90,18 +195,24 @@ class ArduinoSerialMonitor(object):
             sensor_data (dict):     Dictionary of sensors keyed by sensor name.
         """
 
+        # While the boards are read by `start`, reading here would compete with those
+        # threads, so return the latest reading of each instead.
+        if self.is_running:
+            return self.latest_readings()
+
         # Read from all the readers; we send messages with sensor data immediately, but accumulate
         # data from all sensors before storing in the db.
         # Note that there is no guarantee that these are the LATEST reports emitted by the sensors,
         # as the OS or PySerial object may have a backlog, and especially because we are reading
         # these in lock step; if one produces a report every 1.9 seconds, and the other every 2.1
         # seconds, then we will generally wait an extra 0.2 seconds on each loop relative to the
-        # rate at which the fast one is producing output, For this reason, we really need to split
-        # these into two separate threads and probably two seperate Mongo collections (e.g. not
-        # 'environment' but 'camera_board' and 'telemetry_board').
+        # rate at which the fast one is producing output. Use `start` to read each board in its
+        # own thread instead.
         sensor_data = dict()
         for sensor_name, reader_info in self.serial_readers.items():
             reader = reader_info['reader']
+            if reader is None:
+                continue
 
             self.logger.debug('ArduinoSerialMonitor.capture reading sensor {}', sensor_name)
             try:
@@ -116,19 +227,75 @@ class ArduinoSerialMonitor(object):
                 if send_message:
                     self.send_message({'data': data}, topic='environment')
 
-                # Make a separate power entry
-                if 'power' in data:
-                    self.db.insert_current('power', data['power'])
+                self._store_power(data)
 
             except Exception as e:
                 self.logger.warning('Exception while reading from sensor {}: {}', sensor_name, e)
 
         if store_result and len(sensor_data) > 0:
+            self._store(sensor_data)
+
+        return sensor_data
+
+    def _read_loop(self, sensor_name, reader, send_message):
+        self.logger.debug('Reading sensor {} in its own thread', sensor_name)
+        while not self._stop_event.is_set():
+            try:
+                reading = reader.get_and_parse_reading(retry_limit=1)
+            except Exception as e:
+                self.logger.warning('Exception while reading from sensor {}: {}', sensor_name, e)
+                # The board may have been unplugged, don't spin.
+                self._stop_event.wait(timeout=1)
+                continue
+
+            if not reading:
+                continue
+
+            time_stamp, data = reading
+            data['date'] = time_stamp
+            with self._readings_lock:
+                self._latest_readings[sensor_name] = data
+                self._new_readings.add(sensor_name)
+
+            if send_message:
+                try:
+                    self.send_message({'data': data}, topic='environment')
+                except Exception as e:
+                    self.logger.warning('Problem sending reading of {}: {}', sensor_name, e)
+
+            try:
+                self._store_power(data)
+            except Exception as e:
+                self.logger.warning('Problem storing power of {}: {}', sensor_name, e)
+
+    def _aggregate_loop(self):
+        while not self._stop_event.wait(timeout=self.aggregation_period):
+            try:
+                self.aggregate()
+            except Exception as e:
+                self.logger.warning('Problem storing environment: {}', e)
+
+    def _store_power(self, data):
+        """Make a separate power entry for each reading, whether or not it is stored """
+        if 'power' in data:
             if self.db is None:
                 self.db = PanDB()
-            self.db.insert_current('environment', sensor_data)
+            self.db.insert_current('power', data['power'])
 
-        return sensor_data
+    def _store(self, sensor_data):
+        if self.db is None:
+            self.db = PanDB()
+        self.db.insert_current('environment', sensor_data)
+
+        archive_dir = self.config.get('telemetry_archive', {}).get('directory')
+        if self.archive is None and archive_dir:
+            self.archive = TelemetryArchive(archive_dir, 'environment')
+        if self.archive is not None:
+            try:
+                self.archive.append([{'date': current_time(datetime=True),
+                                      'data': sensor_data}])
+            except Exception as e:
+                self.logger.warning('Problem archiving environment: {}', e)
 
 
 def auto_detect_arduino_devices(comports=None, logger=None):
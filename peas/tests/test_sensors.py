@@ -3,6 +3,7 @@
 import collections
 import pytest
 import serial
+import time
 
 from peas import sensors as sensors_module
 from pocs.utils import rs232
@@ -134,3 +135,55 @@ def test_auto_detect_arduino_devices(inject_list_comports, serial_handlers):
         assert v[ndx][1].is_connected is True
         v[ndx][1].disconnect()
         assert v[ndx][1].is_connected is False
+
+
+# --------------------------------------------------------------------------------------------------
+
+def test_monitor_reads_boards_concurrently(inject_list_comports, serial_handlers, memory_db):
+    monitor = sensors_module.ArduinoSerialMonitor(auto_detect=True, aggregation_period=0.5)
+    monitor.db = memory_db
+    assert sorted(monitor.serial_readers.keys()) == ['camera_board', 'telemetry_board']
+
+    monitor.start(store_result=True, send_message=False)
+    try:
+        assert monitor.is_running
+        for _ in range(100):
+            if len(monitor.latest_readings()) == 2:
+                break
+            time.sleep(0.1)
+
+        readings = monitor.latest_readings()
+        assert readings['camera_board']['name'] == 'camera_board'
+        assert readings['telemetry_board']['name'] == 'telemetry_board'
+        assert 'date' in readings['telemetry_board']
+
+        # Reading the ports here would compete with the threads.
+        assert monitor.capture(store_result=False, send_message=False).keys() == readings.keys()
+
+        for _ in range(50):
+            record = memory_db.get_current('environment')
+            if record is not None:
+                break
+            time.sleep(0.1)
+        assert set(record['data'].keys()) <= {'camera_board', 'telemetry_board'}
+    finally:
+        monitor.disconnect()
+
+    assert not monitor.is_running
+    assert monitor.aggregate() == dict()
+
+
+def test_capture_stores_power(inject_list_comports, serial_handlers, memory_db):
+    monitor = sensors_module.ArduinoSerialMonitor(auto_detect=True)
+    monitor.db = memory_db
+    try:
+        for _ in range(20):
+            sensor_data = monitor.capture(store_result=False, send_message=False)
+            if 'telemetry_board' in sensor_data:
+                break
+
+        # The power is stored even when the readings aren't.
+        assert memory_db.get_current('power')['data'] == sensor_data['telemetry_board']['power']
+        assert memory_db.get_current('environment') is None
+    finally:
+        monitor.disconnect()
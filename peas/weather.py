@@ -14,6 +14,7 @@ import astropy.units as u
 from pocs.utils.config import load_config
 from pocs.utils.logger import get_root_logger
 from pocs.utils.messaging import PanMessaging
+from pocs.utils.telemetry import TelemetryArchive
 
 from .PID import PID
 
@@ -111,9 +112,14 @@ class AAGCloudSensor(object):
         self.safety_delay = self.cfg.get('safety_delay', 15.)
 
         self.db = None
+        self.archive = None
         if store_result:
             self.db = get_mongodb()
 
+            archive_dir = self.config.get('telemetry_archive', {}).get('directory')
+            if archive_dir:
+                self.archive = TelemetryArchive(archive_dir, 'weather')
+
         self.messaging = None
 
         # Initialize Serial Connection
@@ -606,7 +612,8 @@ class AAGCloudSensor(object):
 
     def send_message(self, msg, topic='weather'):
         if self.messaging is None:
-            self.messaging = PanMessaging.create_publisher(6510)
+            self.messaging = PanMessaging.create_publisher(
+                6510, encoding=self.config.get('messaging', {}).get('encoding', 'json'))
 
         self.messaging.send_message(topic, msg)
 
@@ -665,6 +672,12 @@ class AAGCloudSensor(object):
         if store_result:
             self.db.insert_current('weather', data)
 
+            if self.archive is not None:
+                try:
+                    self.archive.append([data])
+                except Exception as e:
+                    self.logger.warning('Problem archiving weather: {}'.format(e))
+
         return data
 
     def AAG_heater_algorithm(self, target, last_entry):
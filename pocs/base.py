@@ -64,7 +64,8 @@ class PanBase(object):
             db_type = self.config['db']['type']
             db_name = self.config['db']['name']
 
-            _db = PanDB(db_type=db_type, db_name=db_name, logger=self.logger)
+            _db = PanDB(db_type=db_type, db_name=db_name, logger=self.logger,
+                        buffer=self.config['db'].get('buffer'))
 
         self.db = _db
 
@@ -47,6 +47,8 @@ class AbstractCamera(PanBase, metaclass=ABCMeta):
         file_extension (str): file extension used by the camera's image data, e.g. 'fits'
         library_path (str): path to camera library, e.g. '/usr/local/lib/libfli.so' (SBIG, FLI, ZWO)
         properties (dict): A collection of camera properties as read from the camera.
+        pipeline (`pocs.camera.pipeline.ExposurePipeline`|None): Pipeline used to process
+            exposures from `take_observation`, default None to process each one in a thread.
 
     Notes:
         The port parameter is not used by SBIG or ZWO cameras, and is deprecated for FLI cameras.
@@ -83,6 +85,13 @@ class AbstractCamera(PanBase, metaclass=ABCMeta):
         self._exposure_event.set()
         self._is_exposing = False
 
+        # Readout of the current exposure, see `get_thumbnail`.
+        self._readout_data = None
+        self._readout_keep_data = False
+        self._readout_write_file = True
+
+        self.pipeline = None
+
         self._create_subcomponent(subcomponent=focuser,
                                   sub_name='focuser',
                                   class_name='Focuser',
@@ -205,7 +214,9 @@ class AbstractCamera(PanBase, metaclass=ABCMeta):
             `take_exposure`. Also creates a `threading.Event` object and a
             `threading.Thread` object. The Thread calls `process_exposure`
             after the exposure had completed and the Event is set once
-            `process_exposure` finishes.
+            `process_exposure` finishes. If the camera has a `pipeline` the
+            exposure is submitted to it instead and the Event is set once the
+            FITS file is ready.
 
         Args:
             observation (~pocs.scheduler.observation.Observation): Object
@@ -226,7 +237,11 @@ class AbstractCamera(PanBase, metaclass=ABCMeta):
                                                                          filename,
                                                                          **kwargs)
 
-        exposure_event = self.take_exposure(seconds=exptime, filename=file_path, **kwargs)
+        # The observation keywords are written with the image, see `_process_fits`.
+        exposure_event = self.take_exposure(seconds=exptime,
+                                            filename=file_path,
+                                            info=metadata,
+                                            **kwargs)
 
         # Add most recent exposure to list
         if self.is_primary:
@@ -236,12 +251,15 @@ class AbstractCamera(PanBase, metaclass=ABCMeta):
                 observation.exposure_list[image_id] = file_path
 
         # Process the exposure once readout is complete
-        t = threading.Thread(
-            target=self.process_exposure,
-            args=(metadata, observation_event, exposure_event),
-            daemon=True)
-        t.name = '{}Thread'.format(self.name)
-        t.start()
+        if self.pipeline is not None:
+            self.pipeline.submit(self, metadata, observation_event, exposure_event)
+        else:
+            t = threading.Thread(
+                target=self.process_exposure,
+                args=(metadata, observation_event, exposure_event),
+                daemon=True)
+            t.name = '{}Thread'.format(self.name)
+            t.start()
 
         return observation_event
 
@@ -250,6 +268,7 @@ class AbstractCamera(PanBase, metaclass=ABCMeta):
                       filename=None,
                       dark=False,
                       blocking=False,
+                      info=None,
                       *args,
                       **kwargs):
         """Take an exposure for given number of seconds and saves to provided filename.
@@ -265,6 +284,8 @@ class AbstractCamera(PanBase, metaclass=ABCMeta):
                 `IMAGETYP` keyword entirely.
             blocking (bool, optional): If False (default) returns immediately after starting
                 the exposure, if True will block until it completes.
+            info (dict, optional): Metadata of an observation (see `take_observation`), added
+                to the FITS header (see `_add_observation_keywords`).
 
         Returns:
             threading.Event: Event that will be set when exposure is complete.
@@ -286,6 +307,8 @@ class AbstractCamera(PanBase, metaclass=ABCMeta):
             seconds, self.name, filename))
 
         header = self._fits_header(seconds, dark)
+        if info is not None:
+            header = self._add_observation_keywords(header, info)
 
         if not self._exposure_event.is_set():
             msg = "Attempt to take exposure on {} while one already in progress.".format(self)
@@ -331,47 +354,15 @@ class AbstractCamera(PanBase, metaclass=ABCMeta):
         if exposure_event is not None:
             exposure_event.wait()
 
-        image_id = info['image_id']
-        seq_id = info['sequence_id']
         file_path = info['file_path']
-        exptime = info['exptime']
-        field_name = info['field_name']
-
-        image_title = '{} [{}s] {} {}'.format(field_name,
-                                              exptime,
-                                              seq_id.replace('_', ' '),
-                                              current_time(pretty=True))
 
-        try:
-            self.logger.debug("Processing {}".format(image_title))
-            img_utils.make_pretty_image(file_path,
-                                        title=image_title,
-                                        link_latest=info['is_primary'])
-        except Exception as e:  # pragma: no cover
-            self.logger.warning('Problem with extracting pretty image: {}'.format(e))
+        self._process_preview(file_path, info)
 
         file_path = self._process_fits(file_path, info)
         self.logger.debug("Finished processing FITS.")
-        with suppress(Exception):
-            info['exptime'] = info['exptime'].value
-
-        if info['is_primary']:
-            self.logger.debug("Adding current observation to db: {}".format(image_id))
-            try:
-                self.db.insert_current('observations', info, store_permanently=False)
-            except Exception as e:
-                self.logger.error('Problem adding observation to db: {}'.format(e))
-        else:
-            self.logger.debug('Compressing {}'.format(file_path))
-            fits_utils.fpack(file_path)
 
-        self.logger.debug("Adding image metadata to db: {}".format(image_id))
-
-        self.db.insert('observations', {
-            'data': info,
-            'date': current_time(datetime=True),
-            'sequence_id': seq_id,
-        })
+        self._process_compress(file_path, info)
+        self._process_record(info)
 
         # Mark the event as done
         observation_event.set()
@@ -386,6 +377,7 @@ class AbstractCamera(PanBase, metaclass=ABCMeta):
                   merit_function='vollath_F4',
                   merit_function_kwargs={},
                   mask_dilations=None,
+                  early_stop=None,
                   coarse=False,
                   make_plots=False,
                   blocking=False,
@@ -416,6 +408,9 @@ class AbstractCamera(PanBase, metaclass=ABCMeta):
                 keyword arguments for the merit function.
             mask_dilations (int, optional): Number of iterations of dilation to perform on the
                 saturated pixel mask (determine size of masked regions), default 10
+            early_stop (int, optional): Number of positions past the best focus after which
+                the sweep stops, default the focuser's `autofocus_early_stop`. Set to 0 to
+                always sweep the full range.
             coarse (bool, optional): Whether to perform a coarse focus, otherwise will perform
                 a fine focus. Default False.
             make_plots (bool, optional: Whether to write focus plots to images folder, default
@@ -441,6 +436,7 @@ class AbstractCamera(PanBase, metaclass=ABCMeta):
                                       merit_function=merit_function,
                                       merit_function_kwargs=merit_function_kwargs,
                                       mask_dilations=mask_dilations,
+                                      early_stop=early_stop,
                                       coarse=coarse,
                                       make_plots=make_plots,
                                       blocking=blocking,
@@ -450,23 +446,38 @@ class AbstractCamera(PanBase, metaclass=ABCMeta):
         """
         Takes an image and returns a thumbnail.
 
-        Takes an image, grabs the data, deletes the FITS file and
-        returns a thumbnail from the centre of the image.
+        Takes an image and returns a thumbnail from the centre of the image. Cameras that
+        read out through `_write_fits` hand the image data straight to this method, so the
+        FITS file is only written if it is kept and is never read back. For other cameras
+        the data is read from the file, which is then deleted unless `keep_file` is True.
 
         Args:
             seconds (astropy.units.Quantity): exposure time, Quantity or numeric type in seconds.
             file_path (str): path to (temporarily) save the image file to.
             thumbnail_size (int): size of the square region of the centre of the image to return.
-            keep_file (bool, optional): if True the image file will be deleted, if False it will
-                be kept.
+            keep_file (bool, optional): if True the image file will be kept, if False (default)
+                it will be deleted, or not written at all.
             *args, **kwargs: passed to the take_exposure() method
         """
-        exposure = self.take_exposure(seconds, filename=file_path, *args, **kwargs)
-        exposure.wait()
-        image = fits.getdata(file_path)
-        if not keep_file:
-            os.unlink(file_path)
-        thumbnail = img_utils.crop_data(image, box_width=thumbnail_size)
+        self._readout_data = None
+        self._readout_keep_data = True
+        self._readout_write_file = keep_file
+        try:
+            exposure = self.take_exposure(seconds, filename=file_path, *args, **kwargs)
+            exposure.wait()
+            image = self._readout_data
+        finally:
+            self._readout_data = None
+            self._readout_keep_data = False
+            self._readout_write_file = True
+
+        if image is None:
+            image = fits.getdata(file_path)
+            if not keep_file:
+                os.unlink(file_path)
+
+        # Copy so that the thumbnail doesn't refer to a reusable readout buffer.
+        thumbnail = img_utils.crop_data(image, box_width=thumbnail_size).copy()
         return thumbnail
 
     @abstractmethod
@@ -495,6 +506,21 @@ class AbstractCamera(PanBase, metaclass=ABCMeta):
     def _readout(self, *args):
         raise NotImplementedError
 
+    def _write_fits(self, data, header, filename):
+        """Write the image data read out from the camera and mark the exposure as done.
+
+        When the exposure was taken by `get_thumbnail` the data is also kept in memory
+        and the file is only written if it is to be kept.
+        """
+        if self._readout_keep_data:
+            self._readout_data = data
+            if not self._readout_write_file:
+                self.logger.debug("Image from {} kept in memory, not written", self)
+                self._exposure_event.set()
+                return
+
+        fits_utils.write_fits(data, header, filename, self.logger, self._exposure_event)
+
     def _fits_header(self, seconds, dark=None):
         header = fits.Header()
         header.set('INSTRUME', self.uid, 'Camera serial number')
@@ -597,14 +623,84 @@ class AbstractCamera(PanBase, metaclass=ABCMeta):
 
         return exptime, file_path, image_id, metadata
 
+    def _add_observation_keywords(self, header, info):
+        """
+        Add the FITS keywords of an observation to the header of an exposure, the same
+        as images.cr2_to_fits()
+        """
+        return fits_utils.set_observation_headers(header, info)
+
     def _process_fits(self, file_path, info):
         """
-        Add FITS headers from info the same as images.cr2_to_fits()
+        Process the FITS file once it is written
+
+        The observation keywords are already in the header, so there is nothing more to
+        do by default. Keywords known only after the readout can be added here with
+        `fits_utils.update_header`, which writes them in place into the blank header
+        cards reserved by `fits_utils.write_fits`.
         """
-        self.logger.debug("Updating FITS headers: {}".format(file_path))
-        fits_utils.update_headers(file_path, info)
         return file_path
 
+    def _process_preview(self, file_path, info):
+        """
+        Make the pretty image, linked as the latest image for the primary camera
+
+        The image is a quick preview unless the `cameras.preview_full_plot` config
+        item is True, see `pocs.utils.images.make_pretty_image`.
+        """
+        image_title = '{} [{}s] {} {}'.format(info['field_name'],
+                                              info['exptime'],
+                                              info['sequence_id'].replace('_', ' '),
+                                              current_time(pretty=True))
+
+        try:
+            self.logger.debug("Processing {}".format(image_title))
+            img_utils.make_pretty_image(file_path,
+                                        title=image_title,
+                                        link_latest=info['is_primary'],
+                                        full_plot=self.config.get('cameras', {}).get(
+                                            'preview_full_plot', False))
+        except Exception as e:  # pragma: no cover
+            self.logger.warning('Problem with extracting pretty image: {}'.format(e))
+
+    def _process_compress(self, file_path, info):
+        """
+        Compress the FITS file unless the camera is the primary
+        """
+        if info['is_primary']:
+            return file_path
+
+        self.logger.debug('Compressing {}'.format(file_path))
+        try:
+            return fits_utils.fpack(file_path)
+        except OSError as err:
+            self.logger.warning('Could not compress {}: {}', file_path, err)
+            return file_path
+
+    def _process_record(self, info):
+        """
+        Add the image metadata to the db
+        """
+        image_id = info['image_id']
+
+        with suppress(Exception):
+            info['exptime'] = info['exptime'].value
+
+        if info['is_primary']:
+            self.logger.debug("Adding current observation to db: {}".format(image_id))
+            try:
+                self.db.insert_current('observations', info, store_permanently=False)
+            except Exception as e:
+                self.logger.error('Problem adding observation to db: {}'.format(e))
+
+        self.logger.debug("Adding image metadata to db: {}".format(image_id))
+
+        self.db.insert('observations', {
+            'data': info,
+            'date': current_time(datetime=True),
+            'sequence_id': info['sequence_id'],
+        })
+
     def _create_subcomponent(self, subcomponent, sub_name, class_name, base_class):
         """
         Creates a subcomponent as an attribute of the camera. Can do this from either an instance
@@ -74,6 +74,7 @@ class Camera(AbstractGPhotoCamera):
         `take_exposure`. Also creates a `threading.Event` object and a
         `threading.Timer` object. The timer calls `process_exposure` after the
         set amount of time is expired (`observation.exptime + self.readout_time`).
+        If the camera has a `pipeline` the exposure is submitted to it instead.
 
         Note:
             If a `filename` is passed in it can either be a full path that includes
@@ -108,11 +109,15 @@ class Camera(AbstractGPhotoCamera):
             else:
                 observation.exposure_list[image_id] = file_path.replace('.cr2', '.fits')
 
-        # Process the image after a set amount of time
-        wait_time = exptime + self.readout_time
-        t = Timer(wait_time, self.process_exposure, (metadata, camera_event, proc))
-        t.name = '{}Thread'.format(self.name)
-        t.start()
+        if self.pipeline is not None:
+            # The readout stage waits for the gphoto2 process to finish
+            self.pipeline.submit(self, metadata, camera_event, proc)
+        else:
+            # Process the image after a set amount of time
+            wait_time = exptime + self.readout_time
+            t = Timer(wait_time, self.process_exposure, (metadata, camera_event, proc))
+            t.name = '{}Thread'.format(self.name)
+            t.start()
 
         return camera_event
 
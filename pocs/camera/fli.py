@@ -12,7 +12,6 @@ from astropy import units as u
 from pocs.camera.sdk import AbstractSDKCamera
 from pocs.camera.libfli import FLIDriver
 from pocs.camera import libfliconstants as c
-from pocs.utils.images import fits as fits_utils
 from pocs.utils import error
 
 
@@ -146,18 +145,19 @@ class Camera(AbstractSDKCamera):
     def _readout(self, filename, width, height, header):
         # Use FLIGrabRow for now at least because I can't get FLIGrabFrame to work.
         # image_data = self._FLIDriver.FLIGrabFrame(self._handle, width, height)
-        image_data = np.zeros((height, width), dtype=np.uint16)
+        image_data = self.readout_buffers.get((height, width), np.uint16)
         rows_got = 0
         try:
             for i in range(image_data.shape[0]):
-                image_data[i] = self._driver.FLIGrabRow(self._handle, image_data.shape[1])
+                # Read each row straight into the preallocated image array
+                self._driver.FLIGrabRow(self._handle, image_data.shape[1], out=image_data[i])
                 rows_got += 1
         except RuntimeError as err:
             message = 'Readout error on {}, expected {} rows, got {}: {}'.format(
                 self, image_data.shape[0], rows_got, err)
             raise error.PanError(message)
         else:
-            fits_utils.write_fits(image_data, header, filename, self.logger, self._exposure_event)
+            self._write_fits(image_data, header, filename)
 
     def _fits_header(self, seconds, dark):
         header = super()._fits_header(seconds, dark)
@@ -272,9 +272,12 @@ class ASIDriver(AbstractSDKDriver):
         self._call_function('ASIGetExpStatus', camera_ID, ctypes.byref(status))
         return ExposureStatus(status.value).name
 
-    def get_exposure_data(self, camera_ID, width, height, image_type):
-        """ Get image data from exposure on camera with given integer ID """
-        exposure_data = self._image_array(width, height, image_type)
+    def get_exposure_data(self, camera_ID, width, height, image_type, out=None):
+        """ Get image data from exposure on camera with given integer ID
+
+        If `out` is given the data is read directly into it, see `get_image_format`.
+        """
+        exposure_data = self._image_array(width, height, image_type, out)
 
         self._call_function('ASIGetDataAfterExp',
                             camera_ID,
@@ -283,6 +286,20 @@ class ASIDriver(AbstractSDKDriver):
         self.logger.debug("Got exposure data from camera {}".format(camera_ID))
         return exposure_data
 
+    def get_image_format(self, width, height, image_type):
+        """ Get the shape and dtype of the image data for the given size and image type """
+        width = int(get_quantity_value(width, unit=u.pixel))
+        height = int(get_quantity_value(height, unit=u.pixel))
+
+        if image_type in ('RAW8', 'Y8'):
+            return (height, width), np.uint8
+        elif image_type == 'RAW16':
+            return (height, width), np.uint16
+        elif image_type == 'RGB24':
+            return (3, height, width), np.uint8
+
+        raise ValueError("Unsupported image type: {}".format(image_type))
+
     def start_video_capture(self, camera_ID):
         """ Start video capture mode on camera with given integer ID """
         self._call_function('ASIStartVideoCapture', camera_ID)
@@ -291,9 +308,12 @@ class ASIDriver(AbstractSDKDriver):
         """ Stop video capture mode on camera with given integer ID """
         self._call_function('ASIStopVideoCapture', camera_ID)
 
-    def get_video_data(self, camera_ID, width, height, image_type, timeout):
-        """ Get the image data from the next available video frame """
-        video_data = self._image_array(width, height, image_type)
+    def get_video_data(self, camera_ID, width, height, image_type, timeout, out=None):
+        """ Get the image data from the next available video frame
+
+        If `out` is given the data is read directly into it, see `get_image_format`.
+        """
+        video_data = self._image_array(width, height, image_type, out)
         timeout = int(get_quantity_value(timeout, unit=u.ms))
         try:
             self._call_function('ASIGetVideoData',
@@ -400,19 +420,10 @@ class ASIDriver(AbstractSDKDriver):
 
         return ctypes.c_long(int(value))
 
-    def _image_array(self, width, height, image_type):
-        """ Creates a suitable numpy array for storing image data """
-        width = int(get_quantity_value(width, unit=u.pixel))
-        height = int(get_quantity_value(height, unit=u.pixel))
-
-        if image_type in ('RAW8', 'Y8'):
-            image_array = np.zeros((height, width), dtype=np.uint8, order='C')
-        elif image_type == 'RAW16':
-            image_array = np.zeros((height, width), dtype=np.uint16, order='C')
-        elif image_type == 'RGB24':
-            image_array = np.zeros((3, height, width), dtype=np.uint8, order='C')
-
-        return image_array
+    def _image_array(self, width, height, image_type, out=None):
+        """ Creates (or checks) a suitable numpy array for storing image data """
+        shape, dtype = self.get_image_format(width, height, image_type)
+        return self._image_buffer(shape, dtype, out)
 
 
 units_and_scale = {'AUTO_TARGET_BRIGHTNESS': u.adu,
@@ -461,7 +461,7 @@ class FLIDriver(AbstractSDKDriver):
                             handle, ctypes.byref(time_left))
         return (time_left.value * u.ms).to(u.s)
 
-    def FLIGrabRow(self, handle, width):
+    def FLIGrabRow(self, handle, width, out=None):
         """
         Grabs a row of image data from a given camera.
 
@@ -474,18 +474,20 @@ class FLIDriver(AbstractSDKDriver):
         Args:
             handle (ctypes.c_long): handle of the camera to grab a row from.
             width (int): width of the image row in pixelStart
+            out (numpy.ndarray, optional): array to read the row into, e.g. a row of
+                a preallocated image array, default None to create a new array.
 
         Returns:
             numpy.ndarray: row of image data
         """
-        row_data = np.zeros(width, dtype=np.uint16)
+        row_data = self._image_buffer((width, ), np.uint16, out)
         self._call_function('grabbing row', self._CDLL.FLIGrabRow,
                             handle,
                             row_data.ctypes.data_as(ctypes.c_void_p),
                             ctypes.c_size_t(row_data.nbytes))
         return row_data
 
-    def FLIGrabFrame(self, handle, width, height):
+    def FLIGrabFrame(self, handle, width, height, out=None):
         """
         Grabs an image frame from a given camera.
 
@@ -499,11 +501,13 @@ class FLIDriver(AbstractSDKDriver):
             handle (ctypes.c_long): handle of the camera to grab a frame from.
             width (int): width of the image frame in pixels
             height (int): height of the image frame in pixels
+            out (numpy.ndarray, optional): array to read the frame into, default
+                None to create a new array.
 
         Returns:
             numpy.ndarray: image from the camera
         """
-        image_data = np.zeros((height, width), dtype=np.uint16, order='C')
+        image_data = self._image_buffer((height, width), np.uint16, out)
         bytes_grabbed = ctypes.c_size_t()
         self._call_function('grabbing frame', self._CDLL.FLIGrabFrame,
                             handle,
@@ -0,0 +1,249 @@
+import queue
+import threading
+import time
+
+from pocs.base import PanBase
+from pocs.utils import error
+
+
+class ExposurePipeline(PanBase):
+
+    # Stages in processing order. The observation is marked as done (i.e. the
+    # `observation_event` is set) once the `fits` stage has finished.
+    STAGES = ('readout', 'fits', 'preview', 'compress', 'record')
+
+    def __init__(self, workers=None, queue_size=None, *args, **kwargs):
+        """Process exposures from any number of cameras in stages.
+
+        Each stage has a bounded queue and its own pool of worker threads, which
+        are shared by all of the cameras that use the pipeline. An exposure is
+        passed along the stages as:
+
+            * readout: Wait for the camera to finish the exposure and write the file.
+            * fits: Update the FITS headers (or convert the raw file) with the metadata.
+            * preview: Make the pretty (jpg) image.
+            * compress: Compress the FITS file (not for the primary camera).
+            * record: Add the metadata to the db.
+
+        The `observation_event` of an exposure is set once its FITS file is ready,
+        so the next exposure can be started while the previous one is still being
+        previewed and compressed. When a queue is full the stage before it waits
+        (and `submit` blocks), so slow disks can't pile up work without limit.
+
+        Options are read from the `cameras.pipeline` config item.
+
+        Args:
+            workers (dict, optional): Number of worker threads for each stage,
+                default 1 for each stage not in the config.
+            queue_size (int, optional): Maximum number of exposures waiting for
+                each stage, default 4.
+            *args: Arguments to be passed to `PanBase`
+            **kwargs: Keyword args to be passed to `PanBase`
+        """
+        super().__init__(*args, **kwargs)
+
+        pipeline_config = self.config.get('cameras', {}).get('pipeline', {})
+
+        if queue_size is None:
+            queue_size = pipeline_config.get('queue_size', 4)
+        assert queue_size > 0, self.logger.error("queue_size must be positive")
+
+        self.workers = {stage: 1 for stage in self.STAGES}
+        self.workers.update(pipeline_config.get('workers', {}))
+        self.workers.update(workers or {})
+
+        self.queue_size = queue_size
+
+        self._queues = {stage: queue.Queue(maxsize=queue_size) for stage in self.STAGES}
+        self._stats = {stage: {'processed': 0, 'failed': 0, 'busy': 0.} for stage in self.STAGES}
+
+        self._threads = list()
+        self._pending = 0
+        self._lock = threading.Condition()
+
+
+##################################################################################################
+# Properties
+##################################################################################################
+
+    @property
+    def is_running(self):
+        """ If the worker threads have been started """
+        return len(self._threads) > 0
+
+    @property
+    def pending(self):
+        """ Number of exposures submitted but not yet finished """
+        return self._pending
+
+##################################################################################################
+# Methods
+##################################################################################################
+
+    def start(self):
+        """Start the worker threads for each stage """
+        if self.is_running:
+            return
+
+        for stage in self.STAGES:
+            for i in range(self.workers[stage]):
+                t = threading.Thread(target=self._run_stage, args=(stage, ), daemon=True)
+                t.name = 'Pipeline{}Thread{:02d}'.format(stage.title(), i)
+                t.start()
+                self._threads.append(t)
+
+        self.logger.debug("Exposure pipeline started with {} threads", len(self._threads))
+
+    def stop(self, timeout=None):
+        """Finish the pending exposures and stop the worker threads.
+
+        Args:
+            timeout (float, optional): Seconds to wait for pending exposures,
+                default None to wait for all of them.
+        """
+        if not self.is_running:
+            return
+
+        finished = self.wait(timeout=timeout)
+        if not finished:
+            self.logger.warning("Stopping exposure pipeline with {} pending", self._pending)
+
+        for stage in self.STAGES:
+            for _ in range(self.workers[stage]):
+                try:
+                    if finished:
+                        self._queues[stage].put(None)
+                    else:
+                        self._queues[stage].put_nowait(None)
+                except queue.Full:
+                    # The stage is stuck, its (daemon) threads are left behind.
+                    self.logger.warning("Exposure pipeline {} stage did not stop", stage)
+                    break
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for t in self._threads:
+            t.join(timeout=None if deadline is None else max(0, deadline - time.monotonic()))
+
+        self._threads = list()
+        self.logger.debug("Exposure pipeline stopped")
+
+    def submit(self, camera, info, observation_event, exposure_event=None, timeout=None):
+        """Add an exposure to the pipeline.
+
+        Blocks while the first queue is full.
+
+        Args:
+            camera (`pocs.camera.AbstractCamera`): The camera that took the exposure.
+            info (dict): Header metadata saved for the image, see `process_exposure`.
+            observation_event (threading.Event): Event set when the FITS file is ready.
+            exposure_event (threading.Event, optional): Event that is set when the
+                exposure is complete, or anything else with a `wait` method.
+            timeout (float, optional): Seconds to wait for room in the queue,
+                default None to wait as long as needed.
+
+        Raises:
+            error.Timeout: If there is no room in the queue within `timeout`.
+        """
+        self.start()
+
+        job = {
+            'camera': camera,
+            'info': info,
+            'file_path': info['file_path'],
+            'observation_event': observation_event,
+            'exposure_event': exposure_event,
+        }
+
+        with self._lock:
+            self._pending += 1
+
+        try:
+            self._queues[self.STAGES[0]].put(job, timeout=timeout)
+        except queue.Full:
+            self._finish(job)
+            raise error.Timeout("Exposure pipeline full, can't add {}".format(info['image_id']))
+
+    def wait(self, timeout=None):
+        """Wait until all submitted exposures are finished.
+
+        Args:
+            timeout (float, optional): Seconds to wait, default None to wait
+                as long as needed.
+
+        Returns:
+            bool: True if all exposures are finished, False on timeout.
+        """
+        with self._lock:
+            return self._lock.wait_for(lambda: self._pending == 0, timeout=timeout)
+
+    def status(self):
+        """Get the state of each stage.
+
+        Returns:
+            dict: For each stage the number of `queued` exposures, the number
+                `processed` and `failed` and the total `busy` time in seconds.
+        """
+        status = {}
+        for stage in self.STAGES:
+            status[stage] = dict(self._stats[stage])
+            status[stage]['queued'] = self._queues[stage].qsize()
+
+        return status
+
+##################################################################################################
+# Private Methods
+##################################################################################################
+
+    def _run_stage(self, stage):
+        """Worker loop for a stage, exits when it gets None """
+        stage_queue = self._queues[stage]
+        stage_index = self.STAGES.index(stage)
+
+        while True:
+            job = stage_queue.get()
+            if job is None:
+                stage_queue.task_done()
+                break
+
+            start = time.monotonic()
+            try:
+                getattr(self, '_{}_stage'.format(stage))(job)
+            except Exception as e:
+                self.logger.warning("Problem in {} stage for {}: {}",
+                                    stage, job['info']['image_id'], e)
+                self._stats[stage]['failed'] += 1
+                self._finish(job)
+            else:
+                self._stats[stage]['processed'] += 1
+                if stage_index + 1 < len(self.STAGES):
+                    # Blocks if the next stage is full
+                    self._queues[self.STAGES[stage_index + 1]].put(job)
+                else:
+                    self._finish(job)
+            finally:
+                self._stats[stage]['busy'] += time.monotonic() - start
+                stage_queue.task_done()
+
+    def _finish(self, job):
+        """Mark the job as done, which always sets the observation event """
+        job['observation_event'].set()
+        with self._lock:
+            self._pending -= 1
+            self._lock.notify_all()
+
+    def _readout_stage(self, job):
+        if job['exposure_event'] is not None:
+            job['exposure_event'].wait()
+
+    def _fits_stage(self, job):
+        job['file_path'] = job['camera']._process_fits(job['file_path'], job['info'])
+        job['observation_event'].set()
+
+    def _preview_stage(self, job):
+        job['camera']._process_preview(job['file_path'], job['info'])
+
+    def _compress_stage(self, job):
+        job['file_path'] = job['camera']._process_compress(job['file_path'], job['info'])
+
+    def _record_stage(self, job):
+        job['camera']._process_record(job['info'])
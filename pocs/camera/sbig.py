@@ -2,12 +2,13 @@ from threading import Event
 from warnings import warn
 from contextlib import suppress
 
+import numpy as np
 from astropy import units as u
 
 from pocs.camera.sdk import AbstractSDKCamera
 from pocs.camera.sbigudrv import INVALID_HANDLE_VALUE
 from pocs.camera.sbigudrv import SBIGDriver
-from pocs.utils.images import fits as fits_utils
+from pocs.utils import get_quantity_value
 
 
 class Camera(AbstractSDKCamera):
@@ -168,20 +169,20 @@ class Camera(AbstractSDKCamera):
         exposure_status = Camera._driver.get_exposure_status(self._handle)
         if exposure_status == 'CS_INTEGRATION_COMPLETE':
             try:
+                image_shape = (get_quantity_value(height, unit=u.pixel),
+                               get_quantity_value(width, unit=u.pixel))
                 image_data = Camera._driver.readout(self._handle,
                                                     readout_mode,
                                                     top,
                                                     left,
                                                     height,
-                                                    width)
+                                                    width,
+                                                    out=self.readout_buffers.get(image_shape,
+                                                                                 np.uint16))
             except RuntimeError as err:
                 raise error.PanError('Readout error on {}, {}'.format(self, err))
             else:
-                fits_utils.write_fits(image_data,
-                                      header,
-                                      filename,
-                                      self.logger,
-                                      self._exposure_event)
+                self._write_fits(image_data, header, filename)
         elif exposure_status == 'CS_IDLE':
             raise error.PanError("Exposure missing on {}".format(self))
         else:
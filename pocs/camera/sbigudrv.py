@@ -336,7 +336,14 @@ class SBIGDriver(AbstractSDKDriver):
                 top,
                 left,
                 height,
-                width):
+                width,
+                out=None):
+        """
+        Read out the image data of an exposure.
+
+        If `out` is given (e.g. from `pocs.camera.sdk.ReadoutBuffers`) the image
+        data is read directly into it, otherwise a new array is created.
+        """
         # Set up all the parameter and result Structures that will be needed.
         readout_mode_code = readout_mode_codes[readout_mode]
         top = int(get_quantity_value(top, unit=u.pixel))
@@ -358,7 +365,7 @@ class SBIGDriver(AbstractSDKDriver):
         end_readout_params = EndReadoutParams(ccd_codes['CCD_IMAGING'])
 
         # Array to hold the image data
-        image_data = np.zeros((height, width), dtype=np.uint16)
+        image_data = self._image_buffer((height, width), np.uint16, out)
         rows_got = 0
 
         # Readout data
@@ -1,6 +1,9 @@
+import threading
 from abc import ABCMeta, abstractmethod
 from contextlib import suppress
 
+import numpy as np
+
 from pocs.base import PanBase
 from pocs.camera.camera import AbstractCamera
 from pocs.utils import error
@@ -52,6 +55,107 @@ class AbstractSDKDriver(PanBase, metaclass=ABCMeta):
         """
         raise NotImplementedError
 
+    # Private methods
+
+    def _image_buffer(self, shape, dtype, out=None):
+        """Get an array for the SDK to read image data into.
+
+        Args:
+            shape (tuple): shape of the image data.
+            dtype (numpy.dtype): data type of the image data.
+            out (numpy.ndarray, optional): preallocated array to use, e.g. from
+                `ReadoutBuffers`. If not given a new array is created.
+
+        Returns:
+            numpy.ndarray: `out` if given, otherwise a new zero filled array.
+
+        Raises:
+            ValueError: if `out` is not a writeable, C contiguous array with the
+                required shape and dtype.
+        """
+        if out is None:
+            return np.zeros(shape, dtype=dtype, order='C')
+
+        if out.shape != tuple(shape) or out.dtype != np.dtype(dtype) or \
+                not out.flags['C_CONTIGUOUS'] or not out.flags['WRITEABLE']:
+            raise ValueError(
+                "Need writeable, C contiguous {} buffer with shape {}, got {} {}".format(
+                    np.dtype(dtype), tuple(shape), out.dtype, out.shape))
+
+        return out
+
+
+class ReadoutBuffers(object):
+
+    def __init__(self, num_buffers=2):
+        """A ring of preallocated arrays for camera readout.
+
+        SDK drivers read image data directly into these arrays, avoiding a new
+        allocation (and the copy into it) for every frame. The arrays are
+        reallocated only if the shape or dtype of the image data changes, so
+        memory use stays flat during long sequences of exposures.
+
+        Each call to `get` returns the next array in the ring, which means the
+        data from a readout is valid until `num_buffers` more readouts have
+        been made. Image data is written to a FITS file as part of the readout,
+        so the default of 2 leaves room for one frame still being written.
+
+        Args:
+            num_buffers (int, optional): Number of arrays in the ring, default 2.
+        """
+        assert num_buffers > 0, "num_buffers must be positive"
+
+        self.num_buffers = int(num_buffers)
+
+        self._buffers = list()
+        self._shape = None
+        self._dtype = None
+        self._index = 0
+        self._lock = threading.Lock()
+
+    @property
+    def shape(self):
+        """ Shape of the arrays, None before the first call to `get` """
+        return self._shape
+
+    @property
+    def dtype(self):
+        """ Data type of the arrays, None before the first call to `get` """
+        return self._dtype
+
+    @property
+    def nbytes(self):
+        """ Total size of the allocated arrays in bytes """
+        return sum(buffer.nbytes for buffer in self._buffers)
+
+    def get(self, shape, dtype):
+        """Get the next array in the ring.
+
+        Args:
+            shape (tuple): shape of the image data.
+            dtype (numpy.dtype): data type of the image data.
+
+        Returns:
+            numpy.ndarray: a C contiguous array. The contents are not cleared.
+        """
+        shape = tuple(int(n) for n in shape)
+        dtype = np.dtype(dtype)
+
+        with self._lock:
+            if shape != self._shape or dtype != self._dtype:
+                self._buffers = list()
+                self._shape = shape
+                self._dtype = dtype
+                self._index = 0
+
+            if len(self._buffers) < self.num_buffers:
+                self._buffers.append(np.empty(shape, dtype=dtype, order='C'))
+
+            buffer = self._buffers[self._index]
+            self._index = (self._index + 1) % self.num_buffers
+
+        return buffer
+
 
 class AbstractSDKCamera(AbstractCamera):
     _driver = None
@@ -64,6 +168,7 @@ class AbstractSDKCamera(AbstractCamera):
                  library_path=None,
                  filter_type=None,
                  set_point=None,
+                 readout_buffers=2,
                  *args, **kwargs):
         # Would usually use self.logger but that won't exist until after calling super().__init__(),
         # and don't want to do that until after the serial number and port have both been determined
@@ -107,6 +212,10 @@ class AbstractSDKCamera(AbstractCamera):
                 name, serial_number))
 
         my_class._assigned_cameras.add(serial_number)
+
+        # Image data is read out into these instead of new arrays for every frame.
+        self._readout_buffers = ReadoutBuffers(num_buffers=readout_buffers)
+
         super().__init__(name, *args, **kwargs)
         self._address = my_class._cameras[self.uid]
         self.connect()
@@ -136,6 +245,11 @@ class AbstractSDKCamera(AbstractCamera):
         """ A collection of camera properties as read from the camera """
         return self._info
 
+    @property
+    def readout_buffers(self):
+        """ The `ReadoutBuffers` that image data is read out into """
+        return self._readout_buffers
+
     # Methods
 
     def __str__(self):
@@ -73,10 +73,10 @@ class Camera(AbstractCamera):
             fake_data = np.random.randint(low=975, high=1026,
                                           size=fake_data.shape,
                                           dtype=fake_data.dtype)
-        fits_utils.write_fits(fake_data, header, filename, self.logger, self._exposure_event)
+        self._write_fits(fake_data, header, filename)
 
-    def _process_fits(self, file_path, info):
-        file_path = super()._process_fits(file_path, info)
+    def _add_observation_keywords(self, header, info):
+        header = super()._add_observation_keywords(header, info)
         self.logger.debug('Overriding mount coordinates for camera simulator')
         solved_path = os.path.join(
             os.environ['POCS'],
@@ -84,14 +84,10 @@ class Camera(AbstractCamera):
             'solved.fits.fz'
         )
         solved_header = fits_utils.getheader(solved_path)
-        with fits.open(file_path, 'update') as f:
-            hdu = f[0]
-            hdu.header.set('RA-MNT', solved_header['RA-MNT'], 'Degrees')
-            hdu.header.set('HA-MNT', solved_header['HA-MNT'], 'Degrees')
-            hdu.header.set('DEC-MNT', solved_header['DEC-MNT'], 'Degrees')
-
-        self.logger.debug("Headers updated for simulated image.")
-        return file_path
+        header.set('RA-MNT', solved_header['RA-MNT'], 'Degrees')
+        header.set('HA-MNT', solved_header['HA-MNT'], 'Degrees')
+        header.set('DEC-MNT', solved_header['DEC-MNT'], 'Degrees')
+        return header
 
 
 class SDKDriver(AbstractSDKDriver):
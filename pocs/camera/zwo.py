@@ -212,7 +212,10 @@ class Camera(AbstractSDKCamera):
                                                        width,
                                                        height,
                                                        image_type,
-                                                       timeout)
+                                                       timeout,
+                                                       out=self._get_readout_buffer(width,
+                                                                                    height,
+                                                                                    image_type))
             if video_data is not None:
                 now = Time.now()
                 header.set('DATE-OBS', now.fits, 'End of exposure + readout')
@@ -251,15 +254,15 @@ class Camera(AbstractSDKCamera):
                 image_data = Camera._driver.get_exposure_data(self._handle,
                                                               width,
                                                               height,
-                                                              self.image_type)
+                                                              self.image_type,
+                                                              out=self._get_readout_buffer(
+                                                                  width,
+                                                                  height,
+                                                                  self.image_type))
             except RuntimeError as err:
                 raise error.PanError('Error getting image data from {}: {}'.format(self, err))
             else:
-                fits_utils.write_fits(image_data,
-                                      header,
-                                      filename,
-                                      self.logger,
-                                      self._exposure_event)
+                self._write_fits(image_data, header, filename)
         elif exposure_status == 'FAILED':
             raise error.PanError("Exposure failed on {}".format(self))
         elif exposure_status == 'IDLE':
@@ -268,6 +271,11 @@ class Camera(AbstractSDKCamera):
             raise error.PanError("Unexpected exposure status on {}: '{}'".format(
                 self, exposure_status))
 
+    def _get_readout_buffer(self, width, height, image_type):
+        """ Get the next readout buffer for image data of the given size and type """
+        shape, dtype = Camera._driver.get_image_format(width, height, image_type)
+        return self.readout_buffers.get(shape, dtype)
+
     def _fits_header(self, seconds, dark):
         header = super()._fits_header(seconds, dark)
         header.set('CAM-GAIN', self.gain, 'Internal units')
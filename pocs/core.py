@@ -254,6 +254,9 @@ class POCS(PanStateMachine, PanBase):
             # Observatory shut down
             self.observatory.power_down()
 
+            # Write any buffered records
+            self.db.flush()
+
             # Shut down messaging
             self.logger.debug('Shutting down messaging system')
 
@@ -663,9 +666,9 @@ class POCS(PanStateMachine, PanBase):
         cmd_port = self.config['messaging']['cmd_port']
         msg_port = self.config['messaging']['msg_port']
 
-        def create_forwarder(port):
+        def create_forwarder(port, cache_topics=None):
             try:
-                PanMessaging.create_forwarder(port, port + 1)
+                PanMessaging.create_forwarder(port, port + 1, cache_topics=cache_topics)
             except Exception:
                 pass
 
@@ -676,14 +679,15 @@ class POCS(PanStateMachine, PanBase):
 
         msg_forwarder_process = multiprocessing.Process(
             target=create_forwarder, args=(
-                msg_port,), name='MsgForwarder')
+                msg_port, self.config['messaging'].get('cache_topics')), name='MsgForwarder')
         msg_forwarder_process.start()
 
         self._do_cmd_check = True
         self._cmd_queue = multiprocessing.Queue()
         self._sched_queue = multiprocessing.Queue()
 
-        self._msg_publisher = PanMessaging.create_publisher(msg_port)
+        self._msg_publisher = PanMessaging.create_publisher(
+            msg_port, encoding=self.config['messaging'].get('encoding', 'json'))
 
         def check_message_loop(cmd_queue):
             cmd_subscriber = PanMessaging.create_subscriber(cmd_port + 1)
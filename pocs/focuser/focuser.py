@@ -11,6 +11,7 @@ from scipy.ndimage import binary_dilation
 import numpy as np
 
 from copy import copy
+from queue import Queue
 from threading import Event
 from threading import Thread
 
@@ -51,6 +52,8 @@ class AbstractFocuser(PanBase):
             for the merit function.
         autofocus_mask_dilations (int, optional): Number of iterations of dilation to perform on the
             saturated pixel mask (determine size of masked regions), default 10
+        autofocus_early_stop (int, optional): Number of positions past the best focus after which
+            the sweep stops, e.g. 2. Default None to always sweep the full range.
     """
 
     def __init__(self,
@@ -68,6 +71,7 @@ class AbstractFocuser(PanBase):
                  autofocus_merit_function=None,
                  autofocus_merit_function_kwargs=None,
                  autofocus_mask_dilations=None,
+                 autofocus_early_stop=None,
                  *args, **kwargs):
         super().__init__(*args, **kwargs)
 
@@ -100,6 +104,7 @@ class AbstractFocuser(PanBase):
         self.autofocus_merit_function = autofocus_merit_function
         self.autofocus_merit_function_kwargs = autofocus_merit_function_kwargs
         self.autofocus_mask_dilations = autofocus_mask_dilations
+        self.autofocus_early_stop = autofocus_early_stop
 
         self._camera = camera
 
@@ -177,6 +182,7 @@ class AbstractFocuser(PanBase):
                   merit_function=None,
                   merit_function_kwargs=None,
                   mask_dilations=None,
+                  early_stop=None,
                   coarse=False,
                   make_plots=False,
                   blocking=False):
@@ -206,6 +212,9 @@ class AbstractFocuser(PanBase):
                 keyword arguments for the merit function.
             mask_dilations (int, optional): Number of iterations of dilation to perform on the
                 saturated pixel mask (determine size of masked regions), default 10
+            early_stop (int, optional): Number of positions past the best focus after which
+                the sweep stops, default `autofocus_early_stop`. Set to 0 to always sweep the
+                full range.
             coarse (bool, optional): Whether to perform a coarse focus, otherwise will perform
                 a fine focus. Default False.
             make_plots (bool, optional: Whether to write focus plots to images folder, default
@@ -282,6 +291,12 @@ class AbstractFocuser(PanBase):
             else:
                 mask_dilations = 10
 
+        if early_stop is None:
+            if self.autofocus_early_stop is not None:
+                early_stop = self.autofocus_early_stop
+            else:
+                early_stop = 0
+
         # Set up the focus parameters
         focus_event = Event()
         focus_params = {
@@ -294,6 +309,7 @@ class AbstractFocuser(PanBase):
             'merit_function': merit_function,
             'merit_function_kwargs': merit_function_kwargs,
             'mask_dilations': mask_dilations,
+            'early_stop': early_stop,
             'coarse': coarse,
             'make_plots': make_plots,
             'focus_event': focus_event,
@@ -315,6 +331,7 @@ class AbstractFocuser(PanBase):
                    merit_function,
                    merit_function_kwargs,
                    mask_dilations,
+                   early_stop,
                    make_plots,
                    coarse,
                    focus_event,
@@ -380,35 +397,35 @@ class AbstractFocuser(PanBase):
                                     focus_step, dtype=np.int)
         n_positions = len(focus_positions)
 
-        thumbnails = np.zeros((n_positions, thumbnail_size, thumbnail_size),
-                              dtype=initial_thumbnail.dtype)
-        masks = np.empty((n_positions, thumbnail_size, thumbnail_size), dtype=np.bool)
-        metric = np.empty(n_positions)
+        # The focus metrics are computed in a separate thread as the thumbnails arrive, while
+        # the focuser moves to the next position and the next exposure is taken.
+        sweep = _FocusSweep(dark_thumb, mask_dilations, merit_function, merit_function_kwargs)
+        sweep.start()
 
-        # Take and store an exposure for each focus position.
-        for i, position in enumerate(focus_positions):
-            # Move focus, updating focus_positions with actual encoder position after move.
-            focus_positions[i] = self.move_to(position)
+        try:
+            for i, position in enumerate(focus_positions):
+                # Move focus, updating focus_positions with actual encoder position after move.
+                focus_positions[i] = self.move_to(position)
 
-            # Take exposure
-            focus_fn = "{}_{:02d}.{}".format(focus_positions[i], i, self._camera.file_extension)
-            file_path = os.path.join(file_path_root, focus_fn)
+                # Take exposure
+                focus_fn = "{}_{:02d}.{}".format(focus_positions[i], i, self._camera.file_extension)
+                file_path = os.path.join(file_path_root, focus_fn)
 
-            thumbnail = self._camera.get_thumbnail(
-                seconds, file_path, thumbnail_size, keep_file=keep_files)
-            masks[i] = focus_utils.mask_saturated(thumbnail).mask
-            if dark_thumb is not None:
-                thumbnail = thumbnail - dark_thumb
-            thumbnails[i] = thumbnail
+                thumbnail = self._camera.get_thumbnail(
+                    seconds, file_path, thumbnail_size, keep_file=keep_files)
+                sweep.add(thumbnail)
 
-        master_mask = masks.any(axis=0)
-        master_mask = binary_dilation(master_mask, iterations=mask_dilations)
+                # Checks the metrics computed so far (all with the same mask), which may lag
+                # by a thumbnail.
+                if early_stop and focus_utils.peak_bracketed(sweep.metric, early_stop):
+                    self.logger.debug("Peak bracketed after {} of {} focus positions on {}",
+                                      i + 1, n_positions, self._camera)
+                    break
+        finally:
+            metric = sweep.finish()
 
-        # Apply the master mask and then get metrics for each frame.
-        for i, thumbnail in enumerate(thumbnails):
-            thumbnail = np.ma.array(thumbnail, mask=master_mask)
-            metric[i] = focus_utils.focus_metric(
-                thumbnail, merit_function, **merit_function_kwargs)
+        n_positions = len(metric)
+        focus_positions = focus_positions[:n_positions]
 
         fitted = False
 
@@ -548,3 +565,80 @@ class AbstractFocuser(PanBase):
 
     def __str__(self):
         return "{} ({}) on {}".format(self.name, self.uid, self.port)
+
+
+class _FocusSweep(object):
+    """Computes the focus metric of each thumbnail of a sweep in a thread.
+
+    Saturated pixels of every thumbnail (dilated by `mask_dilations`) are masked in all of
+    them. The mask grows as thumbnails are added, and the earlier metrics are then computed
+    again, so `metric` always holds metrics computed with the same mask.
+    """
+
+    def __init__(self, dark_thumb, mask_dilations, merit_function, merit_function_kwargs):
+        self.dark_thumb = dark_thumb
+        self.mask_dilations = mask_dilations
+        self.merit_function = merit_function
+        self.merit_function_kwargs = merit_function_kwargs
+
+        self.metric = list()
+
+        self._thumbnails = list()
+        self._mask = None
+        self._queue = Queue()
+        self._thread = Thread(target=self._run, daemon=True)
+        self._error = None
+
+    def start(self):
+        self._thread.start()
+
+    def add(self, thumbnail):
+        self._queue.put(thumbnail)
+
+    def finish(self):
+        """Wait for all the metrics and return them as an array """
+        self._queue.put(None)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+        return np.array(self.metric, dtype=np.float64)
+
+    def _run(self):
+        while True:
+            thumbnail = self._queue.get()
+            if thumbnail is None:
+                return
+            try:
+                self._add_thumbnail(thumbnail)
+            except Exception as err:
+                self._error = err
+                return
+
+    def _add_thumbnail(self, thumbnail):
+        # Dilating each mask and combining them is the same as dilating the combined mask.
+        mask_changed = False
+        mask = focus_utils.mask_saturated(thumbnail).mask
+        if mask.any():
+            mask = binary_dilation(mask, iterations=self.mask_dilations)
+            if self._mask is None:
+                self._mask = mask
+                mask_changed = True
+            elif (mask & ~self._mask).any():
+                self._mask = self._mask | mask
+                mask_changed = True
+
+        if self.dark_thumb is not None:
+            thumbnail = thumbnail - self.dark_thumb
+        self._thumbnails.append(thumbnail)
+
+        if mask_changed:
+            # Replaced in one go, so the early stop check never sees a mix of masks.
+            self.metric = [self._compute(thumb) for thumb in self._thumbnails]
+        else:
+            self.metric.append(self._compute(thumbnail))
+
+    def _compute(self, thumbnail):
+        thumbnail = np.ma.array(thumbnail, mask=self._mask)
+        return focus_utils.focus_metric(thumbnail, self.merit_function,
+                                        **self.merit_function_kwargs)
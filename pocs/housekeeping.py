@@ -0,0 +1,245 @@
+import json
+import os
+import subprocess
+import sys
+import threading
+
+from collections import OrderedDict
+
+from pocs.base import PanBase
+
+
+class Housekeeper(PanBase):
+
+    # States of a job. Jobs that are `running` when the state is loaded didn't
+    # finish (e.g. POCS was restarted), so are run again.
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    def __init__(self, state_file=None, max_workers=None, timeout=None, max_attempts=None,
+                 *args, **kwargs):
+        """Clean up observation directories in parallel.
+
+        Each job cleans one directory (one camera for one sequence) with
+        `scripts/upload_image_dir.py`: compressing the FITS files, making the
+        timelapse, uploading the images and removing the jpgs, as requested. Up
+        to `max_workers` of these processes run at the same time, and each of
+        them gets an even share of the CPUs for compressing and of the upload
+        bandwidth (`panoptes_network.uploads.max_rate`).
+
+        The jobs are saved to `state_file` as they are added and finished, so
+        jobs that didn't finish are loaded and run by the next `run` after a
+        restart.
+
+        Options are read from the `observations.housekeeping` config item.
+
+        Args:
+            state_file (str, optional): JSON file of the jobs, default
+                `housekeeping.json` in the images directory.
+            max_workers (int, optional): Number of jobs run at the same time,
+                default 2.
+            timeout (float, optional): Seconds a job may run for before it is
+                killed, default 3600.
+            max_attempts (int, optional): Number of times a failing job is run
+                before it is dropped, default 3.
+            *args: Arguments to be passed to `PanBase`
+            **kwargs: Keyword args to be passed to `PanBase`
+        """
+        super().__init__(*args, **kwargs)
+
+        housekeeping_config = self.config.get('observations', {}).get('housekeeping', {})
+
+        if state_file is None:
+            state_file = os.path.join(self.config['directories']['images'], 'housekeeping.json')
+        if max_workers is None:
+            max_workers = housekeeping_config.get('max_workers', 2)
+        if timeout is None:
+            timeout = housekeeping_config.get('timeout', 3600)
+        if max_attempts is None:
+            max_attempts = housekeeping_config.get('max_attempts', 3)
+        assert max_workers > 0, self.logger.error("max_workers must be positive")
+
+        self.state_file = state_file
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.script_path = os.path.join(os.environ['POCS'], 'scripts', 'upload_image_dir.py')
+
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+        self._load()
+
+##################################################################################################
+# Properties
+##################################################################################################
+
+    @property
+    def pending(self):
+        """ Number of jobs still to be run """
+        return sum(1 for job in self._jobs.values() if job['state'] != self.DONE)
+
+##################################################################################################
+# Methods
+##################################################################################################
+
+    def add(self, directory, upload=False, make_timelapse=False, remove_jpgs=False):
+        """Add a directory to be cleaned.
+
+        A directory that is already waiting is updated with the new options.
+
+        Args:
+            directory (str): The directory, e.g. of one camera for one sequence.
+            upload (bool, optional): Upload the images, default False.
+            make_timelapse (bool, optional): Make a timelapse of the jpgs, default False.
+            remove_jpgs (bool, optional): Remove the jpgs afterwards, default False.
+        """
+        with self._lock:
+            self._jobs[directory] = {
+                'directory': directory,
+                'upload': upload,
+                'make_timelapse': make_timelapse,
+                'remove_jpgs': remove_jpgs,
+                'state': self.PENDING,
+                'attempts': self._jobs.get(directory, {}).get('attempts', 0),
+            }
+            self._save()
+
+    def progress(self):
+        """Number of jobs in each state """
+        with self._lock:
+            counts = {state: 0 for state in (self.PENDING, self.RUNNING, self.DONE, self.FAILED)}
+            for job in self._jobs.values():
+                counts[job['state']] += 1
+        return counts
+
+    def run(self, retry_failed=True):
+        """Run the jobs that are not done and wait for them to finish.
+
+        Finished jobs are then removed from the state file, failed ones are
+        kept to be run again by the next `run` until they have been tried
+        `max_attempts` times.
+
+        Args:
+            retry_failed (bool, optional): Also run the jobs that failed before,
+                default True.
+
+        Returns:
+            dict: Number of jobs in each state, see `progress`.
+        """
+        with self._lock:
+            states = [self.PENDING, self.RUNNING]
+            if retry_failed:
+                states.append(self.FAILED)
+            jobs = [job for job in self._jobs.values() if job['state'] in states]
+
+        if jobs:
+            self.logger.info("Housekeeping for {} directories with {} workers",
+                             len(jobs), self.max_workers)
+
+            job_queue = list(reversed(jobs))
+            threads = list()
+            for i in range(min(self.max_workers, len(jobs))):
+                t = threading.Thread(target=self._run_jobs, args=(job_queue, ), daemon=True)
+                t.name = 'HousekeepingThread{:02d}'.format(i)
+                t.start()
+                threads.append(t)
+
+            for t in threads:
+                t.join()
+
+        progress = self.progress()
+        self.logger.info("Housekeeping finished: {}", progress)
+
+        with self._lock:
+            for directory, job in list(self._jobs.items()):
+                if job['state'] == self.FAILED and job['attempts'] >= self.max_attempts:
+                    self.logger.warning("Giving up housekeeping for {} after {} attempts",
+                                        directory, job['attempts'])
+                elif job['state'] != self.DONE:
+                    continue
+                del self._jobs[directory]
+            self._save()
+
+        return progress
+
+    def _run_jobs(self, job_queue):
+        while True:
+            with self._lock:
+                if not job_queue:
+                    return
+                job = job_queue.pop()
+                job['state'] = self.RUNNING
+                job['attempts'] += 1
+                self._save()
+
+            succeeded = self._run_job(job)
+
+            with self._lock:
+                job['state'] = self.DONE if succeeded else self.FAILED
+                self._save()
+                done = sum(1 for j in self._jobs.values()
+                           if j['state'] in (self.DONE, self.FAILED))
+                self.logger.info("Housekeeping {}/{} {}: {}",
+                                 done, len(self._jobs), job['state'], job['directory'])
+
+    def _run_job(self, job):
+        cmd = [sys.executable, self.script_path, '--directory', job['directory']]
+
+        if job['upload']:
+            cmd.append('--upload')
+        if job['make_timelapse']:
+            cmd.append('--make_timelapse')
+        if job['remove_jpgs']:
+            cmd.append('--remove_jpgs')
+
+        # Share the CPUs and the upload bandwidth out between the jobs running at the same time.
+        cmd.extend(['--max_workers', str(max(1, (os.cpu_count() or 1) // self.max_workers))])
+        max_rate = self.config.get('panoptes_network', {}).get('uploads', {}).get('max_rate')
+        if job['upload'] and max_rate:
+            cmd.extend(['--max_rate', str(max_rate / self.max_workers)])
+
+        self.logger.debug("Cleaning directory {}", job['directory'])
+        proc = subprocess.Popen(cmd,
+                                universal_newlines=True,
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE)
+        try:
+            outs, errs = proc.communicate(timeout=self.timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            outs, errs = proc.communicate(timeout=10)
+            self.logger.warning("Timeout cleaning {}", job['directory'])
+            return False
+
+        if proc.returncode != 0:
+            self.logger.warning("Problem cleaning {}: {}", job['directory'], errs)
+            return False
+
+        return True
+
+    def _load(self):
+        try:
+            with open(self.state_file, 'r') as f:
+                jobs = json.load(f)
+        except FileNotFoundError:
+            return
+        except ValueError as err:
+            self.logger.warning("Ignoring invalid housekeeping state {}: {}", self.state_file, err)
+            return
+
+        for job in jobs:
+            self._jobs[job['directory']] = job
+
+        if self._jobs:
+            self.logger.info("Loaded {} unfinished housekeeping jobs", len(self._jobs))
+
+    def _save(self):
+        """Write the jobs to the state file, must be called with the lock held """
+        os.makedirs(os.path.dirname(self.state_file) or '.', exist_ok=True)
+        tmp_file = self.state_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(list(self._jobs.values()), f, indent=2)
+        os.replace(tmp_file, self.state_file)
@@ -10,6 +10,7 @@ from astropy.time import Time
 from collections import namedtuple
 
 from pocs.base import PanBase
+from pocs.utils import images as img_utils
 from pocs.utils.images import fits as fits_utils
 
 OffsetError = namedtuple('OffsetError', ['delta_ra', 'delta_dec', 'magnitude'])
@@ -216,6 +217,53 @@ class Image(PanBase):
 
         return OffsetError(d_ra.to(u.arcsec), d_dec.to(u.arcsec), mag.to(u.arcsec))
 
+    def compute_correlation_offset(self, ref_image, box_width=500, bin_size=2, **kwargs):
+        """Compute the offset from a reference image without solving this image.
+
+        The pixel shift between the central regions of the two images is found
+        by phase correlation (see `pocs.utils.images.measure_shift`) and then
+        converted to sky coordinates with the WCS of the reference image, so
+        only the reference image needs to be solved.
+
+        Args:
+            ref_image (`Image`): Solved image of the same field and camera.
+            box_width (int, optional): Size of the central box to correlate,
+                default 500 pixels.
+            bin_size (int, optional): Bin the data by this factor, default 2 to
+                remove the Bayer pattern of colour sensors.
+            **kwargs: Options passed to `measure_shift`.
+
+        Returns:
+            OffsetError: The offset in arcsec, as for `compute_offset`.
+
+        Raises:
+            error.PanError: If the images don't correlate.
+        """
+        assert isinstance(ref_image, Image), self.logger.warning(
+            "Must pass an Image class for reference")
+        assert ref_image.wcs is not None, self.logger.warning(
+            "Reference image must be solved")
+
+        ref_data = fits.getdata(ref_image.fits_file, ext=ref_image.header_ext)
+        data = fits.getdata(self.fits_file, ext=self.header_ext)
+
+        box_width = min(box_width, *data.shape)
+        dy, dx = img_utils.measure_shift(ref_data, data, box_width=box_width,
+                                         bin_size=bin_size, **kwargs)
+        self.logger.debug("Shift from {}: dx={:.02f} dy={:.02f} pixels", ref_image, dx, dy)
+
+        # The sky at the reference pixel of this image was at the shifted
+        # position in the reference image.
+        crpix_x, crpix_y = ref_image.wcs.celestial.wcs.crpix
+        ra, dec = ref_image.wcs.celestial.all_pix2world(crpix_x - dx, crpix_y - dy, 1)
+        pointing = SkyCoord(ra=float(ra) * u.degree, dec=float(dec) * u.degree)
+
+        mag = pointing.separation(ref_image.pointing)
+        d_dec = pointing.dec - ref_image.pointing.dec
+        d_ra = pointing.ra - ref_image.pointing.ra
+
+        return OffsetError(d_ra.to(u.arcsec), d_dec.to(u.arcsec), mag.to(u.arcsec))
+
 
 ##################################################################################################
 # Private Methods
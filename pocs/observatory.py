@@ -2,26 +2,24 @@ import os
 
 from collections import OrderedDict
 from datetime import datetime
-import subprocess
 from glob import glob
 
-from astroplan import Observer
 from astropy import units as u
-from astropy.coordinates import EarthLocation
 from astropy.coordinates import get_moon
 from astropy.coordinates import get_sun
 
 from pocs.base import PanBase
 import pocs.dome
+from pocs.housekeeping import Housekeeper
 from pocs.images import Image
-from pocs.scheduler.constraint import Duration
-from pocs.scheduler.constraint import MoonAvoidance
-from pocs.scheduler.constraint import Altitude
+from pocs.scheduler import create_scheduler_from_config
 from pocs.utils import current_time
 from pocs.utils import error
-from pocs.utils import horizon as horizon_utils
 from pocs.utils import load_module
+from pocs.utils.images import fits as fits_utils
+from pocs.utils.location import create_location_from_config
 from pocs.camera import AbstractCamera
+from pocs.camera.pipeline import ExposurePipeline
 
 
 class Observatory(PanBase):
@@ -48,6 +46,12 @@ class Observatory(PanBase):
 
         self.cameras = OrderedDict()
 
+        # Exposures from all cameras are processed by the same pipeline
+        self.pipeline = ExposurePipeline(config=self.config, logger=self.logger, db=self.db)
+
+        # Directories are cleaned up by a pool of jobs, resumed after a restart
+        self.housekeeper = Housekeeper(config=self.config, logger=self.logger, db=self.db)
+
         if cameras:
             self.logger.info('Adding the cameras to the observatory: {}', cameras)
             self._primary_camera = None
@@ -64,6 +68,17 @@ class Observatory(PanBase):
 
         self.current_offset_info = None
 
+        # Scale and index files of solved fields, for hinted plate solves.
+        pointing_config = self.config.get('pointing', {})
+        self.solve_cache = fits_utils.SolveCache(
+            radius=pointing_config.get('solve_radius', 2),
+            scale_tolerance=pointing_config.get('solve_scale_tolerance', 0.1))
+
+        # Measure offsets by correlation with the pointing image, only plate
+        # solving every `solve_interval` exposures (or if that fails).
+        self.correlate_offsets = pointing_config.get('correlate_offsets', True)
+        self.solve_interval = pointing_config.get('solve_interval', 10)
+
         self._image_dir = self.config['directories']['images']
         self.logger.info('\t Observatory initialized')
 
@@ -160,6 +175,7 @@ class Observatory(PanBase):
                 cam_name)
 
         self.cameras[cam_name] = camera
+        camera.pipeline = self.pipeline
         if camera.is_primary:
             self.primary_camera = camera
 
@@ -193,6 +209,7 @@ class Observatory(PanBase):
         """Power down the observatory. Currently does nothing
         """
         self.logger.debug("Shutting down observatory")
+        self.pipeline.stop()
         self.mount.disconnect()
         if self.dome:
             self.dome.disconnect()
@@ -274,8 +291,9 @@ class Observatory(PanBase):
     def cleanup_observations(self, upload_images=None, make_timelapse=None, keep_jpgs=None):
         """Cleanup observation list
 
-        Loops through the `observed_list` performing cleanup tasks. Resets
-        `observed_list` when done.
+        Loops through the `observed_list` adding a cleanup job for each camera
+        and sequence, then runs them in parallel (see `pocs.housekeeping.Housekeeper`).
+        Resets `observed_list` when done.
 
         Args:
             upload_images (None or bool, optional): If images should be uploaded to a Google
@@ -303,8 +321,9 @@ class Observatory(PanBase):
             except KeyError:
                 keep_jpgs = True
 
-        process_script = 'upload_image_dir.py'
-        process_script_path = os.path.join(os.environ['POCS'], 'scripts', process_script)
+        # Let the exposures that are still being processed finish first
+        self.logger.debug("Waiting for {} exposures to be processed", self.pipeline.pending)
+        self.pipeline.wait()
 
         for seq_time, observation in self.scheduler.observed_list.items():
             self.logger.debug("Housekeeping for {}".format(observation))
@@ -327,38 +346,14 @@ class Observatory(PanBase):
                 )
                 self.logger.info('Cleaning directory {}'.format(seq_dir))
 
-                process_cmd = [
-                    process_script_path,
-                    '--directory', seq_dir,
-                ]
-
-                if upload_images:
-                    process_cmd.append('--upload')
-
-                if make_timelapse:
-                    process_cmd.append('--make_timelapse')
+                self.housekeeper.add(seq_dir,
+                                     upload=bool(upload_images),
+                                     make_timelapse=bool(make_timelapse),
+                                     remove_jpgs=keep_jpgs is False)
 
-                if keep_jpgs is False:
-                    process_cmd.append('--remove_jpgs')
-
-                # Start the subprocess in background and collect proc object.
-                clean_proc = subprocess.Popen(process_cmd,
-                                              universal_newlines=True,
-                                              stdout=subprocess.PIPE,
-                                              stderr=subprocess.PIPE
-                                              )
-                self.logger.info('Cleaning directory pid={}'.format(clean_proc.pid))
-
-                # Block and wait for directory to finish
-                try:
-                    outs, errs = clean_proc.communicate(timeout=3600)  # one hour
-                except subprocess.TimeoutExpired:  # pragma: no cover
-                    clean_proc.kill()
-                    outs, errs = clean_proc.communicate(timeout=10)
-                    if errs is not None:
-                        self.logger.warning("Problem cleaning: {}".format(errs))
-
-            self.logger.debug('Cleanup finished')
+        # Also runs any jobs left unfinished before a restart.
+        self.housekeeper.run()
+        self.logger.debug('Cleanup finished')
 
         self.scheduler.reset_observed_list()
 
@@ -394,12 +389,59 @@ class Observatory(PanBase):
 
         return camera_events
 
+    def solve_image(self, image, field_name=None, **kwargs):
+        """Plate solve an image, using what is known from earlier solves of the field.
+
+        If the field has been solved before the solve is limited to the index files,
+        pixel scale and a small radius around the header RA/Dec (see
+        `~pocs.utils.images.fits.SolveCache`), which is much faster than a full solve.
+        If that fails a full solve is done. Successful solves are remembered.
+
+        Args:
+            image (`pocs.images.Image`): The image to solve.
+            field_name (str, optional): Name of the field, defaults to the `FIELD`
+                header of the image. Nothing is remembered if there is no name.
+            **kwargs: Options passed to `Image.solve_field`.
+
+        Returns:
+            dict: The solve information, see `Image.solve_field`.
+
+        Raises:
+            error.SolveError: If the image can't be solved.
+        """
+        if field_name is None:
+            field_name = image.header.get('FIELD')
+
+        hints = self.solve_cache.get_hints(field_name) if field_name else dict()
+        hints.update(kwargs)
+
+        try:
+            solve_info = image.solve_field(**hints)
+        except error.SolveError:
+            if field_name not in self.solve_cache:
+                raise
+
+            self.logger.debug("Hinted solve failed for {}, trying full solve", field_name)
+            self.solve_cache.remove(field_name)
+            solve_info = image.solve_field(**kwargs)
+
+        if field_name:
+            # The returned info has no comments, which list the index files used.
+            self.solve_cache.update(field_name, fits_utils.getheader(image.wcs_file))
+
+        return solve_info
+
     def analyze_recent(self):
         """Analyze the most recent exposure
 
         Compares the most recent exposure to the reference exposure and determines
         the offset between the two.
 
+        If `correlate_offsets` is set the offset is measured by correlating the
+        image with the (solved) pointing image, which is much faster than a plate
+        solve. The image is instead solved every `solve_interval` exposures or
+        when the correlation fails.
+
         Returns:
             dict: Offset information
         """
@@ -416,13 +458,28 @@ class Observatory(PanBase):
 
             current_image = Image(image_path, location=self.earth_location)
 
-            solve_info = current_image.solve_field(skip_solved=False)
+            method = 'solve'
+            if self.correlate_offsets:
+                exp_num = self.current_observation.current_exp_num
+                if not self.solve_interval or exp_num % self.solve_interval != 0:
+                    try:
+                        self.current_offset_info = current_image.compute_correlation_offset(
+                            pointing_image)
+                        method = 'correlation'
+                    except Exception as e:
+                        self.logger.debug("Can't correlate with pointing image: {}", e)
+
+            if self.current_offset_info is None:
+                solve_info = self.solve_image(current_image,
+                                              field_name=self.current_observation.field.field_name,
+                                              skip_solved=False)
+
+                self.logger.debug("Solve Info: {}".format(solve_info))
 
-            self.logger.debug("Solve Info: {}".format(solve_info))
+                # Get the offset between the two
+                self.current_offset_info = current_image.compute_offset(pointing_image)
 
-            # Get the offset between the two
-            self.current_offset_info = current_image.compute_offset(pointing_image)
-            self.logger.debug('Offset Info: {}'.format(self.current_offset_info))
+            self.logger.debug('Offset Info ({}): {}'.format(method, self.current_offset_info))
 
             # Store the offset information
             self.db.insert('offset_info', {
@@ -431,6 +488,7 @@ class Observatory(PanBase):
                 'd_dec': self.current_offset_info.delta_dec.value,
                 'magnitude': self.current_offset_info.magnitude.value,
                 'unit': 'arcsec',
+                'method': method,
             })
 
         except error.SolveError:
@@ -620,56 +678,17 @@ class Observatory(PanBase):
         Sets up the site and location details for the observatory
 
         Note:
-            These items are read from the 'site' config directive and include:
-                * name
-                * latitude
-                * longitude
-                * timezone
-                * presseure
-                * elevation
-                * horizon
+            See `pocs.utils.location.create_location_from_config` for the
+            config items that are used.
 
         """
         self.logger.debug('Setting up site details of observatory')
 
-        try:
-            config_site = self.config.get('location')
-
-            name = config_site.get('name', 'Nameless Location')
-
-            latitude = config_site.get('latitude')
-            longitude = config_site.get('longitude')
-
-            timezone = config_site.get('timezone')
-
-            pressure = config_site.get('pressure', 0.680) * u.bar
-            elevation = config_site.get('elevation', 0 * u.meter)
-            horizon = config_site.get('horizon', 30 * u.degree)
-            flat_horizon = config_site.get('flat_horizon', -6 * u.degree)
-            focus_horizon = config_site.get('focus_horizon', -12 * u.degree)
-            observe_horizon = config_site.get('observe_horizon', -18 * u.degree)
-
-            self.location = {
-                'name': name,
-                'latitude': latitude,
-                'longitude': longitude,
-                'elevation': elevation,
-                'timezone': timezone,
-                'pressure': pressure,
-                'horizon': horizon,
-                'flat_horizon': flat_horizon,
-                'focus_horizon': focus_horizon,
-                'observe_horizon': observe_horizon,
-            }
-            self.logger.debug("Location: {}".format(self.location))
+        site_details = create_location_from_config(self.config, logger=self.logger)
 
-            # Create an EarthLocation for the mount
-            self.earth_location = EarthLocation(
-                lat=latitude, lon=longitude, height=elevation)
-            self.observer = Observer(
-                location=self.earth_location, name=name, timezone=timezone)
-        except Exception:
-            raise error.PanError(msg='Bad site information')
+        self.location = site_details['location']
+        self.earth_location = site_details['earth_location']
+        self.observer = site_details['observer']
 
     def _create_mount(self, mount_info=None):
         """Creates a mount object.
@@ -726,44 +745,5 @@ class Observatory(PanBase):
 
     def _create_scheduler(self):
         """ Sets up the scheduler that will be used by the observatory """
-
-        scheduler_config = self.config.get('scheduler', {})
-        scheduler_type = scheduler_config.get('type', 'dispatch')
-
-        # Read the targets from the file
-        fields_file = scheduler_config.get('fields_file', 'simple.yaml')
-        fields_path = os.path.join(self.config['directories'][
-                                   'targets'], fields_file)
-        self.logger.debug('Creating scheduler: {}'.format(fields_path))
-
-        if os.path.exists(fields_path):
-
-            try:
-                # Load the required module
-                module = load_module(
-                    'pocs.scheduler.{}'.format(scheduler_type))
-
-                obstruction_list = self.config['location'].get('obstructions', list())
-                default_horizon = self.config['location'].get('horizon', 30 * u.degree)
-
-                horizon_line = horizon_utils.Horizon(
-                    obstructions=obstruction_list,
-                    default_horizon=default_horizon.value
-                )
-
-                # Simple constraint for now
-                constraints = [
-                    Altitude(horizon=horizon_line),
-                    MoonAvoidance(),
-                    Duration(default_horizon)
-                ]
-
-                # Create the Scheduler instance
-                self.scheduler = module.Scheduler(
-                    self.observer, fields_file=fields_path, constraints=constraints)
-                self.logger.debug("Scheduler created")
-            except ImportError as e:
-                raise error.NotFound(msg=e)
-        else:
-            raise error.NotFound(
-                msg="Fields file does not exist: {}".format(fields_file))
+        self.scheduler = create_scheduler_from_config(
+            self.config, observer=self.observer, logger=self.logger)
@@ -1 +1,103 @@
+import os
+
+from astropy import units as u
+
 from pocs.scheduler.scheduler import BaseScheduler  # pragma: no flakes
+from pocs.scheduler.constraint import Altitude
+from pocs.scheduler.constraint import Duration
+from pocs.scheduler.constraint import MoonAvoidance
+from pocs.utils import error
+from pocs.utils import horizon as horizon_utils
+from pocs.utils import load_module
+from pocs.utils.logger import get_root_logger
+
+
+def create_constraints_from_config(config, logger=None):
+    """Create the default scheduler constraints from the `location` config.
+
+    Args:
+        config (dict): The config, which must contain `location` and `directories`.
+        logger (`logging.Logger`, optional): Logger to use, defaults to the
+            root logger.
+
+    Returns:
+        list: The `~pocs.scheduler.constraint.BaseConstraint` instances.
+    """
+    if not logger:
+        logger = get_root_logger()
+
+    obstruction_list = config['location'].get('obstructions', list())
+    default_horizon = config['location'].get('horizon', 30 * u.degree)
+    horizon_file = config['location'].get('horizon_file')
+
+    if horizon_file is not None:
+        # Precomputed horizon saved with `Horizon.save`
+        horizon_path = os.path.join(config['directories']['resources'], horizon_file)
+        logger.debug('Loading horizon from {}', horizon_path)
+        horizon_line = horizon_utils.Horizon.load(horizon_path)
+    else:
+        horizon_line = horizon_utils.Horizon(
+            obstructions=obstruction_list,
+            default_horizon=default_horizon.value,
+            resolution=config['location'].get('horizon_resolution', 1.)
+        )
+
+    # Simple constraint for now
+    constraints = [
+        Altitude(horizon=horizon_line),
+        MoonAvoidance(),
+        Duration(default_horizon)
+    ]
+
+    return constraints
+
+
+def create_scheduler_from_config(config, observer, fields_file=None, logger=None):
+    """Create the scheduler specified in the config.
+
+    Args:
+        config (dict): The config, see `scheduler` entry for the type of scheduler
+            and default fields file.
+        observer (`astroplan.Observer`): The physical location the scheduling
+            will take place from.
+        fields_file (str, optional): The fields file to use instead of the one in
+            the config. Relative paths are in the `targets` directory.
+        logger (`logging.Logger`, optional): Logger to use, defaults to the
+            root logger.
+
+    Returns:
+        `pocs.scheduler.BaseScheduler`: An instance of the `Scheduler` class
+            from the configured module.
+
+    Raises:
+        error.NotFound: If the fields file or the scheduler module can't be found.
+    """
+    if not logger:
+        logger = get_root_logger()
+
+    scheduler_config = config.get('scheduler', {})
+    scheduler_type = scheduler_config.get('type', 'dispatch')
+
+    # Read the targets from the file
+    if fields_file is None:
+        fields_file = scheduler_config.get('fields_file', 'simple.yaml')
+    fields_path = os.path.join(config['directories']['targets'], fields_file)
+    logger.debug('Creating scheduler: {}'.format(fields_path))
+
+    if not os.path.exists(fields_path):
+        raise error.NotFound(
+            msg="Fields file does not exist: {}".format(fields_file))
+
+    try:
+        # Load the required module
+        module = load_module('pocs.scheduler.{}'.format(scheduler_type))
+    except ImportError as e:
+        raise error.NotFound(msg=e)
+
+    constraints = create_constraints_from_config(config, logger=logger)
+
+    # Create the Scheduler instance
+    scheduler = module.Scheduler(observer, fields_file=fields_path, constraints=constraints)
+    logger.debug("Scheduler created")
+
+    return scheduler
@@ -1,9 +1,31 @@
+import numpy as np
+
 from astropy import units as u
+from astropy.coordinates import SkyCoord
 
 from pocs.utils import horizon as horizon_utils
 from pocs.base import PanBase
 
 
+def get_field_coords(observations):
+    """Combine the field positions of `observations` into a single `SkyCoord`.
+
+    Building one array-valued coordinate lets the constraints transform every
+    field with a single astropy call instead of one call per target.
+
+    Args:
+        observations (list): A list of `~pocs.scheduler.observation.Observation`.
+
+    Returns:
+        `astropy.coordinates.SkyCoord`: An ICRS coordinate with one entry per
+            observation, in the same order.
+    """
+    ra = [obs.field.coord.icrs.ra.degree for obs in observations]
+    dec = [obs.field.coord.icrs.dec.degree for obs in observations]
+
+    return SkyCoord(ra=ra * u.degree, dec=dec * u.degree, frame='icrs')
+
+
 class BaseConstraint(PanBase):
 
     def __init__(self, weight=1.0, default_score=0.0, *args, **kwargs):
@@ -13,6 +35,10 @@ class BaseConstraint(PanBase):
         for determining a score for a particular target and observer at a given
         time. The `score` is then multiplied by the `weight` of the constraint.
 
+        Constraints that can evaluate many targets at once should override
+        `get_scores`, which the scheduler uses to score every observation in
+        a single call.
+
         Args:
             weight (float, optional): The weight of the observation, which will
                 be multipled by the score
@@ -30,8 +56,49 @@ class BaseConstraint(PanBase):
         self.weight = weight
         self._score = default_score
 
-    def get_score(self, time, observer, target):
-        raise NotImplementedError
+    def get_score(self, time, observer, observation, **kwargs):
+        """Get the veto and score for a single observation.
+
+        Args:
+            time (astropy.time.Time): Time at which to score the observation.
+            observer (astroplan.Observer): The location of the observatory.
+            observation (pocs.scheduler.observation.Observation): The observation
+                to score.
+            **kwargs: Common properties from the scheduler, e.g. `end_of_night`,
+                `moon` and `observed_list`.
+
+        Returns:
+            tuple: A `(veto, score)` pair, with the score multiplied by `weight`.
+        """
+        vetoes, scores = self.get_scores(time, observer, [observation], **kwargs)
+        return bool(vetoes[0]), float(scores[0])
+
+    def get_scores(self, time, observer, observations, **kwargs):
+        """Get the vetoes and scores for a list of observations.
+
+        The default implementation calls `get_score` for each observation.
+        Subclasses should override at least one of the two methods.
+
+        Args:
+            time (astropy.time.Time): Time at which to score the observations.
+            observer (astroplan.Observer): The location of the observatory.
+            observations (list): The `~pocs.scheduler.observation.Observation`
+                objects to score.
+            **kwargs: Common properties from the scheduler, see `get_score`.
+
+        Returns:
+            tuple(numpy.array, numpy.array): A boolean array of vetoes and a
+                float array of weighted scores, in the same order as `observations`.
+        """
+        if type(self).get_score is BaseConstraint.get_score:
+            raise NotImplementedError
+
+        vetoes = np.zeros(len(observations), dtype=bool)
+        scores = np.zeros(len(observations), dtype=float)
+        for i, observation in enumerate(observations):
+            vetoes[i], scores[i] = self.get_score(time, observer, observation, **kwargs)
+
+        return vetoes, scores
 
 
 class Altitude(BaseConstraint):
@@ -42,27 +109,30 @@ class Altitude(BaseConstraint):
         """Create an Altitude constraint from a valid `Horizon`. """
         super().__init__(*args, **kwargs)
         assert isinstance(horizon, horizon_utils.Horizon)
+        self.horizon = horizon
         self.horizon_line = horizon.horizon_line
 
-    def get_score(self, time, observer, observation, **kwargs):
-        veto = False
-        score = self._score
+    def get_scores(self, time, observer, observations, **kwargs):
+        scores = np.full(len(observations), self._score, dtype=float)
+        if len(observations) == 0:
+            return np.zeros(0, dtype=bool), scores
 
-        target = observation.field
+        altaz = observer.altaz(time, target=get_field_coords(observations))
 
-        # Note we just get nearest integer
-        target_az = int(observer.altaz(time, target=target).az.value)
-        target_alt = observer.altaz(time, target=target).alt.degree
+        target_alt = altaz.alt.degree
 
         # Determine if the target altitude is above or below the determined
         # minimum elevation for that azimuth
-        min_alt = self.horizon_line[target_az]
-        if target_alt < min_alt:
-            self.logger.debug("\t\tBelow minimum altitude: {:.02f} < {:.02f}", target_alt, min_alt)
-            veto = True
-        else:
-            score = 100
-        return veto, score * self.weight
+        min_alt = self.horizon.min_altitude(altaz.az.degree)
+        vetoes = target_alt < min_alt
+
+        for i in np.flatnonzero(vetoes):
+            self.logger.debug("\t\t{} below minimum altitude: {:.02f} < {:.02f}",
+                              observations[i].name, target_alt[i], min_alt[i])
+
+        scores[~vetoes] = 100
+
+        return vetoes, scores * self.weight
 
     def __str__(self):
         return "Altitude"
@@ -75,53 +145,69 @@ class Duration(BaseConstraint):
         super().__init__(*args, **kwargs)
         self.horizon = horizon
 
-    def get_score(self, time, observer, observation, **kwargs):
-        veto = False
-        score = self._score
-
-        target = observation.field
-
-        veto = not observer.target_is_up(time, target, horizon=self.horizon)
-
-        end_of_night = kwargs.get('end_of_night',
-                                  observer.tonight(time=time, horizon=-18 * u.degree)[1])
-
-        if not veto:
-            # Get the next meridian flip
-            target_meridian = observer.target_meridian_transit_time(
-                time, target,
-                which='next')
-
-            # If it flips before end_of_night it hasn't flipped yet so
-            # use the meridian time as the end time
-            if target_meridian < end_of_night:
-
-                # If target can't meet minimum duration before flip, veto
-                if time + observation.minimum_duration > target_meridian:
-                    self.logger.debug("\t\tObservation minimum can't be met before meridian flip")
-                    veto = True
-
-            # else:
-            # Get the next set time
-            target_end_time = observer.target_set_time(
-                time, target,
-                which='next',
-                horizon=self.horizon)
-
-            # If end_of_night happens before target sets, use end_of_night
-            if target_end_time > end_of_night:
-                self.logger.debug("\t\tTarget sets past end_of_night, using end_of_night")
-                target_end_time = end_of_night
+    def get_scores(self, time, observer, observations, **kwargs):
+        scores = np.full(len(observations), self._score, dtype=float)
+        if len(observations) == 0:
+            return np.zeros(0, dtype=bool), scores
+
+        targets = get_field_coords(observations)
+
+        end_of_night = kwargs.get('end_of_night')
+        if end_of_night is None:
+            end_of_night = observer.tonight(time=time, horizon=-18 * u.degree)[1]
+
+        vetoes = ~np.atleast_1d(observer.target_is_up(time, targets, horizon=self.horizon))
+        up = ~vetoes
+
+        if up.any():
+            up_observations = [observations[i] for i in np.flatnonzero(up)]
+            min_durations = np.array([
+                obs.minimum_duration.to(u.second).value for obs in up_observations
+            ])
+
+            # Work in seconds from `time` for all of the comparisons below.
+            night_remaining = (end_of_night - time).sec
+
+            # Get the next meridian flip and set time, from the nightly
+            # ephemeris if the scheduler provides one.
+            ephemeris = kwargs.get('ephemeris')
+            if ephemeris is not None:
+                target_meridian, target_end_jd = ephemeris.get_times(
+                    time, up_observations, self.horizon)
+                to_set = (target_end_jd - time.jd) * 86400.
+            else:
+                up_targets = targets[up]
+                target_meridian = observer.target_meridian_transit_time(
+                    time, up_targets,
+                    which='next')
+
+                target_end_time = observer.target_set_time(
+                    time, up_targets,
+                    which='next',
+                    horizon=self.horizon)
+                to_set = np.ma.masked_invalid(np.atleast_1d((target_end_time - time).sec))
+
+            to_meridian = np.atleast_1d((target_meridian - time).sec)
+            # Targets that never set are limited by end_of_night below.
+            to_set = np.ma.filled(to_set, np.inf)
+
+            # If it flips before end_of_night it hasn't flipped yet so if target
+            # can't meet minimum duration before flip, veto
+            meridian_veto = (to_meridian < night_remaining) & (min_durations > to_meridian)
+            if meridian_veto.any():
+                self.logger.debug("\t\tObservation minimum can't be met before meridian flip")
+
+            # If end_of_night happens before target sets, use end_of_night.
+            up_scores = np.minimum(to_set, night_remaining)
 
             # Total seconds is score
-            score = (target_end_time - time).sec
-            if score < observation.minimum_duration.value:
-                veto = True
+            duration_veto = up_scores < min_durations
 
             # Normalize the score based on total possible number of seconds
-            score = score / (end_of_night - time).sec
+            scores[up] = up_scores / night_remaining
+            vetoes[up] = meridian_veto | duration_veto
 
-        return veto, score * self.weight
+        return vetoes, scores * self.weight
 
     def __str__(self):
         return "Duration above {}".format(self.horizon)
@@ -132,25 +218,26 @@ class MoonAvoidance(BaseConstraint):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
-    def get_score(self, time, observer, observation, **kwargs):
-        veto = False
-        score = self._score
+    def get_scores(self, time, observer, observations, **kwargs):
+        scores = np.full(len(observations), self._score, dtype=float)
+        if len(observations) == 0:
+            return np.zeros(0, dtype=bool), scores
 
         try:
             moon = kwargs['moon']
         except KeyError:
             self.logger.error("Moon must be set")
 
-        moon_sep = moon.separation(observation.field.coord).value
+        moon_sep = np.atleast_1d(moon.separation(get_field_coords(observations)).degree)
 
         # This would potentially be within image
-        if moon_sep < 15:
-            self.logger.debug("\t\tMoon separation: {:.02f}".format(moon_sep))
-            veto = True
-        else:
-            score = (moon_sep / 180)
+        vetoes = moon_sep < 15
+        for sep in moon_sep[vetoes]:
+            self.logger.debug("\t\tMoon separation: {:.02f}".format(sep))
+
+        scores[~vetoes] = moon_sep[~vetoes] / 180
 
-        return veto, score * self.weight
+        return vetoes, scores * self.weight
 
     def __str__(self):
         return "Moon Avoidance"
@@ -167,18 +254,16 @@ class AlreadyVisited(BaseConstraint):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
-    def get_score(self, time, observer, observation, **kwargs):
-        veto = False
-        score = self._score
-
+    def get_scores(self, time, observer, observations, **kwargs):
         observed_list = kwargs.get('observed_list')
 
         observed_field_list = [obs.field for obs in observed_list.values()]
 
-        if observation.field in observed_field_list:
-            veto = True
+        vetoes = np.array([obs.field in observed_field_list for obs in observations],
+                          dtype=bool)
+        scores = np.full(len(observations), self._score, dtype=float)
 
-        return veto, score * self.weight
+        return vetoes, scores * self.weight
 
     def __str__(self):
         return "Already Visited"
@@ -46,21 +46,26 @@ class Scheduler(BaseScheduler):
 
         for constraint in listify(self.constraints):
             self.logger.info("Checking Constraint: {}".format(constraint))
-            for obs_name, observation in self.observations.items():
-                if obs_name in valid_obs:
-                    self.logger.debug("\tObservation: {}".format(obs_name))
 
-                    veto, score = constraint.get_score(
-                        time, self.observer, observation, **self.common_properties)
+            # Score all of the remaining observations at once
+            obs_names = list(valid_obs.keys())
+            if len(obs_names) == 0:
+                break
 
-                    self.logger.debug("\t\tScore: {:.05f}\tVeto: {}".format(score, veto))
+            vetoes, scores = constraint.get_scores(
+                time, self.observer, [self.observations[name] for name in obs_names],
+                **self.common_properties)
 
-                    if veto:
-                        self.logger.debug("\t\t{} vetoed by {}".format(obs_name, constraint))
-                        del valid_obs[obs_name]
-                        continue
+            for obs_name, veto, score in zip(obs_names, vetoes, scores):
+                self.logger.debug("\tObservation: {}\tScore: {:.05f}\tVeto: {}",
+                                  obs_name, score, veto)
 
-                    valid_obs[obs_name] += score
+                if veto:
+                    self.logger.debug("\t\t{} vetoed by {}".format(obs_name, constraint))
+                    del valid_obs[obs_name]
+                    continue
+
+                valid_obs[obs_name] += float(score)
 
         for obs_name, score in valid_obs.items():
             valid_obs[obs_name] += self.observations[obs_name].priority
@@ -0,0 +1,239 @@
+import numpy as np
+
+from astropy import units as u
+from astropy.time import Time
+
+from pocs.base import PanBase
+from pocs.scheduler.constraint import get_field_coords
+
+# Length of a sidereal day in days. The transit and set times of a fixed
+# target repeat with this period.
+SIDEREAL_DAY = 0.99726956634
+
+
+class Ephemeris(PanBase):
+
+    def __init__(self, observer, *args, **kwargs):
+        """A per-night table of target ephemerides.
+
+        Finding the meridian transit and set times of a target requires a
+        root-finding search by `astroplan`, which is slow when repeated for
+        every target on every scheduling pass. For a fixed target both of
+        these events repeat every sidereal day, so the `Ephemeris` solves
+        them once per field and night and then only has to shift the stored
+        reference times to the next occurrence after the requested time.
+
+        Entries are keyed by the field name and remember the position they
+        were computed for, so a field that is edited (e.g. a new position in
+        the fields file) is recomputed on the next lookup. All entries are
+        dropped when a new night starts.
+
+        Args:
+            observer (`astroplan.Observer`): The physical location the scheduling
+                will take place from.
+            *args: Arguments to be passed to `PanBase`
+            **kwargs: Keyword args to be passed to `PanBase`
+        """
+        super().__init__(*args, **kwargs)
+
+        self.observer = observer
+
+        self._night = None
+        self._table = dict()
+
+        # Cached end of night as a (valid_from, end_of_night) pair.
+        self._end_of_night = dict()
+
+##########################################################################
+# Properties
+##########################################################################
+
+    @property
+    def night(self):
+        """ The night for which the table is currently built """
+        return self._night
+
+    @property
+    def field_names(self):
+        """ Names of the fields currently in the table """
+        return list(self._table.keys())
+
+##########################################################################
+# Methods
+##########################################################################
+
+    def get_night(self, time):
+        """Get the night that `time` belongs to.
+
+        Nights are numbered by the Julian Day Number at the preceding local
+        (mean solar) noon of the observer, so an entire night shares a key.
+
+        Args:
+            time (astropy.time.Time): The time to look up.
+
+        Returns:
+            int: The night number.
+        """
+        longitude = self.observer.location.lon.degree
+        return int(np.floor(time.jd + longitude / 360.))
+
+    def clear(self):
+        """Remove all entries from the table """
+        self._table = dict()
+        self._end_of_night = dict()
+        self._night = None
+
+    def invalidate(self, field_name):
+        """Remove the entry for a single field.
+
+        Args:
+            field_name (str): Name of the field, i.e. the key in the scheduler
+                `observations`.
+        """
+        self._table.pop(field_name, None)
+
+    def build(self, time, observations, horizon):
+        """Compute the table entries for `observations`.
+
+        Only entries that are missing, were computed for a different position
+        or for another night are (re)computed. Entries for fields that are not
+        in `observations` are left in place.
+
+        Args:
+            time (astropy.time.Time): A time in the night to build the table for.
+            observations (list): The `~pocs.scheduler.observation.Observation`
+                objects to add to the table.
+            horizon (astropy.units.Quantity): The horizon used for the set times.
+        """
+        night = self.get_night(time)
+        if night != self._night:
+            self.logger.debug("Building ephemeris for night {}", night)
+            self._table = dict()
+            self._night = night
+
+        horizon_key = self._horizon_key(horizon)
+
+        needed = list()
+        for observation in observations:
+            entry = self._table.get(observation.name)
+            if entry is None or entry['position'] != self._position_key(observation):
+                self._table.pop(observation.name, None)
+                needed.append(observation)
+            elif horizon_key not in entry['set']:
+                needed.append(observation)
+
+        if len(needed) == 0:
+            return
+
+        self.logger.debug("Computing ephemeris for {} fields", len(needed))
+
+        targets = get_field_coords(needed)
+
+        meridian_jd = np.atleast_1d(self.observer.target_meridian_transit_time(
+            time, targets, which='next').jd)
+
+        set_jd = np.ma.filled(np.ma.masked_invalid(np.atleast_1d(self.observer.target_set_time(
+            time, targets, which='next', horizon=horizon).jd)), np.nan)
+
+        for observation, meridian, set_time in zip(needed, meridian_jd, set_jd):
+            entry = self._table.setdefault(observation.name, {
+                'position': self._position_key(observation),
+                'meridian': meridian,
+                'set': dict(),
+            })
+            entry['set'][horizon_key] = set_time
+
+    def get_meridian_times(self, time, observations):
+        """Get the next meridian transit of each observation after `time`.
+
+        Args:
+            time (astropy.time.Time): The time to look up.
+            observations (list): The `~pocs.scheduler.observation.Observation`
+                objects to look up, which must already be in the table.
+
+        Returns:
+            `astropy.time.Time`: An array of transit times.
+        """
+        reference = np.array([self._table[obs.name]['meridian'] for obs in observations])
+        return Time(self._next_occurrence(time, reference), format='jd')
+
+    def get_set_times(self, time, observations, horizon):
+        """Get the next time each observation sets below `horizon` after `time`.
+
+        Args:
+            time (astropy.time.Time): The time to look up.
+            observations (list): The `~pocs.scheduler.observation.Observation`
+                objects to look up, which must already be in the table.
+            horizon (astropy.units.Quantity): The horizon given to `build`.
+
+        Returns:
+            `numpy.ma.MaskedArray`: The set times as Julian Dates, masked for
+                targets that never cross `horizon`.
+        """
+        horizon_key = self._horizon_key(horizon)
+        reference = np.array([self._table[obs.name]['set'][horizon_key]
+                              for obs in observations])
+        return np.ma.masked_invalid(self._next_occurrence(time, reference))
+
+    def get_times(self, time, observations, horizon):
+        """Get the next meridian transit and set times for `observations`.
+
+        The table is built (or extended) as needed, see `build`.
+
+        Args:
+            time (astropy.time.Time): The time to look up.
+            observations (list): The `~pocs.scheduler.observation.Observation`
+                objects to look up.
+            horizon (astropy.units.Quantity): The horizon used for the set times.
+
+        Returns:
+            tuple: The meridian transit times (see `get_meridian_times`) and the
+                set times (see `get_set_times`).
+        """
+        self.build(time, observations, horizon)
+
+        return (self.get_meridian_times(time, observations),
+                self.get_set_times(time, observations, horizon))
+
+    def get_end_of_night(self, time, horizon=-18 * u.degree):
+        """Get the end of the night containing (or following) `time`.
+
+        The end of the night only changes once a day, so the value from
+        `astroplan.Observer.tonight` is reused for any later `time` before it.
+
+        Args:
+            time (astropy.time.Time): The time to look up.
+            horizon (astropy.units.Quantity, optional): The sun horizon that
+                defines the night, default -18°.
+
+        Returns:
+            `astropy.time.Time`: The end of the night.
+        """
+        horizon_key = self._horizon_key(horizon)
+        try:
+            valid_from, end_of_night = self._end_of_night[horizon_key]
+            if valid_from <= time <= end_of_night:
+                return end_of_night
+        except KeyError:
+            pass
+
+        end_of_night = self.observer.tonight(time=time, horizon=horizon)[-1]
+        self._end_of_night[horizon_key] = (time, end_of_night)
+
+        return end_of_night
+
+##########################################################################
+# Private Methods
+##########################################################################
+
+    def _next_occurrence(self, time, reference_jd):
+        """Shift `reference_jd` by whole sidereal days to the first time after `time` """
+        periods = np.ceil((time.jd - reference_jd) / SIDEREAL_DAY)
+        return reference_jd + periods * SIDEREAL_DAY
+
+    def _position_key(self, observation):
+        coord = observation.field.coord.icrs
+        return (coord.ra.degree, coord.dec.degree)
+
+    def _horizon_key(self, horizon):
+        return float(horizon.to(u.degree).value)
@@ -0,0 +1,291 @@
+import numpy as np
+
+from astropy import units as u
+from astropy.coordinates import get_moon
+
+from pocs.scheduler import dispatch
+from pocs.scheduler.constraint import get_field_coords
+from pocs.utils import current_time
+from pocs.utils import listify
+
+
+class Scheduler(dispatch.Scheduler):
+
+    def __init__(self, *args, **kwargs):
+        """A scheduler that plans the rest of the night.
+
+        The dispatch `~pocs.scheduler.dispatch.Scheduler` only picks the best
+        observation for "now". This scheduler instead scores every observation
+        with the constraints on a grid of times from now until the end of the
+        night and then finds the ordered timeline with the highest total merit
+        using dynamic programming. Switching between observations costs merit
+        in proportion to the slew distance (`slew_cost` per degree) and any
+        change of pier side, i.e. a meridian flip, costs `flip_cost`.
+
+        The plan is cached and `get_observation` returns the planned
+        observation for the requested time, once the constraints have been
+        checked again at that time. A new plan is made when the planned
+        observation is no longer valid, when the time is outside of the plan
+        (e.g. a new night), when the observations have changed (e.g. a reread
+        of the fields file) or after `reset_plan`.
+
+        The options are read from the `scheduler.lookahead` config item and
+        can be overridden with keyword arguments:
+
+            * time_step: Minutes between planning slots (default 20).
+            * slew_cost: Merit lost per degree of slew (default 0.5).
+            * flip_cost: Merit lost per meridian flip (default 50).
+        """
+        time_step = kwargs.pop('time_step', None)
+        slew_cost = kwargs.pop('slew_cost', None)
+        flip_cost = kwargs.pop('flip_cost', None)
+
+        dispatch.Scheduler.__init__(self, *args, **kwargs)
+
+        plan_config = self.config['scheduler'].get('lookahead', {})
+        if time_step is None:
+            time_step = plan_config.get('time_step', 20)
+        if slew_cost is None:
+            slew_cost = plan_config.get('slew_cost', 0.5)
+        if flip_cost is None:
+            flip_cost = plan_config.get('flip_cost', 50.)
+
+        self.time_step = time_step * u.minute
+        self.slew_cost = float(slew_cost)
+        self.flip_cost = float(flip_cost)
+
+        self._plan = list()
+        self._plan_key = None
+
+
+##########################################################################
+# Properties
+##########################################################################
+
+    @property
+    def plan(self):
+        """The current plan, see `build_plan` """
+        return self._plan
+
+##########################################################################
+# Methods
+##########################################################################
+
+    def reset_plan(self):
+        """Discard the current plan so a new one is made on the next call """
+        self._plan = list()
+        self._plan_key = None
+
+    def get_observation(self, time=None, show_all=False, reread_fields_file=False):
+        """Get the planned observation
+
+        Args:
+            time (astropy.time.Time, optional): Time at which scheduler applies,
+                defaults to time called
+            show_all (bool, optional): Return all valid observations along with
+                merit value, defaults to False to only get top value
+            reread_fields_file (bool, optional): If the fields file should be reread
+                before scheduling occurs, defaults to False.
+
+        Returns:
+            tuple or list: A tuple (or list of tuples) with name and score of ranked observations
+        """
+        if reread_fields_file:
+            self.logger.debug("Rereading fields file")
+            self.read_field_list()
+
+        if time is None:
+            time = current_time()
+
+        slot = self._get_plan_slot(time)
+
+        # The slot was scored at its start, the observation may have become invalid since.
+        if slot is not None and slot['observation'] is not None and \
+                not self._is_valid(slot['observation'], time):
+            self.logger.debug("Planned observation {} no longer valid, replanning",
+                              slot['observation'])
+            slot = None
+
+        if slot is None:
+            self.build_plan(time)
+            slot = self._get_plan_slot(time)
+
+        if slot is None or slot['observation'] is None:
+            # Nothing planned, fall back to the greedy dispatch scheduler
+            self.logger.debug("No planned observation, using dispatch scheduler")
+            return dispatch.Scheduler.get_observation(self, time=time, show_all=show_all)
+
+        obs_name = slot['observation']
+        merit = slot['merit']
+
+        self.current_observation = self.observations[obs_name]
+        self.current_observation.merit = merit
+
+        best_obs = [(obs_name, merit)]
+        if show_all:
+            best_obs.extend(sorted(
+                [(name, value) for name, value in slot['valid'].items() if name != obs_name],
+                key=lambda x: x[1], reverse=True))
+        else:
+            best_obs = best_obs[0]
+
+        return best_obs
+
+    def build_plan(self, time):
+        """Plan the observations from `time` until the end of the night.
+
+        Args:
+            time (astropy.time.Time): The start of the plan.
+
+        Returns:
+            list: The plan, a list with one dict per slot with the start `time`
+                of the slot, the name of the planned `observation` (None if
+                nothing can be observed), its `merit` and a dict of the merit
+                of all `valid` observations in the slot.
+        """
+        self.set_common_properties(time)
+        end_of_night = self.common_properties['end_of_night']
+
+        if time >= end_of_night:
+            self.reset_plan()
+            return self._plan
+
+        observations = list(self.observations.values())
+        obs_names = [obs.name for obs in observations]
+        num_obs = len(observations)
+
+        num_slots = int(np.ceil(((end_of_night - time) / self.time_step).decompose()))
+        times = time + np.arange(num_slots) * self.time_step
+
+        self.logger.debug("Building plan for {} observations in {} slots",
+                          num_obs, num_slots)
+
+        # The states are observing each field, idle while pointed at each field
+        # (so that idling is not a free way to slew) and idle at the start.
+        num_states = 2 * num_obs + 1
+        idle = num_states - 1
+
+        merits = np.zeros((num_slots, num_states))
+        merits[:, :num_obs] = -np.inf
+        sides = np.zeros((num_slots, num_obs), dtype=bool)
+        separation = np.zeros((num_obs, num_obs))
+
+        if num_obs > 0:
+            coords = get_field_coords(observations)
+            priorities = np.array([obs.priority for obs in observations])
+
+            # Angular distance between each pair of fields.
+            xyz = coords.cartesian.xyz.value
+            separation = np.degrees(np.arccos(np.clip(xyz.T.dot(xyz), -1., 1.)))
+
+            # Pier side from the sign of the hour angle in each slot.
+            lst = self.observer.local_sidereal_time(times).degree
+            hour_angle = np.mod(lst[:, None] - coords.ra.degree[None, :] + 180., 360.) - 180.
+            sides = hour_angle >= 0
+
+            moons = get_moon(times, self.observer.location)
+            for k, slot_time in enumerate(times):
+                common_properties = dict(self.common_properties)
+                common_properties['moon'] = moons[k]
+
+                valid, total = self._get_merits(slot_time, observations, common_properties)
+                merits[k, :num_obs][valid] = total[valid] + priorities[valid]
+
+        # Cost of going from one state (rows) to another (columns).
+        slew = self.slew_cost * separation
+        obs_states = np.arange(num_obs)
+
+        costs = np.full((num_states, num_states), np.inf)
+        costs[:num_obs, :num_obs] = slew
+        costs[obs_states, num_obs + obs_states] = 0.
+        costs[num_obs + obs_states, num_obs + obs_states] = 0.
+        costs[num_obs:idle, :num_obs] = slew
+        costs[idle, :num_obs] = 0.
+        costs[idle, idle] = 0.
+
+        # Start from the current observation if there is one.
+        value = np.full(num_states, -np.inf)
+        if self.current_observation is not None and self.current_observation.name in obs_names:
+            current_index = obs_names.index(self.current_observation.name)
+            value[:num_obs] = merits[0, :num_obs] - slew[current_index]
+            value[num_obs + current_index] = 0.
+        else:
+            value[:num_obs] = merits[0, :num_obs]
+            value[idle] = 0.
+
+        backtrack = np.zeros((num_slots, num_states), dtype=int)
+        for k in range(1, num_slots):
+            flips = sides[k - 1][:, None] != sides[k][None, :]
+
+            candidates = value[:, None] - costs
+            candidates[:num_obs, :num_obs] -= self.flip_cost * flips
+            backtrack[k] = np.argmax(candidates, axis=0)
+            value = candidates[backtrack[k], np.arange(num_states)] + merits[k]
+
+        # Follow the best path backwards.
+        path = np.zeros(num_slots, dtype=int)
+        path[-1] = np.argmax(value)
+        for k in range(num_slots - 1, 0, -1):
+            path[k - 1] = backtrack[k, path[k]]
+
+        self._plan = list()
+        for k, index in enumerate(path):
+            valid = {
+                name: float(merits[k, i]) for i, name in enumerate(obs_names)
+                if np.isfinite(merits[k, i])
+            }
+            planned = obs_names[index] if index < num_obs else None
+            self._plan.append({
+                'time': times[k],
+                'observation': planned,
+                'merit': valid.get(planned, 0.),
+                'valid': valid,
+            })
+
+        self._plan_key = self._get_plan_key()
+
+        return self._plan
+
+
+##########################################################################
+# Private Methods
+##########################################################################
+
+    def _get_merits(self, time, observations, common_properties):
+        """Score the observations in the same way as the dispatch scheduler """
+        valid = np.ones(len(observations), dtype=bool)
+        total = np.ones(len(observations))
+
+        for constraint in listify(self.constraints):
+            indices = np.flatnonzero(valid)
+            if len(indices) == 0:
+                break
+
+            vetoes, scores = constraint.get_scores(
+                time, self.observer, [observations[i] for i in indices], **common_properties)
+
+            valid[indices[vetoes]] = False
+            total[indices] += scores
+
+        return valid, total
+
+    def _is_valid(self, obs_name, time):
+        """Check the constraints for a planned observation at `time` """
+        self.set_common_properties(time)
+        valid, _ = self._get_merits(time, [self.observations[obs_name]], self.common_properties)
+        return bool(valid[0])
+
+    def _get_plan_key(self):
+        """Identify the observations a plan was made for """
+        return tuple(sorted((name, id(obs)) for name, obs in self._observations.items()))
+
+    def _get_plan_slot(self, time):
+        """Get the plan slot for `time` or None if the plan is out of date """
+        if len(self._plan) == 0 or self._plan_key != self._get_plan_key():
+            return None
+
+        index = int(np.floor(((time - self._plan[0]['time']) / self.time_step).decompose()))
+        if index < 0 or index >= len(self._plan):
+            return None
+
+        return self._plan[index]
@@ -1,3 +1,5 @@
+import hashlib
+import json
 import os
 import yaml
 
@@ -10,6 +12,8 @@ from astropy.coordinates import get_moon
 from pocs.base import PanBase
 from pocs.utils import error
 from pocs.utils import current_time
+from pocs.utils import flatten_time
+from pocs.scheduler.ephemeris import Ephemeris
 from pocs.scheduler.field import Field
 from pocs.scheduler.observation import Observation
 
@@ -49,8 +53,16 @@ class BaseScheduler(PanBase):
         self._fields_list = fields_list
         self._observations = dict()
 
+        # Hashes of the field entries (keyed by name) and of the fields file
+        # contents, used to only rebuild what has changed when rereading.
+        self._field_hashes = dict()
+        self._fields_file_hash = None
+
         self.observer = observer
 
+        # Target ephemerides, computed once per night
+        self.ephemeris = Ephemeris(observer, logger=self.logger, db=self.db)
+
         self.constraints = constraints
 
         self._current_observation = None
@@ -106,7 +118,7 @@ class BaseScheduler(PanBase):
             # and add to the list
             if new_observation is not None:
                 # Set the new seq_time for the observation
-                new_observation.seq_time = current_time(flatten=True)
+                new_observation.seq_time = self._get_new_seq_time()
 
                 # Add the new observation to the list
                 self.observed_list[new_observation.seq_time] = new_observation
@@ -118,7 +130,7 @@ class BaseScheduler(PanBase):
                 # If we have a new observation, check if same as old observation
                 if self.current_observation.name != new_observation.name:
                     self.current_observation.reset()
-                    new_observation.seq_time = current_time(flatten=True)
+                    new_observation.seq_time = self._get_new_seq_time()
 
                     # Add the new observation to the list
                     self.observed_list[new_observation.seq_time] = new_observation
@@ -186,6 +198,8 @@ class BaseScheduler(PanBase):
         # Clear out existing list and observations
         self.current_observation = None
         self._observations = dict()
+        self._field_hashes = dict()
+        self._fields_file_hash = None
 
     def get_observation(self, time=None, show_all=False):
         """Get a valid observation
@@ -228,6 +242,7 @@ class BaseScheduler(PanBase):
         Args:
             field_config (dict): Configuration items for `Observation`
         """
+        field_config = dict(field_config)
         if 'exptime' in field_config:
             field_config['exptime'] = float(field_config['exptime']) * u.second
 
@@ -254,12 +269,25 @@ class BaseScheduler(PanBase):
         try:
             obs = self._observations[field_name]
             del self._observations[field_name]
+            self.ephemeris.invalidate(field_name)
+
+            # Make sure the field is added again if still in the fields file
+            self._field_hashes.pop(field_name, None)
+            self._fields_file_hash = None
             self.logger.debug("Observation removed: {}".format(obs))
         except Exception:
             pass
 
     def read_field_list(self):
-        """Reads the field file and creates valid `Observations` """
+        """Reads the field file and creates valid `Observations`
+
+        Each field entry is hashed so that when the list is read again only
+        new or changed entries are turned into new `Observation`s. Unchanged
+        entries keep their existing `Observation` (and its state, e.g. the
+        `exposure_list` and `merit`). Fields that were previously read but are
+        no longer in the list are removed. If the fields file itself has not
+        changed then nothing is done.
+        """
         if self._fields_file is not None:
             self.logger.debug('Reading fields from file: {}'.format(self.fields_file))
 
@@ -267,22 +295,53 @@ class BaseScheduler(PanBase):
                 raise FileNotFoundError
 
             with open(self.fields_file, 'r') as f:
-                self._fields_list = yaml.load(f.read())
+                contents = f.read()
+
+            contents_hash = hashlib.md5(contents.encode()).hexdigest()
+            if contents_hash == self._fields_file_hash:
+                self.logger.debug('Fields file unchanged')
+                return
+
+            self._fields_list = yaml.load(contents)
 
         if self._fields_list is not None:
+            field_hashes = dict()
             for field_config in self._fields_list:
+                try:
+                    field_name = field_config['name']
+                    field_hash = self._get_field_hash(field_config)
+                except Exception as e:
+                    self.logger.warning("Error adding field: {}", e)
+                    continue
+
+                if self._field_hashes.get(field_name) == field_hash and \
+                        field_name in self._observations:
+                    field_hashes[field_name] = field_hash
+                    continue
+
                 try:
                     self.add_observation(field_config)
+                    field_hashes[field_name] = field_hash
                 except AssertionError:
                     self.logger.debug("Skipping duplicate field.")
                 except Exception as e:
                     self.logger.warning("Error adding field: {}", e)
 
+            for field_name in set(self._field_hashes) - set(field_hashes):
+                self.logger.debug("Field no longer in list: {}", field_name)
+                self.remove_observation(field_name)
+
+            self._field_hashes = field_hashes
+
+        if self._fields_file is not None:
+            self._fields_file_hash = contents_hash
+
     def set_common_properties(self, time):
 
         horizon_limit = self.config['location'].get('observe_horizon', -18 * u.degree)
         self.common_properties = {
-            'end_of_night': self.observer.tonight(time=time, horizon=horizon_limit)[-1],
+            'end_of_night': self.ephemeris.get_end_of_night(time, horizon=horizon_limit),
+            'ephemeris': self.ephemeris,
             'moon': get_moon(time, self.observer.location),
             'observed_list': self.observed_list
         }
@@ -294,3 +353,31 @@ class BaseScheduler(PanBase):
 ##########################################################################
 # Private Methods
 ##########################################################################
+
+    def _get_field_hash(self, field_config):
+        """Get a hash of a field configuration entry.
+
+        Args:
+            field_config (dict): Configuration items for `Observation`
+
+        Returns:
+            str: The hex digest of the entry.
+        """
+        entry = json.dumps(field_config, sort_keys=True, default=str)
+        return hashlib.md5(entry.encode()).hexdigest()
+
+    def _get_new_seq_time(self):
+        """Get a `seq_time` for a newly selected observation.
+
+        The `seq_time` is the key into the `observed_list`, so if the scheduler
+        selects more than one observation within the same second the time is
+        moved forward until it is unique rather than overwriting the entry.
+
+        Returns:
+            str: The flattened time, e.g. `20180901T120001`.
+        """
+        seq_time = current_time()
+        while flatten_time(seq_time) in self.observed_list:
+            seq_time = seq_time + 1 * u.second
+
+        return flatten_time(seq_time)
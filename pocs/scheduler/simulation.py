@@ -0,0 +1,202 @@
+import time as timer
+
+import numpy as np
+
+from astropy import units as u
+
+from pocs.base import PanBase
+from pocs.scheduler import create_scheduler_from_config
+from pocs.utils.location import create_location_from_config
+
+
+class TimedConstraint(object):
+
+    def __init__(self, constraint):
+        """Wrap a constraint and record the wall-time spent scoring.
+
+        Args:
+            constraint (`pocs.scheduler.constraint.BaseConstraint`): The
+                constraint to wrap.
+        """
+        self.constraint = constraint
+        self.elapsed = 0.
+
+    def get_scores(self, *args, **kwargs):
+        start = timer.perf_counter()
+        try:
+            return self.constraint.get_scores(*args, **kwargs)
+        finally:
+            self.elapsed += timer.perf_counter() - start
+
+    def __getattr__(self, name):
+        return getattr(self.constraint, name)
+
+    def __str__(self):
+        return str(self.constraint)
+
+
+class ScheduleSimulation(PanBase):
+
+    def __init__(self, scheduler=None, fields_file=None, *args, **kwargs):
+        """Replay the scheduling decisions for one or more nights.
+
+        The simulation calls `get_observation` on the scheduler at a fixed time
+        step through each night, without any hardware, and records the
+        selected observation along with the wall-time of each call broken down
+        by constraint. This is used to see what the scheduler would do with a
+        fields file and to measure how long scheduling takes.
+
+        Args:
+            scheduler (`pocs.scheduler.BaseScheduler`, optional): The scheduler
+                to simulate. If None, one is created from the config along
+                with an `astroplan.Observer` for the configured location.
+            fields_file (str, optional): Fields file used when creating the
+                scheduler, defaults to the one in the config.
+            *args: Arguments to be passed to `PanBase`
+            **kwargs: Keyword args to be passed to `PanBase`
+        """
+        super().__init__(*args, **kwargs)
+
+        if scheduler is None:
+            observer = create_location_from_config(self.config, logger=self.logger)['observer']
+            scheduler = create_scheduler_from_config(
+                self.config, observer, fields_file=fields_file, logger=self.logger)
+
+        self.scheduler = scheduler
+
+        # Time each constraint by wrapping them in place.
+        self.timed_constraints = [TimedConstraint(c) for c in scheduler.constraints]
+        self.scheduler.constraints = self.timed_constraints
+
+        self.observe_horizon = self.config['location'].get('observe_horizon', -18 * u.degree)
+
+        self.results = list()
+
+##########################################################################
+# Methods
+##########################################################################
+
+    def get_nights(self, start_time, num_nights=1):
+        """Get the start and end of each night to simulate.
+
+        Args:
+            start_time (astropy.time.Time): Time from which to find the first night.
+                If during the night, the first night starts at `start_time`.
+            num_nights (int, optional): Number of nights, default 1.
+
+        Returns:
+            list: A list of (start, end) `astropy.time.Time` tuples.
+        """
+        observer = self.scheduler.observer
+
+        nights = list()
+        night_time = start_time
+        for _ in range(num_nights):
+            night_start, night_end = observer.tonight(time=night_time,
+                                                      horizon=self.observe_horizon)
+            nights.append((night_start, night_end))
+
+            # Look for the next night from a little after this one ends.
+            night_time = night_end + 1 * u.hour
+
+        return nights
+
+    def run(self, start_time, num_nights=1, time_step=5 * u.minute):
+        """Simulate scheduling for `num_nights` starting at `start_time`.
+
+        Between nights the `observed_list` and `current_observation` of the
+        scheduler are reset, as would happen during housekeeping.
+
+        Args:
+            start_time (astropy.time.Time): Time from which to start.
+            num_nights (int, optional): Number of nights to simulate, default 1.
+            time_step (astropy.units.Quantity, optional): Time between calls to
+                `get_observation`, default 5 minutes.
+
+        Returns:
+            list: The `results`, see `step`.
+        """
+        self.results = list()
+
+        for night_start, night_end in self.get_nights(start_time, num_nights=num_nights):
+            self.logger.info("Simulating night {} to {}", night_start.isot, night_end.isot)
+
+            num_steps = int(np.floor(((night_end - night_start) / time_step).decompose()))
+            for i in range(num_steps + 1):
+                self.step(night_start + i * time_step)
+
+            self.scheduler.current_observation = None
+            self.scheduler.reset_observed_list()
+
+        return self.results
+
+    def step(self, time):
+        """Make (and record) one scheduling decision.
+
+        Args:
+            time (astropy.time.Time): The time of the decision.
+
+        Returns:
+            dict: The result, which is also appended to `results`, containing
+                the `time`, the name and `merit` of the selected `observation`
+                (None if nothing was selected), the `wall_time` of the call in
+                seconds and the `constraint_times` in seconds, keyed by the
+                constraint name.
+        """
+        for constraint in self.timed_constraints:
+            constraint.elapsed = 0.
+
+        start = timer.perf_counter()
+        self.scheduler.get_observation(time=time)
+        wall_time = timer.perf_counter() - start
+
+        observation = self.scheduler.current_observation
+
+        result = {
+            'time': time.isot,
+            'observation': observation.name if observation is not None else None,
+            'merit': observation.merit if observation is not None else None,
+            'wall_time': wall_time,
+            'constraint_times': {str(c): c.elapsed for c in self.timed_constraints},
+        }
+        self.logger.debug("Simulation step: {}", result)
+
+        self.results.append(result)
+
+        return result
+
+    def summary(self):
+        """Summarize the timing of the `results`.
+
+        Returns:
+            dict: The number of `calls` and the `mean`, `median` and `max`
+                wall-time per call in seconds for the `total` and for each
+                constraint, as well as the number of `decisions` (time steps
+                with an observation) and the number of steps the selected
+                observation `changed`.
+        """
+        def stats(values):
+            values = np.array(values, dtype=float)
+            if len(values) == 0:
+                values = np.zeros(1)
+            return {
+                'mean': float(values.mean()),
+                'median': float(np.median(values)),
+                'max': float(values.max()),
+            }
+
+        summary = {
+            'calls': len(self.results),
+            'decisions': len([r for r in self.results if r['observation'] is not None]),
+            'changed': len([
+                r1 for r0, r1 in zip(self.results[:-1], self.results[1:])
+                if r1['observation'] != r0['observation']
+            ]),
+            'total': stats([r['wall_time'] for r in self.results]),
+            'constraints': {
+                str(c): stats([r['constraint_times'][str(c)] for r in self.results])
+                for c in self.timed_constraints
+            },
+        }
+
+        return summary
@@ -59,7 +59,8 @@ def on_enter(event_data):
                 pocs.logger.debug("Pointing image: {}".format(pointing_image))
 
                 pocs.say("Ok, I've got the pointing picture, let's see how close we are.")
-                pointing_image.solve_field()
+                pocs.observatory.solve_image(pointing_image,
+                                             field_name=observation.field.field_name)
 
                 # Store the solved image object
                 observation.pointing_images[pointing_id] = pointing_image
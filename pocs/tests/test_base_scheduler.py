@@ -237,3 +237,63 @@ def test_remove_field(scheduler):
 
     scheduler.remove_observation('HD 189733')
     assert orig_keys != list(scheduler.observations.keys())
+
+
+def test_reread_keeps_unchanged_fields(field_list, observer, temp_file, constraints):
+    with open(temp_file, 'w') as f:
+        f.write(yaml.dump(field_list))
+
+    scheduler = Scheduler(observer, fields_file=temp_file, constraints=constraints)
+    observations = dict(scheduler.observations)
+
+    # Add some state to an observation
+    observations['HD 189733'].merit = 42.
+    observations['HD 189733'].exposure_list['image_0'] = 'image_0.fits'
+
+    # Unchanged file does nothing
+    scheduler.read_field_list()
+    assert scheduler.observations == observations
+
+    # Edit one field, remove another and add a new one.
+    field_list[1]['priority'] = 500
+    removed = field_list.pop(2)
+    field_list.append({'name': 'New Field', 'position': '12h30m01s +08d08m08s'})
+    with open(temp_file, 'w') as f:
+        f.write(yaml.dump(field_list))
+
+    scheduler.read_field_list()
+
+    hd189733 = scheduler.observations['HD 189733']
+    assert hd189733 is observations['HD 189733']
+    assert hd189733.merit == 42.
+    assert hd189733.current_exp_num == 1
+
+    assert scheduler.observations['HD 209458'] is not observations['HD 209458']
+    assert scheduler.observations['HD 209458'].priority == 500
+
+    assert removed['name'] not in scheduler.observations
+    assert 'New Field' in scheduler.observations
+    assert len(scheduler.observations) == len(field_list)
+
+
+def test_reread_after_remove(field_list, observer, temp_file, constraints):
+    with open(temp_file, 'w') as f:
+        f.write(yaml.dump(field_list))
+
+    scheduler = Scheduler(observer, fields_file=temp_file, constraints=constraints)
+    scheduler.remove_observation('HD 189733')
+    assert 'HD 189733' not in scheduler.observations
+
+    # Still in the file so it comes back
+    scheduler.read_field_list()
+    assert 'HD 189733' in scheduler.observations
+
+
+def test_add_observation_does_not_modify_config(scheduler):
+    field_config = {
+        'name': 'Added Field',
+        'position': '12h30m01s +08d08m08s',
+        'exptime': '60'
+    }
+    scheduler.add_observation(field_config)
+    assert field_config['exptime'] == '60'
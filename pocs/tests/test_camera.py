@@ -5,10 +5,13 @@ import time
 import glob
 from ctypes.util import find_library
 
+import numpy as np
 import astropy.units as u
+from scipy.ndimage import gaussian_filter
 
 from pocs.camera.simulator import Camera as SimCamera
 from pocs.camera.simulator import SDKCamera as SimSDKCamera
+from pocs.camera.sdk import ReadoutBuffers
 from pocs.camera.sbig import Camera as SBIGCamera
 from pocs.camera.sbigudrv import SBIGDriver, INVALID_HANDLE_VALUE
 from pocs.camera.fli import Camera as FLICamera
@@ -197,6 +200,51 @@ def test_sdk_already_in_use():
     with pytest.raises(error.PanError):
         sim_camera_2 = SimSDKCamera(serial_number='SSC999')
 
+
+def test_readout_buffers():
+    buffers = ReadoutBuffers(num_buffers=2)
+    assert buffers.shape is None
+    assert buffers.nbytes == 0
+
+    buffer1 = buffers.get((10, 20), np.uint16)
+    buffer2 = buffers.get((10, 20), np.uint16)
+    assert buffer1.shape == (10, 20)
+    assert buffer1.dtype == np.uint16
+    assert buffer1.flags['C_CONTIGUOUS']
+    assert buffer1 is not buffer2
+    assert buffers.nbytes == 2 * buffer1.nbytes
+
+    # Ring wraps around to reuse the arrays
+    assert buffers.get((10, 20), np.uint16) is buffer1
+    assert buffers.get((10, 20), np.uint16) is buffer2
+
+    # Reallocated when the format changes
+    buffer3 = buffers.get((5, 5), np.uint8)
+    assert buffer3.shape == (5, 5)
+    assert buffers.shape == (5, 5)
+    assert buffers.dtype == np.uint8
+    assert buffers.nbytes == buffer3.nbytes
+
+
+def test_sdk_readout_buffers():
+    sim_camera = SimSDKCamera(serial_number='SSC007', readout_buffers=3)
+    assert sim_camera.readout_buffers.num_buffers == 3
+
+    driver = sim_camera._driver
+    out = sim_camera.readout_buffers.get((10, 20), np.uint16)
+    assert driver._image_buffer((10, 20), np.uint16, out) is out
+
+    new_buffer = driver._image_buffer((10, 20), np.uint16)
+    assert new_buffer is not out
+    assert not new_buffer.any()
+
+    with pytest.raises(ValueError):
+        driver._image_buffer((20, 10), np.uint16, out)
+    with pytest.raises(ValueError):
+        driver._image_buffer((10, 20), np.uint8, out)
+    with pytest.raises(ValueError):
+        driver._image_buffer((10, 10), np.uint16, out[:, ::2])
+
 # Hardware independent tests for SBIG camera
 
 
@@ -426,6 +474,11 @@ def test_observation(camera, images_dir):
                                        camera.uid, observation.seq_time, '*.fits*')
     assert len(glob.glob(observation_pattern)) == 1
 
+    # Observation keywords are written with the image
+    header = fits_utils.getheader(glob.glob(observation_pattern)[0])
+    assert header['FIELD'] == 'TestObservation'
+    assert header['IMAGEID'].startswith('PAN')
+
 
 def test_autofocus_coarse(camera, patterns, counter):
     if not camera.focuser:
@@ -483,6 +536,59 @@ def test_autofocus_keep_files(camera, patterns, counter):
     assert len(glob.glob(patterns['final'])) == counter['value']
 
 
+def test_get_thumbnail_in_memory(tmpdir):
+    camera = SimCamera()
+    fits_path = str(tmpdir.join('thumbnail.fits'))
+    thumbnail = camera.get_thumbnail(0.1, fits_path, 100)
+    assert thumbnail.shape == (100, 100)
+    assert not os.path.exists(fits_path)
+
+    kept = camera.get_thumbnail(0.1, fits_path, 100, keep_file=True)
+    assert os.path.exists(fits_path)
+    assert np.all(kept == thumbnail)
+    assert camera._readout_data is None
+
+
+def test_autofocus_early_stop(images_dir):
+    camera = SimCamera(focuser={'model': 'simulator',
+                                'focus_port': '/dev/ttyFAKE',
+                                'initial_position': 20000,
+                                'autofocus_range': (200, 400),
+                                'autofocus_step': (10, 20),
+                                'autofocus_seconds': 0.1,
+                                'autofocus_size': 100,
+                                'autofocus_early_stop': 2})
+    camera.config['directories']['images'] = images_dir
+
+    stars = np.zeros((100, 100))
+    stars[10::20, 10::20] = 10000
+    positions = list()
+
+    def get_thumbnail(seconds, file_path, thumbnail_size, keep_file=False, dark=False):
+        # Stars blurred more the further the focuser is from 20000
+        if dark:
+            return np.full((100, 100), 1000, dtype=np.uint16)
+        positions.append(camera.focuser.position)
+        sigma = 1 + abs(camera.focuser.position - 20000) / 20
+        return (gaussian_filter(stars, sigma) + 1000).astype(np.uint16)
+
+    camera.get_thumbnail = get_thumbnail
+    camera.autofocus(blocking=True)
+    # Initial and final thumbnails plus part of the 21 position sweep
+    assert len(positions) < 21
+    assert abs(camera.focuser.position - 20000) <= 10
+
+    positions.clear()
+    camera.autofocus(early_stop=0, blocking=True)
+    assert len(positions) == 23
+
+    # Off unless the focuser or the call asks for it.
+    camera.focuser.autofocus_early_stop = None
+    positions.clear()
+    camera.autofocus(blocking=True)
+    assert len(positions) == 23
+
+
 def test_autofocus_no_size(camera):
     try:
         initial_focus = camera.focuser.position
@@ -0,0 +1,177 @@
+import os
+import threading
+import time
+
+import pytest
+
+import astropy.units as u
+
+from pocs.camera.pipeline import ExposurePipeline
+from pocs.camera.simulator import Camera as SimCamera
+from pocs.scheduler.field import Field
+from pocs.scheduler.observation import Observation
+from pocs.utils import error
+
+
+class FakeCamera(object):
+
+    """ Records the processing stages called for each exposure """
+
+    def __init__(self, fail_stage=None):
+        self.calls = list()
+        self.fail_stage = fail_stage
+        self.lock = threading.Lock()
+
+    def _record_call(self, stage, info):
+        with self.lock:
+            self.calls.append((stage, info['image_id']))
+        if stage == self.fail_stage:
+            raise ValueError('Failed {}'.format(stage))
+
+    def _process_fits(self, file_path, info):
+        self._record_call('fits', info)
+        return file_path
+
+    def _process_preview(self, file_path, info):
+        self._record_call('preview', info)
+
+    def _process_compress(self, file_path, info):
+        self._record_call('compress', info)
+        return file_path + '.fz'
+
+    def _process_record(self, info):
+        self._record_call('record', info)
+
+
+def make_info(image_id):
+    return {'image_id': image_id, 'file_path': '/tmp/{}.fits'.format(image_id)}
+
+
+@pytest.fixture
+def pipeline():
+    pipeline = ExposurePipeline(workers={'fits': 2, 'compress': 2}, queue_size=2)
+    yield pipeline
+    pipeline.stop(timeout=10)
+
+
+def test_stages_in_order(pipeline):
+    camera = FakeCamera()
+
+    events = list()
+    for i in range(5):
+        event = threading.Event()
+        pipeline.submit(camera, make_info('image{}'.format(i)), event)
+        events.append(event)
+
+    assert pipeline.wait(timeout=10)
+    assert all([event.is_set() for event in events])
+    assert pipeline.pending == 0
+
+    for i in range(5):
+        stages = [stage for stage, image_id in camera.calls if image_id == 'image{}'.format(i)]
+        assert stages == ['fits', 'preview', 'compress', 'record']
+
+    status = pipeline.status()
+    assert status['record']['processed'] == 5
+    assert status['record']['queued'] == 0
+
+
+def test_event_set_when_fits_ready(pipeline):
+    camera = FakeCamera()
+
+    # Hold up the preview stage
+    blocker = threading.Event()
+    camera._process_preview = lambda file_path, info: blocker.wait()
+
+    observation_event = threading.Event()
+    pipeline.submit(camera, make_info('image'), observation_event)
+
+    assert observation_event.wait(timeout=10)
+    assert pipeline.pending == 1
+
+    blocker.set()
+    assert pipeline.wait(timeout=10)
+    assert ('record', 'image') in camera.calls
+
+
+def test_waits_for_exposure(pipeline):
+    camera = FakeCamera()
+
+    exposure_event = threading.Event()
+    observation_event = threading.Event()
+    pipeline.submit(camera, make_info('image'), observation_event, exposure_event)
+
+    assert not observation_event.wait(timeout=0.5)
+    assert camera.calls == []
+
+    exposure_event.set()
+    assert observation_event.wait(timeout=10)
+
+
+def test_failed_stage(pipeline):
+    camera = FakeCamera(fail_stage='fits')
+
+    observation_event = threading.Event()
+    pipeline.submit(camera, make_info('image'), observation_event)
+
+    assert pipeline.wait(timeout=10)
+    assert observation_event.is_set()
+    assert camera.calls == [('fits', 'image')]
+    assert pipeline.status()['fits']['failed'] == 1
+
+
+def test_back_pressure():
+    pipeline = ExposurePipeline(workers={'readout': 1}, queue_size=1)
+    camera = FakeCamera()
+
+    exposure_event = threading.Event()
+
+    # One in the readout worker and one waiting in the queue
+    pipeline.submit(camera, make_info('image0'), threading.Event(), exposure_event)
+    pipeline.submit(camera, make_info('image1'), threading.Event(), exposure_event)
+
+    with pytest.raises(error.Timeout):
+        pipeline.submit(camera, make_info('image2'), threading.Event(), exposure_event,
+                        timeout=0.5)
+
+    exposure_event.set()
+    pipeline.stop(timeout=10)
+
+    assert pipeline.pending == 0
+    assert not pipeline.is_running
+    assert len([c for c in camera.calls if c[0] == 'record']) == 2
+
+
+def test_stop_timeout():
+    pipeline = ExposurePipeline(workers={'readout': 1}, queue_size=1)
+    camera = FakeCamera()
+
+    # The readout worker and its queue are stuck on an exposure that never finishes.
+    exposure_event = threading.Event()
+    pipeline.submit(camera, make_info('image0'), threading.Event(), exposure_event)
+    pipeline.submit(camera, make_info('image1'), threading.Event(), exposure_event)
+
+    start = time.monotonic()
+    pipeline.stop(timeout=0.5)
+    assert time.monotonic() - start < 5
+    assert not pipeline.is_running
+    assert pipeline.pending == 2
+
+    exposure_event.set()
+
+
+def test_take_observation(tmpdir):
+    camera = SimCamera()
+    camera.pipeline = ExposurePipeline()
+
+    field = Field('Test Observation', '20h00m43.7135s +22d42m39.0645s')
+    observation = Observation(field, exptime=1.5 * u.second)
+    observation.seq_time = '19991231T235959'
+
+    fits_path = os.path.join(str(tmpdir), 'pipeline.fits')
+    observation_event = camera.take_observation(observation, headers={}, filename=fits_path)
+
+    assert observation_event.wait(timeout=30)
+    assert os.path.exists(fits_path)
+
+    camera.pipeline.stop(timeout=30)
@@ -258,3 +258,40 @@ def test_already_visited(observer):
 
     assert veto1 is True
     assert veto2 is False
+
+
+def test_get_scores_matches_get_score(observer, field_list, horizon_line):
+    time = Time('2016-08-13 10:00:00')
+    end_of_night = observer.tonight(time=time, horizon=-18 * u.degree)[-1]
+    moon = get_moon(time, observer.location)
+
+    observations = [Observation(Field(**f), **f) for f in field_list]
+
+    observed_list = OrderedDict()
+    observed_list['01:00'] = observations[0]
+
+    kwargs = dict(end_of_night=end_of_night, moon=moon, observed_list=observed_list)
+
+    constraints = [
+        Altitude(horizon_line),
+        Duration(30 * u.degree),
+        MoonAvoidance(),
+        AlreadyVisited(),
+    ]
+    for constraint in constraints:
+        vetoes, scores = constraint.get_scores(time, observer, observations, **kwargs)
+        assert len(vetoes) == len(scores) == len(observations)
+
+        for observation, veto, score in zip(observations, vetoes, scores):
+            single_veto, single_score = constraint.get_score(time, observer, observation,
+                                                             **kwargs)
+            assert single_veto == veto
+            assert single_score == pytest.approx(score)
+
+
+def test_get_scores_no_observations(observer, horizon_line):
+    time = Time('2016-08-13 10:00:00')
+
+    vetoes, scores = Altitude(horizon_line).get_scores(time, observer, [])
+    assert len(vetoes) == 0
+    assert len(scores) == 0
@@ -1,9 +1,26 @@
+import multiprocessing
+import os
 import pytest
+import time
+from datetime import datetime
+from datetime import timezone
 
+from pocs.utils import serializers as json_util
+from pocs.utils.database import BufferedPanDB
+from pocs.utils.database import PanDB
+from pocs.utils.database import PanFileDB
+from pocs.utils.database import SegmentedCollection
+from pocs.utils.database import create_storage_obj
 from pocs.utils.error import InvalidCollection
 from pocs.utils.logger import get_root_logger
 
 
+@pytest.fixture
+def file_db(tmpdir, monkeypatch):
+    monkeypatch.setenv('PANDIR', str(tmpdir))
+    return PanFileDB(db_name='panoptes_testing', collection_names=['current', 'weather'])
+
+
 def test_insert_and_no_permanent(db):
     rec = {'test': 'insert'}
     id0 = db.insert_current('config', rec, store_permanently=False)
@@ -45,6 +62,25 @@ def test_simple_insert(db):
     assert record['data']['test'] == rec['test']
 
 
+def test_query(db, save_environ):
+    os.environ['POCSTIME'] = '2018-09-01 12:00:00'
+    ids = [db.insert('weather', {'num': i, 'safe': True}) for i in range(10)]
+    db.insert('environment', {'num': 10})
+
+    start = datetime(2018, 9, 1, 12, 0, 2)
+    end = datetime(2018, 9, 1, 12, 0, 5)
+    records = list(db.query('weather', start, end))
+    assert [record['data']['num'] for record in records] == [2, 3, 4]
+    assert str(records[0]['_id']) == str(ids[2])
+
+    records = list(db.query('weather', start=start, fields=['num']))
+    assert [record['data'] for record in records] == [{'num': i} for i in range(2, 10)]
+
+    assert len(list(db.query('weather'))) == 10
+    assert len(list(db.query('weather', end=datetime(2018, 9, 1)))) == 0
+    assert [record['data'] for record in db.query('environment')] == [{'num': 10}]
+
+
 # Filter out (hide) "UserWarning: Collection not available"
 @pytest.mark.filterwarnings('ignore')
 def test_bad_collection(db):
@@ -80,3 +116,152 @@ def test_warn_bad_object(db):
 
     with pytest.warns(UserWarning):
         db.insert('observations', {'junk': db})
+
+
+def test_file_db_find_after_restart(file_db):
+    ids = [file_db.insert('weather', {'num': i}) for i in range(10)]
+    assert file_db.find('weather', ids[3])['data']['num'] == 3
+
+    # A new instance only reads the index.
+    db = PanFileDB(db_name='panoptes_testing', collection_names=['weather'])
+    assert [db.find('weather', obj_id)['data']['num'] for obj_id in ids] == list(range(10))
+    assert db.find('weather', 'not-an-id') is None
+
+    # Records written by another instance are found.
+    obj_id = file_db.insert('weather', {'num': 10})
+    assert db.find('weather', obj_id)['data']['num'] == 10
+
+
+def test_segment_rotation_and_compaction(tmpdir):
+    store = SegmentedCollection(str(tmpdir), segment_duration=3600)
+
+    objs = list()
+    for hour in range(3):
+        obj = create_storage_obj('weather', {'hour': hour}, obj_id='id{}'.format(hour))
+        obj['date'] = datetime(2018, 9, 1, hour, 30)
+        store.append(obj)
+        objs.append(obj)
+
+    assert store.segments() == ['20180901T000000', '20180901T010000', '20180901T020000']
+
+    # A duplicate and a partial record, e.g. from a crash.
+    store.append(objs[0])
+    with open(os.path.join(str(tmpdir), '20180901T000000.json'), 'a') as f:
+        f.write(json_util.dumps(objs[1])[:20])
+
+    assert store.read('id0')['data']['hour'] == 0
+
+    # The last segment is still open.
+    timestamp = datetime(2018, 9, 1, 2, 45, tzinfo=timezone.utc).timestamp()
+    assert store.compact(timestamp=timestamp) == ['20180901T000000', '20180901T010000']
+    assert store.compact(timestamp=timestamp) == []
+
+    with open(os.path.join(str(tmpdir), '20180901T000000.json'), 'r') as f:
+        assert len(f.readlines()) == 1
+
+    for hour in range(3):
+        assert store.read('id{}'.format(hour))['data']['hour'] == hour
+
+
+def append_records(directory, num_records):
+    store = SegmentedCollection(directory, segment_duration=3600)
+    for i in range(num_records):
+        obj = create_storage_obj('weather', {'num': i}, obj_id='id{}'.format(i))
+        obj['date'] = datetime(2018, 9, 1, 0, 30)
+        store.append(obj)
+
+
+def test_compaction_while_appending(tmpdir):
+    store = SegmentedCollection(str(tmpdir), segment_duration=3600)
+
+    # Another process appends to the segment while it is compacted.
+    writer = multiprocessing.Process(target=append_records, args=(str(tmpdir), 500))
+    writer.start()
+    timestamp = datetime(2018, 9, 2, tzinfo=timezone.utc).timestamp()
+    while writer.is_alive():
+        for segment in store.segments():
+            store._compact_segment(segment)
+    writer.join()
+    assert writer.exitcode == 0
+
+    store = SegmentedCollection(str(tmpdir), segment_duration=3600)
+    store.compact(timestamp=timestamp)
+    assert [obj['data']['num'] for obj in store.query()] == list(range(500))
+    assert store.read('id499')['data']['num'] == 499
+
+
+def test_file_db_imports_collection_file(file_db):
+    obj = create_storage_obj('weather', {'old': True}, obj_id='old-record')
+    json_util.dumps_file(file_db._get_file('weather'), obj)
+
+    db = PanFileDB(db_name='panoptes_testing', collection_names=['weather'])
+    assert db.find('weather', 'old-record')['data']['old']
+    assert not os.path.exists(file_db._get_file('weather'))
+
+
+def test_buffered_db(file_db):
+    db = BufferedPanDB(file_db, max_records=5, flush_interval=60)
+
+    obj_id = db.insert_current('weather', {'num': 0})
+    assert db.get_current('weather')['data']['num'] == 0
+    assert db.find('weather', obj_id)['data']['num'] == 0
+    assert db.pending == 1
+
+    # Nothing written yet
+    assert file_db.get_current('weather') is None
+    assert file_db.find('weather', obj_id) is None
+
+    db.flush()
+    assert db.pending == 0
+    assert file_db.get_current('weather')['data']['num'] == 0
+    assert file_db.find('weather', obj_id)['data']['num'] == 0
+
+    # The values are kept as they were inserted.
+    values = {'num': 0}
+    obj_id = db.insert_current('weather', values)
+    values['num'] = 100
+    assert db.get_current('weather')['data']['num'] == 0
+    db.flush()
+    assert file_db.find('weather', obj_id)['data']['num'] == 0
+    assert file_db.get_current('weather')['data']['num'] == 0
+
+    # Written in the background once there are `max_records`
+    ids = [db.insert('weather', {'num': i}) for i in range(1, 6)]
+    for _ in range(50):
+        if db.pending == 0:
+            break
+        time.sleep(0.1)
+    assert file_db.find('weather', ids[-1])['data']['num'] == 5
+    assert [r['data']['num'] for r in db.query('weather')] == [0, 0] + list(range(1, 6))
+
+    db.insert_current('weather', {'num': 6}, store_permanently=False)
+    db.clear_current('weather')
+    assert db.get_current('weather') is None
+
+    # Bad objects fail straight away
+    with pytest.warns(UserWarning):
+        assert db.insert('weather', {'junk': db}) is None
+
+    # Close writes everything, later writes aren't buffered.
+    obj_id = db.insert('weather', {'num': 7})
+    db.close()
+    assert file_db.find('weather', obj_id)['data']['num'] == 7
+    obj_id = db.insert('weather', {'num': 8})
+    assert db.pending == 0
+    assert file_db.find('weather', obj_id)['data']['num'] == 8
+
+
+def test_buffered_db_shared(memory_db):
+    db = PanDB(db_type='memory', db_name='panoptes_testing', buffer={'flush_interval': 60})
+    assert isinstance(db, BufferedPanDB)
+    assert db.db is memory_db
+    assert PanDB(db_type='memory', db_name='panoptes_testing', buffer={}) is memory_db
+    assert PanDB(db_type='memory', db_name='panoptes_testing', buffer={'max_records': 1}) is db
+
+    obj_id = db.insert('config', {'test': 'insert'})
+    assert memory_db.find('config', obj_id) is None
+
+    # Buffered records are written before the db is erased.
+    PanDB.permanently_erase_database(
+        'memory', 'panoptes_testing', really='Yes', dangerous='Totally')
+    assert memory_db.find('config', obj_id)['data']['test'] == 'insert'
@@ -0,0 +1,96 @@
+import pytest
+
+from astroplan import Observer
+from astropy import units as u
+from astropy.coordinates import EarthLocation
+from astropy.time import Time
+
+from pocs.scheduler.ephemeris import Ephemeris
+from pocs.scheduler.field import Field
+from pocs.scheduler.observation import Observation
+
+
+@pytest.fixture
+def observer(config):
+    loc = config['location']
+    location = EarthLocation(lon=loc['longitude'], lat=loc['latitude'], height=loc['elevation'])
+    return Observer(location=location, name="Test Observer", timezone=loc['timezone'])
+
+
+@pytest.fixture
+def ephemeris(observer):
+    return Ephemeris(observer)
+
+
+@pytest.fixture
+def observations():
+    return [
+        Observation(Field('HD 189733', '20h00m43.7135s +22d42m39.0645s')),
+        Observation(Field('Wasp 33', '02h26m51.0582s +37d33m01.733s')),
+    ]
+
+
+def test_times_match_observer(ephemeris, observer, observations):
+    time = Time('2016-08-13 10:00:00')
+    ephemeris.build(time, observations, 30 * u.degree)
+
+    # Look up later in the night, after the reference times were computed.
+    later = time + 3 * u.hour
+    meridian, set_jd = ephemeris.get_times(later, observations, 30 * u.degree)
+
+    for i, observation in enumerate(observations):
+        expected_meridian = observer.target_meridian_transit_time(
+            later, observation.field, which='next')
+        expected_set = observer.target_set_time(
+            later, observation.field, which='next', horizon=30 * u.degree)
+
+        assert abs((meridian[i] - expected_meridian).sec) < 60
+        assert abs(set_jd[i] - expected_set.jd) * 86400 < 60
+
+
+def test_new_night_rebuilds(ephemeris, observations):
+    time = Time('2016-08-13 10:00:00')
+    ephemeris.build(time, observations, 30 * u.degree)
+    night = ephemeris.night
+    assert sorted(ephemeris.field_names) == ['HD 189733', 'Wasp 33']
+
+    ephemeris.build(time + 1 * u.day, observations[:1], 30 * u.degree)
+    assert ephemeris.night == night + 1
+    assert ephemeris.field_names == ['HD 189733']
+
+
+def test_edited_field_is_recomputed(ephemeris, observations):
+    time = Time('2016-08-13 10:00:00')
+    meridian, _ = ephemeris.get_times(time, observations, 30 * u.degree)
+
+    # Same name, new position.
+    moved = Observation(Field('HD 189733', '02h26m51.0582s +37d33m01.733s'))
+    new_meridian, _ = ephemeris.get_times(time, [moved], 30 * u.degree)
+
+    assert abs((new_meridian[0] - meridian[1]).sec) < 1
+    assert abs((new_meridian[0] - meridian[0]).sec) > 3600
+
+
+def test_invalidate(ephemeris, observations):
+    time = Time('2016-08-13 10:00:00')
+    ephemeris.build(time, observations, 30 * u.degree)
+
+    ephemeris.invalidate('Wasp 33')
+    assert ephemeris.field_names == ['HD 189733']
+
+    ephemeris.clear()
+    assert ephemeris.field_names == []
+    assert ephemeris.night is None
+
+
+def test_end_of_night_cached(ephemeris, observer):
+    time = Time('2016-08-13 10:00:00')
+    end_of_night = ephemeris.get_end_of_night(time)
+    assert end_of_night == observer.tonight(time=time, horizon=-18 * u.degree)[-1]
+
+    # Later in the same night
+    assert ephemeris.get_end_of_night(time + 2 * u.hour) is end_of_night
+
+    # Following night
+    next_end = ephemeris.get_end_of_night(end_of_night + 1 * u.hour)
+    assert (next_end - end_of_night).to(u.hour).value == pytest.approx(24, abs=0.5)
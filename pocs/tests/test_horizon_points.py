@@ -97,3 +97,60 @@ def test_sorting():
     assert hp.obstructions == [[(10.0, 10.0), (20.0, 20.0)],
                                [(10.0, 50.0), (30.0, 60.0)],
                                [(10.0, 180.0), (30.0, 190.0)]]
+
+
+def test_min_altitude():
+    hp = Horizon(obstructions=[
+        [[40, 70], [40, 80]],
+        [[50, 180], [40, 200]],
+    ], default_horizon=30)
+
+    assert hp.min_altitude(10) == 30
+    assert hp.min_altitude(75.5) == 40
+    assert hp.min_altitude(190) == pytest.approx(45)
+
+    # Vectorized and wraps around 360
+    np.testing.assert_allclose(hp.min_altitude(np.array([75., 190., 370.])), [40, 45, 30])
+
+
+def test_min_altitude_resolution():
+    obstructions = [[[50, 180], [40, 200]]]
+    coarse = Horizon(obstructions=obstructions, resolution=10)
+    fine = Horizon(obstructions=obstructions, resolution=0.1)
+
+    assert len(coarse.horizon_line) == 36
+    assert len(fine.horizon_line) == 3600
+
+    assert fine.min_altitude(190.05) == pytest.approx(44.975)
+    assert fine.min_altitude(210) == 30
+
+
+def test_bad_resolution():
+    with pytest.raises(AssertionError):
+        Horizon(resolution=0)
+
+
+def test_save_load(tmpdir):
+    hp = Horizon(obstructions=[
+        [[40, 70], [40, 80]],
+        [[50, 180], [45, 190], [40, 200]],
+    ], default_horizon=25, resolution=0.5)
+
+    fn = str(tmpdir.join('horizon.npz'))
+    hp.save(fn)
+
+    hp2 = Horizon.load(fn)
+    assert hp2.obstructions == hp.obstructions
+    assert hp2.default_horizon == 25
+    assert hp2.resolution == 0.5
+    np.testing.assert_array_equal(hp2.horizon_line, hp.horizon_line)
+    assert hp2.min_altitude(185) == hp.min_altitude(185)
+
+
+def test_save_load_no_obstructions(tmpdir):
+    fn = str(tmpdir.join('horizon.npz'))
+    Horizon().save(fn)
+
+    hp = Horizon.load(fn)
+    assert hp.obstructions == []
+    assert hp.min_altitude(123.4) == 30
@@ -0,0 +1,119 @@
+import json
+import os
+
+import pytest
+
+from pocs.housekeeping import Housekeeper
+
+
+# Stands in for upload_image_dir.py: marks the directory as cleaned, slowly,
+# and fails for directories named 'bad'.
+FAKE_SCRIPT = """
+import argparse
+import os
+import time
+
+parser = argparse.ArgumentParser()
+parser.add_argument('--directory')
+parser.add_argument('--upload', action='store_true')
+parser.add_argument('--make_timelapse', action='store_true')
+parser.add_argument('--remove_jpgs', action='store_true')
+parser.add_argument('--max_workers', type=int)
+parser.add_argument('--max_rate', type=float)
+args = parser.parse_args()
+
+start = time.time()
+time.sleep(0.5)
+if os.path.basename(args.directory) == 'bad':
+    raise SystemExit(1)
+with open(os.path.join(args.directory, 'cleaned'), 'a') as f:
+    f.write('{} {} {} {} {}\\n'.format(
+        args.upload, args.max_workers, args.max_rate, start, time.time()))
+"""
+
+
+@pytest.fixture
+def housekeeper(config, tmpdir):
+    script_path = str(tmpdir.join('fake_upload_image_dir.py'))
+    with open(script_path, 'w') as f:
+        f.write(FAKE_SCRIPT)
+
+    def make_housekeeper(**kwargs):
+        housekeeper = Housekeeper(state_file=str(tmpdir.join('housekeeping.json')),
+                                  config=config,
+                                  **kwargs)
+        housekeeper.script_path = script_path
+        return housekeeper
+
+    return make_housekeeper
+
+
+@pytest.fixture
+def directories(tmpdir):
+    directories = list()
+    for name in ['one', 'two', 'three', 'four']:
+        directories.append(str(tmpdir.mkdir(name)))
+    return directories
+
+
+def test_run_in_parallel(config, housekeeper, directories):
+    config['panoptes_network']['uploads']['max_rate'] = 8000
+    hk = housekeeper(max_workers=4)
+    for directory in directories:
+        hk.add(directory, upload=True)
+    assert hk.pending == 4
+
+    progress = hk.run()
+    assert progress['done'] == 4
+    assert hk.pending == 0
+
+    times = list()
+    for directory in directories:
+        with open(os.path.join(directory, 'cleaned')) as f:
+            upload, max_workers, max_rate, start, end = f.read().split()
+        assert upload == 'True'
+        assert int(max_workers) == max(1, os.cpu_count() // 4)
+        assert float(max_rate) == 2000
+        times.append((float(start), float(end)))
+
+    # All the jobs ran at the same time
+    assert max(start for start, _ in times) < min(end for _, end in times)
+
+    # Finished jobs are removed from the state
+    with open(hk.state_file) as f:
+        assert json.load(f) == []
+
+
+def test_resume(housekeeper, directories):
+    hk = housekeeper()
+    for directory in directories[:2]:
+        hk.add(directory)
+
+    # Restarted while the first job was running
+    with open(hk.state_file) as f:
+        jobs = json.load(f)
+    jobs[0]['state'] = Housekeeper.RUNNING
+    with open(hk.state_file, 'w') as f:
+        json.dump(jobs, f)
+
+    hk = housekeeper()
+    assert hk.progress() == {'pending': 1, 'running': 1, 'done': 0, 'failed': 0}
+    hk.run()
+    assert hk.pending == 0
+    for directory in directories[:2]:
+        assert os.path.exists(os.path.join(directory, 'cleaned'))
+
+
+def test_failed_job(housekeeper, tmpdir):
+    bad_dir = str(tmpdir.mkdir('bad'))
+    hk = housekeeper(max_attempts=2)
+    hk.add(bad_dir)
+
+    assert hk.run()['failed'] == 1
+    assert hk.pending == 1
+
+    # Still failed when loaded again, dropped after the second attempt
+    hk = housekeeper(max_attempts=2)
+    assert hk.progress()['failed'] == 1
+    assert hk.run()['failed'] == 1
+    assert hk.pending == 0
@@ -8,8 +8,11 @@ from pocs.images import OffsetError
 from pocs.utils.error import SolveError
 from pocs.utils.error import Timeout
 
+import numpy as np
+
 from astropy import units as u
 from astropy.coordinates import SkyCoord
+from astropy.io import fits
 
 
 def copy_file_to_dir(to_dir, file):
@@ -97,6 +100,34 @@ def test_solve_field_solved(solved_fits_file):
     assert isinstance(im0.pointing, SkyCoord)
 
 
+def test_compute_correlation_offset(solved_fits_file):
+    with tempfile.TemporaryDirectory() as tmpdir:
+        # Move the stars 6 pixels right and 10 pixels up.
+        shifted_file = os.path.join(tmpdir, 'shifted.fits')
+        with fits.open(solved_fits_file) as hdu:
+            data = np.roll(hdu[1].data, (10, 6), axis=(0, 1))
+            fits.writeto(shifted_file, data, header=hdu[1].header)
+
+        im0 = Image(solved_fits_file)
+        im1 = Image(shifted_file)
+
+        # Image is at the same place as the reference
+        offset_info = im0.compute_correlation_offset(im0)
+        assert offset_info.magnitude < 1 * u.arcsec
+
+        offset_info = im1.compute_correlation_offset(im0)
+        assert isinstance(offset_info, OffsetError)
+
+        # Stars moving up and right means the image center moved down and left.
+        center = im0.wcs.celestial.wcs.crpix
+        expected = SkyCoord(*im0.wcs.celestial.all_pix2world(center[0] - 6, center[1] - 10, 1),
+                            unit='deg')
+        assert u.isclose(offset_info.magnitude, expected.separation(im0.pointing),
+                         atol=5 * u.arcsec)
+        assert u.isclose(offset_info.delta_dec, expected.dec - im0.pointing.dec,
+                         atol=5 * u.arcsec)
+
+
 def test_pointing_error_no_wcs(unsolved_fits_file):
     im0 = Image(unsolved_fits_file)
 
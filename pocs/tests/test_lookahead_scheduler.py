@@ -0,0 +1,175 @@
+import pytest
+import yaml
+
+from astropy import units as u
+from astropy.coordinates import EarthLocation
+from astropy.time import Time
+
+from astroplan import Observer
+
+from pocs.scheduler.lookahead import Scheduler
+
+from pocs.scheduler.constraint import BaseConstraint
+from pocs.scheduler.constraint import Duration
+from pocs.scheduler.constraint import MoonAvoidance
+
+
+@pytest.fixture
+def constraints():
+    return [MoonAvoidance(), Duration(30 * u.deg)]
+
+
+@pytest.fixture
+def observer(config):
+    loc = config['location']
+    location = EarthLocation(lon=loc['longitude'], lat=loc['latitude'], height=loc['elevation'])
+    return Observer(location=location, name="Test Observer", timezone=loc['timezone'])
+
+
+@pytest.fixture()
+def field_list():
+    return yaml.load("""
+    -
+        name: HD 189733
+        position: 20h00m43.7135s +22d42m39.0645s
+        priority: 100
+    -
+        name: HD 209458
+        position: 22h03m10.7721s +18d53m03.543s
+        priority: 100
+    -
+        name: M5
+        position: 15h18m33.2201s +02d04m51.7008s
+        priority: 50
+    -
+        name: Wasp 33
+        position: 02h26m51.0582s +37d33m01.733s
+        priority: 100
+    -
+        name: M42
+        position: 05h35m17.2992s -05d23m27.996s
+        priority: 25
+        exptime: 240
+    """)
+
+
+@pytest.fixture
+def scheduler(field_list, observer, constraints):
+    return Scheduler(observer, fields_list=field_list, constraints=constraints)
+
+
+def test_build_plan(scheduler):
+    time = Time('2016-08-13 05:00:00')
+
+    plan = scheduler.build_plan(time)
+
+    assert len(plan) > 0
+    assert abs((plan[0]['time'] - time).to(u.second).value) < 1
+    assert plan[-1]['time'] < scheduler.common_properties['end_of_night']
+
+    for slot in plan:
+        if slot['observation'] is not None:
+            assert slot['observation'] in slot['valid']
+            assert slot['merit'] == slot['valid'][slot['observation']]
+
+
+def test_get_observation_follows_plan(scheduler):
+    time = Time('2016-08-13 05:00:00')
+
+    best = scheduler.get_observation(time=time)
+    plan = scheduler.plan
+
+    assert best[0] == plan[0]['observation']
+    assert isinstance(best[1], float)
+
+    # Later in the same slot uses the cached plan
+    scheduler.get_observation(time=time + 5 * u.minute)
+    assert scheduler.plan is plan
+
+    # Later slot
+    later = plan[2]
+    best = scheduler.get_observation(time=later['time'])
+    assert scheduler.plan is plan
+    assert best[0] == later['observation']
+
+
+class VetoNames(BaseConstraint):
+
+    """ Vetoes the observations with the given names """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.names = set()
+
+    def get_score(self, time, observer, observation, **kwargs):
+        return observation.name in self.names, 0.
+
+
+def test_get_observation_rechecks_constraints(field_list, observer, constraints):
+    veto = VetoNames()
+    scheduler = Scheduler(observer, fields_list=field_list, constraints=constraints + [veto])
+    time = Time('2016-08-13 05:00:00')
+
+    best = scheduler.get_observation(time=time)
+    plan = scheduler.plan
+
+    # The planned field becomes invalid within its slot, e.g. sets.
+    veto.names.add(best[0])
+    new_best = scheduler.get_observation(time=time + 5 * u.minute)
+    assert scheduler.plan is not plan
+    assert new_best[0] != best[0]
+    assert best[0] not in scheduler.plan[0]['valid']
+
+
+def test_get_observation_show_all(scheduler):
+    time = Time('2016-08-13 05:00:00')
+
+    best = scheduler.get_observation(time=time, show_all=True)
+
+    assert len(best) == len(scheduler.plan[0]['valid'])
+    assert best[0][0] == scheduler.plan[0]['observation']
+
+
+def test_replan_on_change(scheduler):
+    time = Time('2016-08-13 05:00:00')
+
+    scheduler.get_observation(time=time)
+    plan = scheduler.plan
+
+    scheduler.add_observation({
+        'name': 'New Target',
+        'position': '20h00m43.7135s +22d42m39.0645s',
+        'priority': 5000
+    })
+
+    best = scheduler.get_observation(time=time)
+    assert scheduler.plan is not plan
+    assert best[0] == 'New Target'
+
+    plan = scheduler.plan
+    scheduler.reset_plan()
+    scheduler.get_observation(time=time)
+    assert scheduler.plan is not plan
+
+
+def test_slew_cost(field_list, observer, constraints):
+    time = Time('2016-08-13 05:00:00')
+
+    free = Scheduler(observer, fields_list=field_list, constraints=constraints,
+                     slew_cost=0, flip_cost=0)
+    costly = Scheduler(observer, fields_list=field_list, constraints=constraints,
+                       slew_cost=100, flip_cost=100)
+
+    def num_changes(plan):
+        names = [slot['observation'] for slot in plan]
+        return len([n1 for n0, n1 in zip(names[:-1], names[1:]) if n0 != n1])
+
+    assert num_changes(costly.build_plan(time)) <= num_changes(free.build_plan(time))
+
+
+def test_no_plan_after_night(scheduler):
+    time = Time('2016-08-13 15:00:00')
+
+    scheduler.get_observation(time=time)
+
+    assert scheduler.current_observation is None
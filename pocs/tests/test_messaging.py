@@ -1,9 +1,17 @@
+import asyncio
 import multiprocessing
 import pytest
+import threading
 import time
 
+from astropy import units as u
+from astropy.time import Time
+from bson import ObjectId
 from datetime import datetime
+from pocs.utils.messaging import AsyncPanMessaging
+from pocs.utils.messaging import MessageHub
 from pocs.utils.messaging import PanMessaging
+from pocs.utils.serializers import dumps_binary
 
 
 @pytest.fixture(scope='module')
@@ -139,3 +147,132 @@ def test_msg_pub_sub(msg_publisher, msg_subscriber):
 
 def test_cmd_pub_sub(cmd_publisher, cmd_subscriber):
     assess_pub_sub(cmd_publisher, cmd_subscriber)
+
+
+@pytest.fixture(scope='function')
+def binary_pub_and_sub(forwarder):
+    sub = PanMessaging.create_subscriber(54321)
+    time.sleep(0.05)
+    pub = PanMessaging.create_publisher(12345, bind=False, connect=True, encoding='binary')
+    json_pub = PanMessaging.create_publisher(12345, bind=False, connect=True)
+    time.sleep(0.05)
+    yield (pub, json_pub, sub)
+    pub.close()
+    json_pub.close()
+    sub.close()
+
+
+def test_send_binary(binary_pub_and_sub):
+    pub, json_pub, sub = binary_pub_and_sub
+
+    message = {
+        'date': datetime(2017, 1, 1),
+        'exptime': 120 * u.second,
+        'obstime': Time('2017-01-01T00:00:00.5'),
+        '_id': ObjectId(),
+        'data': {'values': [1, 2.5, None, 'a'], 'safe': True},
+    }
+    pub.send_message('Test-Topic', message)
+    topic, msg_obj = sub.receive_message()
+    assert topic == 'Test-Topic'
+    assert msg_obj['date'] == datetime(2017, 1, 1)
+    assert msg_obj['exptime'] == 120 * u.second
+    assert msg_obj['obstime'] == Time('2017-01-01T00:00:00.5')
+    assert msg_obj['_id'] == message['_id']
+    assert msg_obj['data'] == message['data']
+
+    # Mixed peers on the same bus
+    json_pub.send_message('Test-Topic', 'Hello')
+    topic, msg_obj = sub.receive_message()
+    assert msg_obj['message'] == 'Hello'
+
+
+def test_decode_versions():
+    sub = PanMessaging.create_subscriber(54321)
+    payload = dumps_binary({'foo': 'bar'})
+
+    assert sub.decode_message([b'Test-Topic', b'PM\x01\x01', payload]) == (
+        'Test-Topic', {'foo': 'bar'})
+
+    # Newer versions and unknown formats are skipped.
+    assert sub.decode_message([b'Test-Topic', b'PM\x7f\x01', payload]) == ('Test-Topic', None)
+    assert sub.decode_message([b'Test-Topic', b'PM\x01\x02', payload]) == ('Test-Topic', None)
+    assert sub.decode_message([b'Test-Topic', b'XX\x01\x01', payload]) == ('Test-Topic', None)
+    assert sub.decode_message([b'Test-Topic', b'PM\x01\x01', payload[:-1]]) == (
+        'Test-Topic', None)
+
+    assert sub.decode_message([b'Test-Topic {"foo": "bar"}']) == ('Test-Topic', {'foo': 'bar'})
+    sub.close()
+
+
+def test_unknown_encoding():
+    with pytest.raises(ValueError):
+        PanMessaging.create_publisher(12345, encoding='xml')
+
+
+def test_async_pub_sub(forwarder):
+    async def run():
+        sub = AsyncPanMessaging.create_subscriber(54321)
+        pub = AsyncPanMessaging.create_publisher(12345, encoding='binary')
+        await asyncio.sleep(0.1)
+
+        assert await sub.receive_message(timeout_ms=100) == (None, None)
+
+        await pub.send_message('Test-Topic', {'exptime': 120 * u.second})
+        await pub.send_message('Test-Topic', 'Hello')
+
+        messages = list()
+        async for topic, msg_obj in sub:
+            messages.append((topic, msg_obj))
+            if len(messages) == 2:
+                break
+
+        pub.close()
+        sub.close()
+        return messages
+
+    messages = asyncio.get_event_loop().run_until_complete(asyncio.wait_for(run(), 10))
+    assert messages[0] == ('Test-Topic', {'exptime': 120 * u.second})
+    assert messages[1][1]['message'] == 'Hello'
+
+
+def test_message_hub():
+    hub = MessageHub(12346, 54322, cache_topics=['STATUS'], stats_interval=None)
+    thread = threading.Thread(target=hub.run)
+    thread.start()
+
+    pub = PanMessaging.create_publisher(12346, encoding='binary')
+    first_sub = PanMessaging.create_subscriber(54322)
+    time.sleep(0.2)
+    try:
+        pub.send_message('STATUS', {'state': 'ready'})
+        pub.send_message('POCS-CMD', 'park')
+        assert first_sub.receive_message(timeout_ms=1000)[0] == 'STATUS'
+        assert first_sub.receive_message(timeout_ms=1000)[0] == 'POCS-CMD'
+
+        # A new subscriber gets the last STATUS straight away, but no commands.
+        sub = PanMessaging.create_subscriber(54322, topic='STATUS')
+        assert sub.receive_message(timeout_ms=1000) == ('STATUS', {'state': 'ready'})
+        assert sub.receive_message(timeout_ms=200) == (None, None)
+        sub.close()
+
+        # Existing subscribers to the topic get it again.
+        assert first_sub.receive_message(timeout_ms=1000)[0] == 'STATUS'
+
+        stats = hub.topic_stats()
+        assert stats['STATUS']['messages'] == 1
+        assert stats['POCS-CMD']['messages'] == 1
+        assert stats['STATUS']['dropped'] == 0
+        assert stats['STATUS']['bytes'] > 0
+        assert stats['STATUS']['message_rate'] > 0
+
+        hub.stats_interval = 0.1
+        topic, msg_obj = first_sub.receive_message(timeout_ms=1000)
+        assert topic == 'HUB-STATS'
+        assert msg_obj['topics']['POCS-CMD']['messages'] == 1
+        assert msg_obj['topics']['POCS-CMD']['message_rate'] == 0
+    finally:
+        hub.stop()
+        thread.join()
+        pub.close()
+        first_sub.close()
@@ -7,8 +7,10 @@ from astropy.time import Time
 
 from pocs import hardware
 import pocs.version
+from pocs.images import Image
 from pocs.observatory import Observatory
 from pocs.scheduler.dispatch import Scheduler
+from pocs.scheduler.field import Field
 from pocs.scheduler.observation import Observation
 from pocs.camera import create_cameras_from_config
 from pocs.utils import error
@@ -379,3 +381,52 @@ def test_operate_dome(config_with_simulated_dome):
     assert observatory.open_dome()
     assert observatory.dome.is_open
     assert not observatory.dome.is_closed
+
+
+def test_solve_image_hints(observatory, solved_fits_file):
+    class FakeImage(object):
+        header = {'FIELD': 'Test Field'}
+        wcs_file = solved_fits_file
+
+        def __init__(self):
+            self.solves = list()
+
+        def solve_field(self, **kwargs):
+            self.solves.append(kwargs)
+            if 'index_files' in kwargs:
+                raise error.SolveError('Hinted solve failed')
+            return {}
+
+    # First solve of the field has no hints
+    image = FakeImage()
+    observatory.solve_image(image, skip_solved=False)
+    assert image.solves == [{'skip_solved': False}]
+    assert 'Test Field' in observatory.solve_cache
+
+    # Hinted solve fails so falls back to a full solve
+    image = FakeImage()
+    observatory.solve_image(image, skip_solved=False)
+    assert len(image.solves) == 2
+    assert image.solves[0]['radius'] == observatory.solve_cache.radius
+    assert 'scale_low' in image.solves[0]
+    assert image.solves[1] == {'skip_solved': False}
+    assert 'Test Field' in observatory.solve_cache
+
+
+def test_analyze_recent_correlation(observatory, solved_fits_file):
+    field = Field('Test Field', '20h00m43.7135s +22d42m39.0645s')
+    observation = Observation(field)
+    observation.pointing_images['pointing'] = Image(solved_fits_file)
+    observation.exposure_list['image'] = solved_fits_file
+    observatory.current_observation = observation
+
+    offset_info = observatory.analyze_recent()
+    assert offset_info.magnitude < 1 * u.arcsec
+
+    # Without a solved pointing image it falls back to a plate solve.
+    def solve_image(image, **kwargs):
+        raise error.SolveError('Solve failed')
+
+    observatory.solve_image = solve_image
+    observation.pointing_images['pointing'] = Image(solved_fits_file, wcs_file='missing.fits')
+    assert observatory.analyze_recent() is None
@@ -224,3 +224,50 @@ def test_hooked_io(handler):
 
     ser.disconnect()
     assert not ser.is_connected
+
+
+def test_json_line_parser():
+    parser = rs232.JsonLineParser(max_line_length=100)
+
+    # Lines may be split over chunks in any way.
+    assert parser.feed(b'{"a": 1}\r\n{"b"', timestamp='t0') == [('t0', {'a': 1})]
+    assert parser.feed(b': nan}', timestamp='t1') == []
+    readings = parser.feed(b'\r\n\r\n{"c": [1, 2]}\n', timestamp='t2')
+    assert readings[1] == ('t2', {'c': [1, 2]})
+    assert readings[0][1]['b'] != readings[0][1]['b']  # NaN
+
+    # Fragments are skipped, and a report after a fragment on the same line is kept.
+    assert [value for _, value in parser.feed(b'": 3}\r\n{"d": 4}\r\n')] == [{'d': 4}]
+    assert [value for _, value in parser.feed(b'3, "x": 2}{"e": {"f": 5}}\r\n')] == [
+        {'e': {'f': 5}}]
+    assert parser.feed(b'\xff\xfe\r\n') == []
+
+    # Long lines are dropped up to the next newline.
+    assert parser.feed(b'{"g": "' + b'x' * 200) == []
+    assert [value for _, value in parser.feed(b'"}\r\n{"h": 6}\r\n')] == [{'h': 6}]
+
+    stats = parser.stats()
+    assert stats['lines'] == 8
+    assert stats['readings'] == 6
+    assert stats['errors'] == 4
+    assert stats['error_rate'] == 0.5
+    assert stats['bytes'] > 0
+    assert stats['max_latency'] >= stats['mean_latency'] >= 0
+
+    parser.reset_stats()
+    assert parser.stats()['lines'] == 0
+
+
+def test_get_and_parse_reading(handler):
+    protocol_buffers.ResetBuffers(b'ment": 1}\r\n{"a": 1}\r\n{"b": 2}\r\n{"c"')
+    ser = rs232.SerialData(port='buffers://', timeout=0.1)
+
+    assert ser.get_and_parse_reading(retry_limit=2)[1] == {'a': 1}
+    # Already read and decoded.
+    assert ser.get_and_parse_reading(retry_limit=1)[1] == {'b': 2}
+    assert ser.get_and_parse_reading(retry_limit=1) is None
+
+    protocol_buffers.SetRBufferValue(b': 3}\r\n')
+    assert ser.get_and_parse_reading(retry_limit=1)[1] == {'c': 3}
+    assert ser.parser.stats()['errors'] == 1
+    ser.disconnect()
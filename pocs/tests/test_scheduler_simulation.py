@@ -0,0 +1,83 @@
+import pytest
+import yaml
+
+from astroplan import Observer
+from astropy import units as u
+from astropy.coordinates import EarthLocation
+from astropy.time import Time
+
+from pocs.scheduler.constraint import Duration
+from pocs.scheduler.constraint import MoonAvoidance
+from pocs.scheduler.dispatch import Scheduler
+from pocs.scheduler.simulation import ScheduleSimulation
+
+
+@pytest.fixture
+def observer(config):
+    loc = config['location']
+    location = EarthLocation(lon=loc['longitude'], lat=loc['latitude'], height=loc['elevation'])
+    return Observer(location=location, name="Test Observer", timezone=loc['timezone'])
+
+
+@pytest.fixture()
+def field_list():
+    return yaml.load("""
+    -
+        name: HD 189733
+        position: 20h00m43.7135s +22d42m39.0645s
+        priority: 100
+    -
+        name: Wasp 33
+        position: 02h26m51.0582s +37d33m01.733s
+        priority: 100
+    -
+        name: M42
+        position: 05h35m17.2992s -05d23m27.996s
+        priority: 25
+        exptime: 240
+    """)
+
+
+@pytest.fixture
+def scheduler(field_list, observer):
+    return Scheduler(observer, fields_list=field_list,
+                     constraints=[MoonAvoidance(), Duration(30 * u.deg)])
+
+
+def test_get_nights(scheduler):
+    simulation = ScheduleSimulation(scheduler=scheduler)
+
+    nights = simulation.get_nights(Time('2016-08-13 00:00:00'), num_nights=2)
+    assert len(nights) == 2
+
+    (start0, end0), (start1, end1) = nights
+    assert start0 < end0 < start1 < end1
+    assert (start1 - start0).to(u.hour).value == pytest.approx(24, abs=0.5)
+
+
+def test_run(scheduler):
+    simulation = ScheduleSimulation(scheduler=scheduler)
+
+    results = simulation.run(Time('2016-08-13 00:00:00'), time_step=60 * u.minute)
+    assert len(results) > 5
+    assert results[0]['observation'] is not None
+
+    for result in results:
+        assert result['wall_time'] > 0
+        assert set(result['constraint_times'].keys()) == {'Moon Avoidance',
+                                                          'Duration above 30.0 deg'}
+
+    summary = simulation.summary()
+    assert summary['calls'] == len(results)
+    assert summary['decisions'] <= summary['calls']
+    assert summary['total']['max'] >= summary['total']['mean'] > 0
+    assert summary['constraints']['Moon Avoidance']['mean'] > 0
+
+    # Observed list is cleared after each night
+    assert len(scheduler.observed_list) == 0
+
+
+def test_from_config(config):
+    simulation = ScheduleSimulation(config=config)
+    assert len(simulation.scheduler.observations) > 0
+    assert len(simulation.timed_constraints) == 3
@@ -0,0 +1,212 @@
+import base64
+import hashlib
+import json
+import os
+import time
+
+import pytest
+
+from pocs.utils.error import GoogleCloudError
+from pocs.utils.google.storage import UploadManager, upload_observation_to_bucket
+
+CHUNK_SIZE = 256 * 1024
+
+
+class LocalBucket(object):
+    """ Stands in for `PanStorage`, storing the objects in a local directory """
+
+    def __init__(self, root, fail_chunks=(), corrupt=()):
+        self.unit_id = 'PAN000'
+        self.root = root
+        # Numbers of the calls to `upload_chunk` that fail, or store half the chunk and fail.
+        self.fail_chunks = set(fail_chunks)
+        # Remote paths stored with the wrong contents the first time.
+        self.corrupt = set(corrupt)
+
+        self.sessions = dict()
+        self.sent = list()
+        self.num_chunks = 0
+
+    def create_upload_session(self, remote_path, size, content_type=None):
+        session_url = 'session{}'.format(len(self.sessions))
+        self.sessions[session_url] = {'remote_path': remote_path, 'size': size, 'data': b''}
+        return session_url
+
+    def upload_chunk(self, session_url, data, offset, size):
+        self.num_chunks += 1
+        session = self.sessions[session_url]
+        assert offset == len(session['data'])
+
+        if self.num_chunks in self.fail_chunks:
+            data = data[:len(data) // 2]
+            self.sent.append((session['remote_path'], offset, len(data)))
+            session['data'] += data
+            raise ConnectionError("Connection reset")
+
+        self.sent.append((session['remote_path'], offset, len(data)))
+        session['data'] += data
+        return self.query_upload(session_url, size)
+
+    def query_upload(self, session_url, size):
+        session = self.sessions.get(session_url)
+        if session is None:
+            return None
+
+        data = session['data']
+        if len(data) < size:
+            return len(data), None
+
+        if session['remote_path'] in self.corrupt:
+            self.corrupt.remove(session['remote_path'])
+            data = data[::-1]
+
+        path = os.path.join(self.root, session['remote_path'])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return size, base64.b64encode(hashlib.md5(data).digest()).decode()
+
+    def read(self, remote_path):
+        with open(os.path.join(self.root, remote_path), 'rb') as f:
+            return f.read()
+
+
+@pytest.fixture
+def files(tmpdir):
+    files = dict()
+    for i, size in enumerate([0, 1000, 3 * CHUNK_SIZE, 2 * CHUNK_SIZE + 100]):
+        local_path = str(tmpdir.join('image{}.fits'.format(i)))
+        with open(local_path, 'wb') as f:
+            f.write(os.urandom(size))
+        files[local_path] = 'PAN000/field/image{}.fits'.format(i)
+    return files
+
+
+@pytest.fixture
+def manifest_file(tmpdir):
+    return str(tmpdir.join('upload_manifest.json'))
+
+
+def check_uploaded(bucket, files):
+    for local_path, remote_path in files.items():
+        with open(local_path, 'rb') as f:
+            assert bucket.read(remote_path) == f.read()
+
+
+def test_upload(tmpdir, files, manifest_file):
+    bucket = LocalBucket(str(tmpdir.mkdir('bucket')))
+    uploader = UploadManager(bucket, manifest_file, max_workers=3, chunk_size=CHUNK_SIZE)
+
+    assert uploader.upload(files) == files
+    check_uploaded(bucket, files)
+    assert bucket.num_chunks == 1 + 1 + 3 + 3
+
+    with open(manifest_file) as f:
+        manifest = json.load(f)
+    assert all(entry['state'] == UploadManager.DONE for entry in manifest.values())
+
+    # Nothing to do the second time, unless a file has changed.
+    local_path = list(files)[1]
+    with open(local_path, 'wb') as f:
+        f.write(b'changed')
+    uploader = UploadManager(bucket, manifest_file, chunk_size=CHUNK_SIZE)
+    assert uploader.upload(files) == files
+    assert bucket.num_chunks == 8 + 1
+    check_uploaded(bucket, files)
+
+
+def test_upload_retry(tmpdir, files, manifest_file):
+    bucket = LocalBucket(str(tmpdir.mkdir('bucket')),
+                         fail_chunks=[3, 5, 6],
+                         corrupt=['PAN000/field/image3.fits'])
+    uploader = UploadManager(bucket, manifest_file, max_workers=1, chunk_size=CHUNK_SIZE,
+                             backoff=0.01)
+
+    assert uploader.upload(files) == files
+    check_uploaded(bucket, files)
+
+    # Failed chunks carry on from what was stored, the corrupted file starts again.
+    sent = [length for remote_path, _, length in bucket.sent
+            if remote_path == 'PAN000/field/image2.fits']
+    assert sent == [CHUNK_SIZE // 2, CHUNK_SIZE] + [CHUNK_SIZE // 2] * 3
+    assert sum(sent) == 3 * CHUNK_SIZE
+    sent = [offset for remote_path, offset, _ in bucket.sent
+            if remote_path == 'PAN000/field/image3.fits']
+    assert sent == [0, CHUNK_SIZE, 2 * CHUNK_SIZE] * 2
+
+
+def test_upload_resume(tmpdir, files, manifest_file):
+    bucket = LocalBucket(str(tmpdir.mkdir('bucket')), fail_chunks=range(5, 100))
+    uploader = UploadManager(bucket, manifest_file, max_workers=1, chunk_size=CHUNK_SIZE,
+                             max_attempts=2, backoff=0.01)
+
+    results = uploader.upload(files)
+    assert list(results.values()) == list(files.values())[:2] + [None, None]
+
+    # Restarted with a working connection.
+    bucket.fail_chunks = set()
+    uploader = UploadManager(bucket, manifest_file, chunk_size=CHUNK_SIZE)
+    assert uploader.upload(files) == files
+    check_uploaded(bucket, files)
+
+    # Every byte was only stored once.
+    for local_path, remote_path in files.items():
+        sent = sum(length for path, _, length in bucket.sent if path == remote_path)
+        assert sent == os.path.getsize(local_path)
+
+    # An expired session starts again.
+    with open(manifest_file) as f:
+        manifest = json.load(f)
+    local_path = list(files)[2]
+    manifest[local_path].update(state=UploadManager.FAILED, session_url='expired')
+    with open(manifest_file, 'w') as f:
+        json.dump(manifest, f)
+
+    uploader = UploadManager(bucket, manifest_file, chunk_size=CHUNK_SIZE)
+    assert uploader.upload(files) == files
+    assert bucket.sent[-1] == (files[local_path], 2 * CHUNK_SIZE, CHUNK_SIZE)
+
+
+def test_upload_max_rate(tmpdir, files, manifest_file):
+    bucket = LocalBucket(str(tmpdir.mkdir('bucket')))
+    uploader = UploadManager(bucket, manifest_file, max_workers=4, chunk_size=CHUNK_SIZE,
+                             max_rate=20 * CHUNK_SIZE)
+
+    start = time.monotonic()
+    assert uploader.upload(files) == files
+    total_bytes = sum(os.path.getsize(local_path) for local_path in files)
+    assert time.monotonic() - start > (total_bytes - CHUNK_SIZE) / (20 * CHUNK_SIZE)
+
+
+def test_upload_chunk_size(tmpdir, manifest_file):
+    with pytest.raises(AssertionError):
+        UploadManager(LocalBucket(str(tmpdir)), manifest_file, chunk_size=1000)
+
+
+def test_upload_observation_to_bucket(tmpdir):
+    obs_dir = tmpdir.mkdir('fields').mkdir('field').mkdir('camera').mkdir('20180327T071126')
+    for name in ['image1.fits.fz', 'image2.fits.fz', 'notes.txt']:
+        obs_dir.join(name).write(name)
+
+    bucket = LocalBucket(str(tmpdir.mkdir('bucket')))
+    upload_observation_to_bucket('PAN000', str(obs_dir),
+                                 include_files='*',
+                                 exclude_files='*.txt',
+                                 storage=bucket)
+
+    remote_dir = 'PAN000/field/camera/20180327T071126'
+    assert sorted(os.listdir(os.path.join(bucket.root, remote_dir))) == [
+        'image1.fits.fz', 'image2.fits.fz']
+    assert os.path.exists(str(obs_dir.join('upload_manifest.json')))
+
+    # The manifest itself is never uploaded.
+    upload_observation_to_bucket('PAN000', str(obs_dir), include_files='*', storage=bucket)
+    assert sorted(os.listdir(os.path.join(bucket.root, remote_dir))) == [
+        'image1.fits.fz', 'image2.fits.fz', 'notes.txt']
+
+    bucket.fail_chunks = range(100)
+    obs_dir.join('image3.fits.fz').write('image3')
+    with pytest.raises(GoogleCloudError):
+        upload_observation_to_bucket('PAN000', str(obs_dir),
+                                     storage=bucket,
+                                     max_attempts=1)
@@ -3,6 +3,7 @@ import pytest
 import subprocess
 import shutil
 
+from astropy.io import fits
 from astropy.io.fits import Header
 
 from pocs.utils.images import fits as fits_utils
@@ -25,16 +26,111 @@ def test_fpack(solved_fits_file):
     copy_file = shutil.copyfile(solved_fits_file, new_file)
     info = os.stat(copy_file)
     assert info.st_size > 0.
+    data = fits.getdata(copy_file)
 
     uncompressed = fits_utils.funpack(copy_file, verbose=True)
-    assert os.stat(uncompressed).st_size > info.st_size
+    assert uncompressed == copy_file.replace('.fz', '')
+    assert not os.path.exists(copy_file)
+    uncompressed_size = os.stat(uncompressed).st_size
+    assert uncompressed_size > info.st_size
+    assert fits.getheader(uncompressed)['IMAGEID'] == 'PAN001_XXXXXX_20160909T081152'
 
     compressed = fits_utils.fpack(uncompressed, verbose=True)
-    assert os.stat(compressed).st_size == info.st_size
+    assert compressed == copy_file
+    assert not os.path.exists(uncompressed)
+    assert os.stat(compressed).st_size < uncompressed_size
+    assert (fits.getdata(compressed) == data).all()
+    assert fits_utils.getval(compressed, 'IMAGEID') == 'PAN001_XXXXXX_20160909T081152'
+
+    # Already packed
+    with pytest.warns(UserWarning):
+        assert fits_utils.fpack(compressed) == compressed
 
     os.remove(copy_file)
 
 
+def test_fpack_extensions(data_dir, tmpdir):
+    data = fits.getdata(os.path.join(data_dir, 'unsolved.fits'))
+    table = fits.BinTableHDU.from_columns([fits.Column(name='x', format='D', array=[1., 2.])],
+                                          name='STARS')
+    fits_file = str(tmpdir.join('extensions.fits'))
+    fits.HDUList([fits.PrimaryHDU(data),
+                  fits.ImageHDU(data[:10, :10], name='CUTOUT'),
+                  table]).writeto(fits_file)
+
+    compressed = fits_utils.fpack(fits_file)
+    with fits.open(compressed) as hdu_list:
+        assert len(hdu_list) == 4
+        assert (hdu_list[1].data == data).all()
+        assert isinstance(hdu_list['CUTOUT'], fits.CompImageHDU)
+        assert (hdu_list['CUTOUT'].data == data[:10, :10]).all()
+        assert list(hdu_list['STARS'].data['x']) == [1., 2.]
+
+    uncompressed = fits_utils.funpack(compressed)
+    with fits.open(uncompressed) as hdu_list:
+        assert len(hdu_list) == 3
+        assert (hdu_list[0].data == data).all()
+        assert isinstance(hdu_list['CUTOUT'], fits.ImageHDU)
+        assert (hdu_list['CUTOUT'].data == data[:10, :10]).all()
+        assert list(hdu_list['STARS'].data['x']) == [1., 2.]
+
+
+def test_fpack_files(data_dir, tmpdir):
+    data = fits.getdata(os.path.join(data_dir, 'unsolved.fits'))
+    fits_files = list()
+    for i in range(3):
+        fits_files.append(shutil.copy(os.path.join(data_dir, 'unsolved.fits'),
+                                      str(tmpdir.join('unsolved{}.fits'.format(i)))))
+    bad_file = str(tmpdir.join('bad.fits'))
+    with open(bad_file, 'w') as f:
+        f.write('not a FITS file')
+
+    with pytest.warns(UserWarning):
+        results = fits_utils.fpack_files(fits_files + [bad_file], max_workers=2)
+
+    assert results[bad_file] is None
+    assert os.path.exists(bad_file)
+    for fits_file in fits_files:
+        assert results[fits_file] == fits_file + '.fz'
+        assert (fits.getdata(results[fits_file]) == data).all()
+        assert not os.path.exists(fits_file)
+
+
+def test_write_fits_compressed(data_dir, tmpdir):
+    data = fits.getdata(os.path.join(data_dir, 'unsolved.fits'))
+    header = Header({'EXPTIME': 1.0})
+    fits_file = fits_utils.write_fits(data, header, str(tmpdir.join('compressed.fits')),
+                                      compress=True)
+    assert fits_file == str(tmpdir.join('compressed.fits.fz'))
+    assert fits_utils.getval(fits_file, 'EXPTIME') == 1.0
+    assert (fits.getdata(fits_file) == data).all()
+
+
+def test_update_header(data_dir, tmpdir):
+    data = fits.getdata(os.path.join(data_dir, 'unsolved.fits'))
+    header = fits_utils.set_observation_headers(Header({'EXPTIME': 1.0}),
+                                                {'image_id': 'PAN000_XXXXXX_20180901T120000'})
+    fits_file = fits_utils.write_fits(data, header, str(tmpdir.join('image.fits')))
+    assert fits_utils.getval(fits_file, 'IMAGEID') == 'PAN000_XXXXXX_20180901T120000'
+    size = os.path.getsize(fits_file)
+    inode = os.stat(fits_file).st_ino
+
+    # Fits in the reserved cards, so updated in place
+    fits_utils.update_header(fits_file, {'CRVAL1': (303.2, 'RA'), 'CRVAL2': 46.0})
+    fits_utils.update_headers(fits_file, {'field_name': 'Test'})
+    assert os.path.getsize(fits_file) == size
+    assert os.stat(fits_file).st_ino == inode
+    header = fits_utils.getheader(fits_file)
+    assert header['CRVAL1'] == 303.2
+    assert header.comments['CRVAL1'] == 'RA'
+    assert header['FIELD'] == 'Test'
+    assert (fits.getdata(fits_file) == data).all()
+
+    compressed = fits_utils.fpack(fits_file)
+    fits_utils.update_header(compressed, {'CRVAL2': 47.0})
+    assert fits_utils.getval(compressed, 'CRVAL2') == 47.0
+
+
 def test_getheader(solved_fits_file):
     header = fits_utils.getheader(solved_fits_file)
     assert isinstance(header, Header)
@@ -65,3 +161,61 @@ def test_solve_bad_field(solved_fits_file):
     proc = fits_utils.solve_field('Foo', verbose=True)
     outs, errs = proc.communicate()
     assert 'ERROR' in outs
+
+
+def test_solve_hinted_options(solved_fits_file, tmpdir):
+    fits_path = shutil.copy(solved_fits_file, str(tmpdir))
+    index_file = '/var/panoptes/astrometry/data/index-4211.fits'
+
+    proc = fits_utils.solve_field(fits_path, verbose=True, ra=303.2, dec=46.0, radius=2,
+                                  scale_low=9., scale_high=11., index_files=[index_file])
+    proc.communicate()
+
+    assert '--scale-low' in proc.args
+    assert '--guess-scale' not in proc.args
+
+    config_path = proc.args[proc.args.index('--config') + 1]
+    with open(config_path) as f:
+        assert 'index {}'.format(index_file) in f.read()
+
+
+def test_solve_index_files(solved_fits_file):
+    header = fits_utils.getheader(solved_fits_file)
+
+    index_files = fits_utils.get_solve_index_files(header)
+    assert index_files == ['/var/panoptes/astrometry/data/index-4211.fits']
+
+    assert fits_utils.get_solve_index_files({}) == []
+
+
+def test_solve_scale(solved_fits_file, data_dir):
+    header = fits_utils.getheader(solved_fits_file)
+    assert abs(fits_utils.get_solve_scale(header) - 10.32) < 0.01
+
+    # As returned by get_solve_field
+    solve_info = {'solved_fits_file': solved_fits_file}
+    solve_info.update(header)
+    assert abs(fits_utils.get_solve_scale(solve_info) - 10.32) < 0.01
+
+    unsolved = fits_utils.getheader(os.path.join(data_dir, 'unsolved.fits'))
+    assert fits_utils.get_solve_scale(unsolved) is None
+
+
+def test_solve_cache(solved_fits_file, data_dir):
+    cache = fits_utils.SolveCache(radius=1, scale_tolerance=0.1)
+    assert cache.get_hints('Test Field') == {}
+
+    # Unsolved files are ignored
+    cache.update('Test Field', fits_utils.getheader(os.path.join(data_dir, 'unsolved.fits')))
+    assert 'Test Field' not in cache
+
+    cache.update('Test Field', fits_utils.getheader(solved_fits_file))
+    assert 'Test Field' in cache
+
+    hints = cache.get_hints('Test Field')
+    assert hints['radius'] == 1
+    assert hints['scale_low'] < 10.32 < hints['scale_high']
+    assert hints['index_files'] == ['/var/panoptes/astrometry/data/index-4211.fits']
+
+    cache.remove('Test Field')
+    assert cache.get_hints('Test Field') == {}
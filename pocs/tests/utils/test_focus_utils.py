@@ -48,3 +48,12 @@ def test_focus_metric_bad_string(data_dir):
     data = focus_utils.mask_saturated(data)
     with pytest.raises(KeyError):
         focus_utils.focus_metric(data, merit_function='NOTAMERITFUNCTION')
+
+
+def test_peak_bracketed():
+    assert not focus_utils.peak_bracketed([])
+    assert not focus_utils.peak_bracketed([3, 2, 1])
+    assert not focus_utils.peak_bracketed([1, 2, 3, 2])
+    assert focus_utils.peak_bracketed([1, 2, 3, 2, 1])
+    assert focus_utils.peak_bracketed([1, 2, 3, 2], num_points=1)
+    assert not focus_utils.peak_bracketed([1, 3, 2, 4, 2])
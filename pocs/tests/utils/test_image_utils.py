@@ -5,6 +5,8 @@ import shutil
 import tempfile
 from glob import glob
 
+from PIL import Image
+
 from pocs.utils import images as img_utils
 from pocs.utils import error
 
@@ -39,6 +41,43 @@ def test_crop_data():
     assert cropped03.sum() == 36.
 
 
+def make_star_field(shape, positions, sigma=2.):
+    y, x = np.indices(shape)
+    data = np.full(shape, 100.)
+    for y0, x0 in positions:
+        data += 1000 * np.exp(-((y - y0)**2 + (x - x0)**2) / (2 * sigma**2))
+    return data
+
+
+def test_measure_shift():
+    np.random.seed(42)
+    positions = np.random.uniform(20, 180, size=(30, 2))
+
+    reference = make_star_field((200, 200), positions)
+    data = make_star_field((200, 200), positions + [3.4, -5.7])
+
+    shift = img_utils.measure_shift(reference, data)
+    assert np.allclose(shift, [3.4, -5.7], atol=0.2)
+
+    # Opposite direction, cropped and binned.
+    shift = img_utils.measure_shift(data, reference, box_width=150, bin_size=2)
+    assert np.allclose(shift, [-3.4, 5.7], atol=0.4)
+
+    assert np.allclose(img_utils.measure_shift(reference, reference), [0, 0])
+
+
+def test_measure_shift_no_correlation():
+    np.random.seed(42)
+    reference = np.random.normal(100, 10, size=(100, 100))
+    data = np.random.normal(100, 10, size=(100, 100))
+
+    with pytest.raises(error.PanError):
+        img_utils.measure_shift(reference, data)
+
+    with pytest.raises(AssertionError):
+        img_utils.measure_shift(reference, data[:50])
+
+
 def test_make_pretty_image(solved_fits_file, tiny_fits_file, save_environ):
     # Not a valid file type (can't automatically handle .fits.fz files).
     with pytest.warns(UserWarning, match='File must be'):
@@ -83,6 +122,57 @@ def test_make_pretty_image(solved_fits_file, tiny_fits_file, save_environ):
         assert os.path.isfile(pretty)
         assert not os.path.isdir(imgdir)
 
+        # Plot with matplotlib
+        os.remove(pretty)
+        pretty = img_utils.make_pretty_image(fits_file, full_plot=True)
+        assert os.path.isfile(pretty)
+
+
+def test_make_preview(tmpdir):
+    data = np.random.poisson(1000, (1000, 1500)).astype(np.uint16)
+    data[500:520, 500:520] = 65000
+    preview = img_utils.make_preview(data, str(tmpdir.join('preview.jpg')), title='some text',
+                                     max_size=500)
+    assert preview == str(tmpdir.join('preview.jpg'))
+
+    image = Image.open(preview)
+    assert image.format == 'JPEG'
+    assert image.size == (500, 333)
+    # Saturated pixels are white, origin at the bottom.
+    assert np.all(np.asarray(image)[333 - 170, 170] > 200)
+
+    # Other types of data
+    img_utils.make_preview(data.astype(np.float32), str(tmpdir.join('float.jpg')))
+    img_utils.make_preview(data.astype(np.int16) - 1000, str(tmpdir.join('int.jpg')))
+    assert os.path.isfile(str(tmpdir.join('float.jpg')))
+    assert os.path.isfile(str(tmpdir.join('int.jpg')))
+
+    # Colour (RGB24) data keeps its colours.
+    rgb = np.zeros((600, 800, 3), dtype=np.uint8)
+    rgb[..., 0] = 200
+    preview = img_utils.make_preview(rgb, str(tmpdir.join('rgb.jpg')), max_size=400)
+    image = np.asarray(Image.open(preview))
+    assert image.shape == (300, 400, 3)
+    assert image[150, 200, 0] > 200 and image[150, 200, 2] < 50
+
+    with pytest.raises(ValueError):
+        img_utils.make_preview(np.zeros((10, 10, 10)), str(tmpdir.join('cube.jpg')))
+
+
+def test_bin_data():
+    data = np.arange(30, dtype=np.uint16).reshape(5, 6)
+    binned = img_utils.bin_data(data, 2)
+    assert binned.dtype == np.uint16
+    assert binned.tolist() == [[3, 5, 7], [15, 17, 19]]
+    assert np.allclose(img_utils.bin_data(data.astype(np.float32), 2),
+                       [[3.5, 5.5, 7.5], [15.5, 17.5, 19.5]])
+
+    # Only the spatial axes of colour data are binned.
+    rgb = np.stack([data, data * 2, data * 3], axis=-1)
+    binned = img_utils.bin_data(rgb, 2)
+    assert binned.shape == (2, 3, 3)
+    assert binned[..., 1].tolist() == [[7, 11, 15], [31, 35, 39]]
+
 
 @pytest.mark.skipif(
     "TRAVIS" in os.environ and os.environ["TRAVIS"] == "true",
@@ -113,3 +203,16 @@ def test_clean_observation_dir(data_dir):
 
         # Cleanup
         img_utils.clean_observation_dir(tmpdir, verbose=True)
+
+
+def test_clean_observation_dir_not_packed(data_dir, tmpdir):
+    shutil.copy(os.path.join(data_dir, 'unsolved.fits'), str(tmpdir))
+    tmpdir.join('bad.fits').write('Not a FITS file')
+
+    with pytest.warns(UserWarning):
+        with pytest.raises(error.PanError):
+            img_utils.clean_observation_dir(str(tmpdir))
+
+    # The good file was still compressed.
+    assert os.path.exists(str(tmpdir.join('unsolved.fits.fz')))
+    assert os.path.exists(str(tmpdir.join('bad.fits')))
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from astropy import units as u
+
+from pocs.utils.serializers import dumps_binary
+from pocs.utils.serializers import loads_binary
+from pocs.utils.serializers import register_binary_type
+
+
+@pytest.mark.parametrize('value', [
+    None, True, False, 0, 127, 128, -32, -33, 2**40, -2**40, 2**64 - 1, 1.5,
+    '', 'a' * 31, 'a' * 255, 'a' * 70000, 'Ω', b'', b'\x00' * 70000,
+    [], list(range(20)), {'a': [1, {'b': None}]}, {str(i): i for i in range(20)},
+])
+def test_binary_round_trip(value):
+    assert loads_binary(dumps_binary(value)) == value
+
+
+def test_binary_msgpack_format():
+    # Values as encoded by msgpack.
+    assert dumps_binary({'a': [1, -1, None]}) == b'\x81\xa1a\x93\x01\xff\xc0'
+    assert dumps_binary(1.) == b'\xcb?\xf0\x00\x00\x00\x00\x00\x00'
+    assert loads_binary(b'\xcc\xff') == 255
+    assert loads_binary(b'\xd1\xff\x00') == -256
+    assert loads_binary(b'\xca?\x80\x00\x00') == 1.
+
+
+def test_binary_numpy():
+    value = loads_binary(dumps_binary({'a': np.arange(3), 'b': np.float32(0.5)}))
+    assert value == {'a': [0, 1, 2], 'b': 0.5}
+
+    quantity = loads_binary(dumps_binary(np.arange(3) * u.m))
+    assert (quantity == np.arange(3) * u.m).all()
+
+
+def test_binary_registered_type():
+    class Point(object):
+        def __init__(self, x):
+            self.x = x
+
+    register_binary_type(100, Point, lambda p: bytes([p.x]), lambda data: Point(data[0]))
+    assert loads_binary(dumps_binary([Point(7)]))[0].x == 7
+
+    with pytest.raises(ValueError):
+        register_binary_type(200, Point, None, None)
+
+
+def test_binary_invalid():
+    with pytest.raises(ValueError):
+        loads_binary(b'\xc1')
+    with pytest.raises(ValueError):
+        loads_binary(b'\x93\x01')
+    with pytest.raises(ValueError):
+        loads_binary(b'\x01\x02')
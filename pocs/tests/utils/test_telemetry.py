@@ -0,0 +1,108 @@
+import os
+import numpy as np
+import pytest
+
+from datetime import datetime
+from datetime import timedelta
+
+from pocs.utils.telemetry import TelemetryArchive
+from pocs.utils.telemetry import flatten_record
+
+
+@pytest.fixture
+def archive_dir(tmpdir):
+    return str(tmpdir)
+
+
+def make_weather(date, i):
+    return {
+        'date': date,
+        'safe': i % 2 == 0,
+        'sky_temp_C': -20. - i,
+        'ambient_temp_C': 10. + i,
+        'rain_sensor_temp_C': '{:.02f}'.format(5. + i),
+        'sky_condition': 'Clear',
+        'errors': {'error_1': 0},
+    }
+
+
+def test_weather_archive(archive_dir):
+    archive = TelemetryArchive(archive_dir, 'weather')
+
+    start = datetime(2018, 9, 1, 23, 58)
+    records = [make_weather(start + timedelta(minutes=i), i) for i in range(4)]
+    assert archive.append(records) == 4
+
+    # Split at midnight
+    assert archive.days() == ['20180901', '20180902']
+    assert list(archive.columns('20180901').keys())[:3] == ['date', 'safe', 'ambient_temp_C']
+
+    arrays = archive.read('20180901', columns=['sky_temp_C', 'not_a_column'])
+    assert list(arrays.keys()) == ['sky_temp_C']
+    assert isinstance(arrays['sky_temp_C'], np.memmap)
+    assert np.allclose(arrays['sky_temp_C'], [-20., -21.])
+
+    arrays = archive.read('20180902')
+    assert np.allclose(arrays['rain_sensor_temp_C'], [7., 8.])
+    assert np.isnan(arrays['wind_speed_KPH']).all()
+    assert list(arrays['sky_condition']) == ['Clear', 'Clear']
+    assert 'errors.error_1' not in arrays
+
+    # Appends to the existing day
+    archive.append([make_weather(start + timedelta(minutes=4), 4)])
+    values = archive.read_range(start=start + timedelta(minutes=1),
+                                end=start + timedelta(minutes=4, seconds=1),
+                                columns=['safe'])
+    assert list(values.keys()) == ['date', 'safe']
+    assert list(values['safe']) == [False, True, False, True]
+    assert values['date'][0] == np.datetime64('2018-09-01T23:59')
+
+
+def test_environment_archive(archive_dir):
+    archive = TelemetryArchive(archive_dir, 'environment')
+
+    date = datetime(2018, 9, 1, 12)
+    archive.append([{'date': date, 'data': {'camera_board': {'humidity': 40, 'temps': [1, 2]}}}])
+    archive.append([{'date': date, 'data': {'camera_board': {'humidity': 41},
+                                            'telemetry_board': {'fans': True}}}])
+
+    arrays = archive.read('20180901')
+    assert sorted(arrays.keys()) == ['camera_board.humidity', 'camera_board.temps.0',
+                                     'camera_board.temps.1', 'date', 'telemetry_board.fans']
+    assert np.allclose(arrays['camera_board.humidity'], [40, 41])
+    assert np.isnan(arrays['camera_board.temps.0'][1])
+    assert list(arrays['telemetry_board.fans']) == [False, True]
+
+    # A partly written row is dropped
+    with open(os.path.join(archive_dir, 'environment', '20180901', 'date.bin'), 'ab') as f:
+        f.write(b'1234')
+    assert len(TelemetryArchive(archive_dir, 'environment').read('20180901')['date']) == 2
+
+
+def test_export(archive_dir, memory_db, save_environ):
+    os.environ['POCSTIME'] = '2018-09-01 12:00:00'
+    for i in range(5):
+        memory_db.insert('weather', make_weather(None, i))
+
+    archive = TelemetryArchive(archive_dir, 'weather')
+    assert archive.export(memory_db, start=datetime(2018, 9, 1, 12, 0, 1), batch_size=2) == 4
+
+    arrays = archive.read('20180901')
+    assert np.allclose(arrays['ambient_temp_C'], [11, 12, 13, 14])
+    assert arrays['date'][0] == np.datetime64('2018-09-01T12:00:01')
+
+    # Running it again only adds the new records.
+    assert archive.export(memory_db) == 1
+    assert archive.export(memory_db) == 0
+    os.environ['POCSTIME'] = '2018-09-01 12:01:00'
+    memory_db.insert('weather', make_weather(None, 5))
+    assert archive.export(memory_db) == 1
+
+    arrays = archive.read('20180901')
+    assert np.allclose(arrays['ambient_temp_C'], [11, 12, 13, 14, 10, 15])
+    assert len(archive.read_range()['date']) == 6
+
+
+def test_flatten_record():
+    assert flatten_record({'a': {'b': 1, 'c': [2, {'d': 3}]}, 'e': 'f'}) == {
+        'a.b': 1, 'a.c.0': 2, 'a.c.1.d': 3, 'e': 'f'}
@@ -1,9 +1,18 @@
 import abc
+import atexit
+import copy
+import bisect
+import calendar
+import fcntl
 import os
 import pymongo
+import shutil
 import threading
+import time
 import weakref
+from contextlib import contextmanager
 from contextlib import suppress
+from datetime import timezone
 from warnings import warn
 from uuid import uuid4
 from glob import glob
@@ -107,6 +116,27 @@ class AbstractPanDB(metaclass=abc.ABCMeta):
         """
         raise NotImplementedError
 
+    @abc.abstractclassmethod
+    def query(self, collection, start=None, end=None, fields=None):
+        """Find the records of a collection in a range of time.
+
+        The records are read as they are needed, so large time ranges don't have
+        to fit in memory.
+
+        Args:
+            collection (str): Name of the collection.
+            start (datetime.datetime, optional): Earliest `date` of the records,
+                UTC if it has no time zone, default no limit.
+            end (datetime.datetime, optional): Records must be before this `date`,
+                UTC if it has no time zone, default no limit.
+            fields (list of str, optional): Keys of the record `data` to return,
+                default all of them.
+
+        Yields:
+            dict: The records in order of `date`.
+        """
+        raise NotImplementedError
+
     @abc.abstractclassmethod
     def clear_current(self, type):
         """Clear the current record of a certain type
@@ -117,6 +147,10 @@ class AbstractPanDB(metaclass=abc.ABCMeta):
         """
         raise NotImplementedError
 
+    def flush(self):
+        """Write any buffered records to the storage, see `BufferedPanDB` """
+        pass
+
 
 _shared_mongo_clients = weakref.WeakValueDictionary()
 
@@ -161,33 +195,48 @@ class PanDB(object):
     an instance of the 'correct' type of db.
     """
 
-    def __new__(cls, db_type=None, db_name=None, *args, **kwargs):
-        """Create an instance based on db_type."""
+    def __new__(cls, db_type=None, db_name=None, *args, buffer=None, **kwargs):
+        """Create an instance based on db_type.
+
+        If `buffer` options are given the db is wrapped in a (shared) `BufferedPanDB`
+        so that writes don't wait for the storage. If `db_type` is not given it
+        and the `buffer` options are read from the `db` config item.
+        """
 
         if not isinstance(db_name, str) and db_name:
             raise ValueError('db_name, a string, must be provided and not empty')
 
         if db_type is None:
-            db_type = load_config()['db']['type']
+            db_config = load_config()['db']
+            db_type = db_config['type']
+            if buffer is None:
+                buffer = db_config.get('buffer')
 
         if not isinstance(db_type, str) and db_type:
             raise ValueError('db_type, a string, must be provided and not empty')
 
         collection_names = PanDB.collection_names()
+        if db_name:
+            kwargs['db_name'] = db_name
 
         if db_type == 'mongo':
             try:
-                return PanMongoDB(collection_names=collection_names, **kwargs)
+                db = PanMongoDB(collection_names=collection_names, **kwargs)
             except Exception:
                 raise Exception(
                     "Can't connect to mongo, please check settings or change DB storage type")
         elif db_type == 'file':
-            return PanFileDB(collection_names=collection_names, **kwargs)
+            db = PanFileDB(collection_names=collection_names, **kwargs)
         elif db_type == 'memory':
-            return PanMemoryDB.get_or_create(collection_names=collection_names, **kwargs)
+            db = PanMemoryDB.get_or_create(collection_names=collection_names, **kwargs)
         else:
             raise Exception('Unsupported database type: {}', db_type)
 
+        if buffer:
+            db = BufferedPanDB.get_or_create(db, db_type=db_type, **buffer)
+
+        return db
+
     @staticmethod
     def collection_names():
         """The pre-defined list of collections that are valid."""
@@ -217,6 +266,12 @@ class PanDB(object):
                 'permanently_erase_database() called for non-test database {!r}'.format(db_name))
         if really != 'Yes' or dangerous != 'Totally':
             raise Exception('PanDB.permanently_erase_database called with invalid args!')
+
+        # Write out anything buffered before it is erased.
+        buffered = BufferedPanDB.shared_dbs.pop((db_type, db_name), None)
+        if buffered is not None:
+            buffered.close()
+
         if db_type == 'mongo':
             PanMongoDB.permanently_erase_database(db_name, *args, **kwargs)
         elif db_type == 'file':
@@ -269,6 +324,9 @@ class PanMongoDB(AbstractPanDB):
             # Add the collection as an attribute.
             setattr(self, collection, getattr(db_handle, collection))
 
+        # Collections known to have an index on the date.
+        self._date_indexes = set()
+
     def insert_current(self, collection, obj, store_permanently=True):
         self.validate_collection(collection)
         obj = create_storage_obj(collection, obj)
@@ -316,9 +374,42 @@ class PanMongoDB(AbstractPanDB):
             obj_id = ObjectId(obj_id)
         return collection.find_one({'_id': obj_id})
 
+    def query(self, collection, start=None, end=None, fields=None):
+        self.validate_collection(collection)
+        col = getattr(self, collection)
+        if collection not in self._date_indexes:
+            col.create_index([('date', pymongo.ASCENDING)])
+            self._date_indexes.add(collection)
+
+        date_range = dict()
+        if start is not None:
+            date_range['$gte'] = start
+        if end is not None:
+            date_range['$lt'] = end
+
+        projection = None
+        if fields is not None:
+            projection = {'type': True, 'date': True}
+            projection.update({'data.{}'.format(field): True for field in fields})
+
+        cursor = col.find({'date': date_range} if date_range else {}, projection)
+        for obj in cursor.sort('date', pymongo.ASCENDING):
+            yield obj
+
     def clear_current(self, type):
         self.current.delete_one({'type': type})
 
+    def _insert_many(self, collection, objs):
+        getattr(self, collection).insert_many(objs, ordered=False)
+
+    def _write_current(self, collection, obj):
+        # The `_id` of the current record can't be changed.
+        obj = {key: value for key, value in obj.items() if key != '_id'}
+        self.current.replace_one({'type': collection}, obj, True)
+
+    def _make_id(self):
+        return ObjectId()
+
     @classmethod
     def permanently_erase_database(self, db_name):
         # Create an instance of PanMongoDb in order to get access to
@@ -338,23 +429,40 @@ class PanMongoDB(AbstractPanDB):
 class PanFileDB(AbstractPanDB):
     """Stores collections as files of JSON records."""
 
-    def __init__(self, db_name='panoptes', **kwargs):
+    def __init__(self, db_name='panoptes', segment_hours=24, **kwargs):
         """Flat file storage for json records
 
-        This will simply store each json record inside a file corresponding
-        to the type. Each entry will be stored in a single line.
+        The `current` records are stored in one file per type. The permanent
+        records of each collection are appended, one per line, to segment files
+        that each cover `segment_hours` of time, with an index of the records
+        next to each segment so that `find` doesn't have to read the collection.
+        See `SegmentedCollection` for details.
+
+        Closed segments are compacted in a background thread when a collection
+        is first used and whenever a new segment is started. A collection file
+        from before segments were used is moved into segments the first time
+        the collection is used.
+
         Args:
             db_name (str, optional): Name of the database containing the collections.
+            segment_hours (float, optional): Hours of records in each segment,
+                default 24.
         """
 
         super().__init__(db_name=db_name, **kwargs)
 
         self.db_folder = db_name
+        self.segment_duration = segment_hours * 3600
 
         # Set up storage directory.
         self._storage_dir = os.path.join(os.environ['PANDIR'], 'json_store', self.db_folder)
         os.makedirs(self._storage_dir, exist_ok=True)
 
+        self._collections = dict()
+        self._active_segments = dict()
+        self._compactions = dict()
+        self._lock = threading.Lock()
+
     def insert_current(self, collection, obj, store_permanently=True):
         self.validate_collection(collection)
         obj_id = self._make_id()
@@ -371,10 +479,9 @@ class PanFileDB(AbstractPanDB):
         if not store_permanently:
             return result
 
-        collection_fn = self._get_file(collection)
         try:
-            # Append obj to collection file.
-            json_util.dumps_file(collection_fn, obj)
+            # Append obj to collection segment.
+            self._append(collection, obj)
             return obj_id
         except Exception as e:
             self._warn("Problem inserting object into collection: {}, {!r}".format(e, obj))
@@ -384,10 +491,9 @@ class PanFileDB(AbstractPanDB):
         self.validate_collection(collection)
         obj_id = self._make_id()
         obj = create_storage_obj(collection, obj, obj_id=obj_id)
-        collection_fn = self._get_file(collection)
         try:
-            # Insert record into file
-            json_util.dumps_file(collection_fn, obj)
+            # Insert record into collection segment.
+            self._append(collection, obj)
             return obj_id
         except Exception as e:
             self._warn("Problem inserting object into collection: {}, {!r}".format(e, obj))
@@ -403,19 +509,17 @@ class PanFileDB(AbstractPanDB):
             return None
 
     def find(self, collection, obj_id):
-        collection_fn = self._get_file(collection)
-        try:
-            with open(collection_fn, 'r') as f:
-                for line in f:
-                    # Note: We can speed this up for the case where the obj_id doesn't
-                    # contain any characters that json would need to escape: first
-                    # check if the line contains the obj_id; if not skip. Else, parse
-                    # as json, and then check for the _id match.
-                    obj = json_util.loads(line)
-                    if obj['_id'] == obj_id:
-                        return obj
-        except FileNotFoundError:
-            return None
+        return self._get_collection(collection).read(obj_id)
+
+    def query(self, collection, start=None, end=None, fields=None):
+        self.validate_collection(collection)
+        if start is not None:
+            start = _get_timestamp(start)
+        if end is not None:
+            end = _get_timestamp(end)
+
+        for obj in self._get_collection(collection).query(start=start, end=end):
+            yield _select_fields(obj, fields)
 
     def clear_current(self, record_type):
         """Clears the current record of the given type.
@@ -427,6 +531,75 @@ class PanFileDB(AbstractPanDB):
         with suppress(FileNotFoundError):
             os.remove(current_f)
 
+    def compact(self, collection, background=False):
+        """Compact the closed segments of a collection.
+
+        Args:
+            collection (str): Name of the collection.
+            background (bool, optional): Compact in a thread, default False. Does
+                nothing if a background compaction is already running.
+
+        Returns:
+            list: The segments compacted, or None in the background.
+        """
+        if not background:
+            return self._get_collection(collection).compact()
+
+        with self._lock:
+            thread = self._compactions.get(collection)
+            if thread is not None and thread.is_alive():
+                return None
+
+            thread = threading.Thread(target=self._compact_in_background,
+                                      args=(collection, ), daemon=True)
+            thread.name = 'Compact{}Thread'.format(collection.title())
+            self._compactions[collection] = thread
+
+        thread.start()
+        return None
+
+    def _compact_in_background(self, collection):
+        try:
+            self.compact(collection)
+        except Exception as e:
+            self._warn("Problem compacting collection {}: {!r}".format(collection, e))
+
+    def _append(self, collection, obj):
+        self._insert_many(collection, [obj])
+
+    def _insert_many(self, collection, objs):
+        segment = max(self._get_collection(collection).append_many(objs))
+
+        # Compact the previous segments when a new one is started.
+        if self._active_segments.setdefault(collection, segment) != segment:
+            self._active_segments[collection] = segment
+            self.compact(collection, background=True)
+
+    def _get_collection(self, collection):
+        with self._lock:
+            try:
+                return self._collections[collection]
+            except KeyError:
+                pass
+
+            store = SegmentedCollection(os.path.join(self._storage_dir, collection),
+                                        segment_duration=self.segment_duration)
+            self._collections[collection] = store
+
+        # Move the records of an old style collection file into segments.
+        old_fn = self._get_file(collection)
+        if os.path.exists(old_fn):
+            store.import_file(old_fn)
+            os.remove(old_fn)
+
+        if len(store.segments_to_compact()) > 0:
+            self.compact(collection, background=True)
+
+        return store
+
+    def _write_current(self, collection, obj):
+        json_util.dumps_file(self._get_file(collection, permanent=False), obj, clobber=True)
+
     def _get_file(self, collection, permanent=True):
         if permanent:
             name = '{}.json'.format(collection)
@@ -439,10 +612,381 @@ class PanFileDB(AbstractPanDB):
 
     @classmethod
     def permanently_erase_database(cls, db_name):
-        # Clear out any .json files.
+        # Clear out any .json files and collection segments.
         storage_dir = os.path.join(os.environ['PANDIR'], 'json_store', db_name)
         for f in glob(os.path.join(storage_dir, '*.json')):
             os.remove(f)
+        for d in glob(os.path.join(storage_dir, '*', '')):
+            shutil.rmtree(d, ignore_errors=True)
+
+
+class SegmentedCollection(object):
+    """Append-only store for the records of one collection of a `PanFileDB`.
+
+    Records are appended as JSON lines to segment files that each cover a fixed
+    period of time, named by the UTC start of the period. The periods are aligned
+    to the unix epoch, so every process writing to the store uses the same segment
+    without having to coordinate, and segments rotate as time goes by.
+
+    Next to each segment is an index file with one line per record with the id,
+    byte offset, length and timestamp of the record. The index is read into
+    memory (only the new lines are read on later calls), so a record is found
+    with a dict lookup and one read. If a record isn't where the index says, e.g.
+    because another process compacted the segment, the index is read again.
+
+    Compaction rewrites a closed segment without the duplicate or partly written
+    records that a crash can leave, and rebuilds its index from the data, which
+    recovers any records whose index line was not written.
+
+    Appending and compacting hold a lock on the segment (a `flock` on a lock file
+    next to it), so records appended by another process while a segment is being
+    compacted are not lost.
+    """
+
+    COMPACTED = '# compacted\n'
+
+    def __init__(self, directory, segment_duration=86400):
+        self.directory = directory
+        self.segment_duration = segment_duration
+        os.makedirs(self.directory, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._reset()
+
+    def segment_name(self, timestamp):
+        """Name of the segment for records at `timestamp` (unix seconds) """
+        start = timestamp - (timestamp % self.segment_duration)
+        return time.strftime('%Y%m%dT%H%M%S', time.gmtime(start))
+
+    def segments(self):
+        """Sorted names of the segments, oldest first """
+        return sorted(os.path.basename(fn)[:-5]
+                      for fn in glob(os.path.join(self.directory, '*.json')))
+
+    def segments_to_compact(self, timestamp=None):
+        """Names of the closed segments that are not yet compacted """
+        if timestamp is None:
+            timestamp = time.time()
+        active = self.segment_name(timestamp)
+
+        segments = list()
+        for segment in self.segments():
+            if segment >= active:
+                continue
+            try:
+                with open(self._index_file(segment), 'r') as f:
+                    if f.readline() == self.COMPACTED:
+                        continue
+            except FileNotFoundError:
+                pass
+            segments.append(segment)
+
+        return segments
+
+    def append(self, obj):
+        """Append a record.
+
+        Args:
+            obj (dict): The record, with the `_id` and `date` of a storage object.
+
+        Returns:
+            str: Name of the segment the record was written to.
+        """
+        return self.append_many([obj])[0]
+
+    def append_many(self, objs):
+        """Append records with one write to each segment.
+
+        Args:
+            objs (list of dict): The records, see `append`.
+
+        Returns:
+            list: Name of the segment each record was written to.
+        """
+        segments = list()
+        batches = dict()
+        for obj in objs:
+            timestamp = _get_timestamp(obj['date'])
+            segment = self.segment_name(timestamp)
+            line = (json_util.dumps(obj) + '\n').encode()
+
+            batches.setdefault(segment, list()).append((obj['_id'], line, timestamp))
+            segments.append(segment)
+
+        for segment, batch in batches.items():
+            with self._segment_lock(segment):
+                data = b''.join(line for _, line, _ in batch)
+                with open(self._data_file(segment), 'ab') as f:
+                    f.write(data)
+                    f.flush()
+                    offset = f.tell() - len(data)
+
+                index_lines = list()
+                for obj_id, line, timestamp in batch:
+                    index_lines.append(_index_line(obj_id, offset, len(line), timestamp))
+                    offset += len(line)
+
+                with open(self._index_file(segment), 'a') as f:
+                    f.write(''.join(index_lines))
+
+        return segments
+
+    def read(self, obj_id):
+        """Read a record.
+
+        Args:
+            obj_id (str): The id of the record.
+
+        Returns:
+            dict|None: The record or None if there is no such record.
+        """
+        for attempt in range(2):
+            with self._lock:
+                if attempt > 0:
+                    self._reset()
+                location = self._ids.get(obj_id)
+                if location is None:
+                    self.refresh()
+                    location = self._ids.get(obj_id)
+                if location is None:
+                    return None
+
+            segment, offset, length = location
+            try:
+                with open(self._data_file(segment), 'rb') as f:
+                    f.seek(offset)
+                    obj = json_util.loads(f.read(length).decode())
+                if obj['_id'] == obj_id:
+                    return obj
+            except (OSError, ValueError, KeyError, TypeError):
+                pass
+
+        return None
+
+    def query(self, start=None, end=None):
+        """Read the records in a range of time.
+
+        Only the segments that overlap the range are read.
+
+        Args:
+            start (float, optional): Earliest unix time of the records.
+            end (float, optional): Records must be before this unix time.
+
+        Yields:
+            dict: The records in order of time.
+        """
+        with self._lock:
+            self.refresh()
+            segments = sorted(self._entries.keys())
+
+        for segment in segments:
+            segment_start = calendar.timegm(time.strptime(segment, '%Y%m%dT%H%M%S'))
+            if end is not None and segment_start >= end:
+                break
+            if start is not None and segment_start + self.segment_duration <= start:
+                continue
+
+            yield from self._query_segment(segment, start, end)
+
+    def refresh(self):
+        """Read the index lines added since the last refresh """
+        with self._lock:
+            for segment in self.segments():
+                self._read_index(segment)
+
+    def compact(self, timestamp=None):
+        """Compact the closed segments.
+
+        Args:
+            timestamp (float, optional): Unix time used to decide which segments
+                are closed, default now.
+
+        Returns:
+            list: The names of the compacted segments.
+        """
+        segments = self.segments_to_compact(timestamp=timestamp)
+        for segment in segments:
+            self._compact_segment(segment)
+
+        return segments
+
+    def import_file(self, fn):
+        """Append the records of a JSON lines file.
+
+        Args:
+            fn (str): Name of the file, e.g. an old style collection file.
+
+        Returns:
+            int: The number of records added.
+        """
+        num_records = 0
+        with open(fn, 'r') as f:
+            for line in f:
+                try:
+                    obj = json_util.loads(line)
+                    obj['_id'] = str(obj['_id'])
+                except (ValueError, KeyError, TypeError):
+                    continue
+                self.append(obj)
+                num_records += 1
+
+        return num_records
+
+    def _compact_segment(self, segment):
+        data_fn = self._data_file(segment)
+        index_fn = self._index_file(segment)
+
+        with self._segment_lock(segment):
+            seen = set()
+            data_lines = list()
+            index_lines = [self.COMPACTED]
+            offset = 0
+
+            with open(data_fn, 'rb') as f:
+                for line in f:
+                    try:
+                        obj = json_util.loads(line.decode())
+                        obj_id = obj['_id']
+                        timestamp = _get_timestamp(obj['date'])
+                    except (ValueError, KeyError, TypeError, AttributeError):
+                        continue
+                    if obj_id in seen:
+                        continue
+                    seen.add(obj_id)
+
+                    if not line.endswith(b'\n'):
+                        line += b'\n'
+
+                    data_lines.append(line)
+                    index_lines.append(_index_line(obj_id, offset, len(line), timestamp))
+                    offset += len(line)
+
+            with open(data_fn + '.tmp', 'wb') as f:
+                f.writelines(data_lines)
+            with open(index_fn + '.tmp', 'w') as f:
+                f.writelines(index_lines)
+
+            os.replace(data_fn + '.tmp', data_fn)
+            os.replace(index_fn + '.tmp', index_fn)
+
+            self._forget_segment(segment)
+
+    def _query_segment(self, segment, start, end):
+        done = set()
+        for attempt in range(2):
+            with self._lock:
+                if attempt > 0:
+                    # Segment changed since the index was read, e.g. compacted.
+                    self._forget_segment(segment)
+                    self._read_index(segment)
+
+                # Entries are in order of writing, which may differ a little
+                # from the order of the dates.
+                entries = sorted(entry for entry in self._entries.get(segment, list())
+                                 if (start is None or entry[0] >= start) and
+                                 (end is None or entry[0] < end))
+
+            try:
+                with open(self._data_file(segment), 'rb') as f:
+                    for timestamp, offset, length, obj_id in entries:
+                        if obj_id in done:
+                            continue
+
+                        f.seek(offset)
+                        obj = json_util.loads(f.read(length).decode())
+                        if obj['_id'] != obj_id:
+                            raise ValueError('Record moved')
+
+                        done.add(obj_id)
+                        yield obj
+                return
+            except (OSError, ValueError, KeyError, TypeError, AttributeError):
+                pass
+
+    def _read_index(self, segment):
+        index_fn = self._index_file(segment)
+        try:
+            stat = os.stat(index_fn)
+        except FileNotFoundError:
+            return
+
+        inode, position = self._positions.get(segment, (None, 0))
+        if inode != stat.st_ino or stat.st_size < position:
+            # The index was rewritten by a compaction.
+            self._forget_segment(segment)
+            position = 0
+
+        if stat.st_size == position:
+            return
+
+        entries = self._entries.setdefault(segment, list())
+        with open(index_fn, 'rb') as f:
+            f.seek(position)
+            for line in f:
+                # Stop at a line that is still being written.
+                if not line.endswith(b'\n'):
+                    break
+                position += len(line)
+                if line.startswith(b'#'):
+                    continue
+
+                obj_id, offset, length, timestamp = line.decode().split('\t')
+                offset = int(offset)
+                length = int(length)
+
+                self._ids[obj_id] = (segment, offset, length)
+                entries.append((float(timestamp), offset, length, obj_id))
+
+        self._positions[segment] = (stat.st_ino, position)
+
+    def _forget_segment(self, segment):
+        self._ids = {obj_id: location for obj_id, location in self._ids.items()
+                     if location[0] != segment}
+        self._entries.pop(segment, None)
+        self._positions.pop(segment, None)
+
+    def _reset(self):
+        self._ids = dict()
+        self._entries = dict()
+        self._positions = dict()
+
+    @contextmanager
+    def _segment_lock(self, segment):
+        """Lock a segment against the other threads and processes writing to it """
+        with self._lock:
+            with open(os.path.join(self.directory, segment + '.lock'), 'a') as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _data_file(self, segment):
+        return os.path.join(self.directory, segment + '.json')
+
+    def _index_file(self, segment):
+        return os.path.join(self.directory, segment + '.idx')
+
+
+def _get_timestamp(date):
+    """Unix time of a record date, which is UTC if it has no time zone """
+    if date.tzinfo is None:
+        date = date.replace(tzinfo=timezone.utc)
+    return date.timestamp()
+
+
+def _select_fields(obj, fields):
+    """Copy of a record with only the given `fields` of its data """
+    if fields is None:
+        return obj
+
+    obj = dict(obj)
+    obj['data'] = {key: value for key, value in obj['data'].items() if key in fields}
+    return obj
+
+
+def _index_line(obj_id, offset, length, timestamp):
+    return '{}\t{}\t{}\t{!r}\n'.format(obj_id, offset, length, timestamp)
 
 
 class PanMemoryDB(AbstractPanDB):
@@ -473,6 +1017,8 @@ class PanMemoryDB(AbstractPanDB):
         super().__init__(**kwargs)
         self.current = {}
         self.collections = {}
+        # Sorted (timestamp, id) of the records of each collection, for `query`.
+        self.date_indexes = {}
         self.lock = threading.Lock()
 
     def _make_id(self):
@@ -482,6 +1028,7 @@ class PanMemoryDB(AbstractPanDB):
         self.validate_collection(collection)
         obj_id = self._make_id()
         obj = create_storage_obj(collection, obj, obj_id=obj_id)
+        timestamp = _get_timestamp(obj['date'])
         try:
             obj = json_util.dumps(obj)
         except Exception as e:
@@ -490,20 +1037,21 @@ class PanMemoryDB(AbstractPanDB):
         with self.lock:
             self.current[collection] = obj
             if store_permanently:
-                self.collections.setdefault(collection, {})[obj_id] = obj
+                self._store(collection, obj_id, obj, timestamp)
         return obj_id
 
     def insert(self, collection, obj):
         self.validate_collection(collection)
         obj_id = self._make_id()
         obj = create_storage_obj(collection, obj, obj_id=obj_id)
+        timestamp = _get_timestamp(obj['date'])
         try:
             obj = json_util.dumps(obj)
         except Exception as e:
             self._warn("Problem inserting object into collection: {}, {!r}".format(e, obj))
             return None
         with self.lock:
-            self.collections.setdefault(collection, {})[obj_id] = obj
+            self._store(collection, obj_id, obj, timestamp)
         return obj_id
 
     def get_current(self, collection):
@@ -520,6 +1068,39 @@ class PanMemoryDB(AbstractPanDB):
             obj = json_util.loads(obj)
         return obj
 
+    def query(self, collection, start=None, end=None, fields=None):
+        self.validate_collection(collection)
+        with self.lock:
+            date_index = self.date_indexes.get(collection, list())
+            first = 0
+            last = len(date_index)
+            if start is not None:
+                first = bisect.bisect_left(date_index, (_get_timestamp(start), ''))
+            if end is not None:
+                last = bisect.bisect_left(date_index, (_get_timestamp(end), ''))
+
+            records = self.collections.get(collection, {})
+            objs = [records[obj_id] for _, obj_id in date_index[first:last]]
+
+        for obj in objs:
+            yield _select_fields(json_util.loads(obj), fields)
+
+    def _insert_many(self, collection, objs):
+        records = [(obj['_id'], json_util.dumps(obj), _get_timestamp(obj['date']))
+                   for obj in objs]
+        with self.lock:
+            for obj_id, obj, timestamp in records:
+                self._store(collection, obj_id, obj, timestamp)
+
+    def _write_current(self, collection, obj):
+        obj = json_util.dumps(obj)
+        with self.lock:
+            self.current[collection] = obj
+
+    def _store(self, collection, obj_id, obj, timestamp):
+        self.collections.setdefault(collection, {})[obj_id] = obj
+        bisect.insort(self.date_indexes.setdefault(collection, list()), (timestamp, obj_id))
+
     def clear_current(self, entry_type):
         try:
             del self.current[entry_type]
@@ -533,3 +1114,214 @@ class PanMemoryDB(AbstractPanDB):
         # the db or one of its referrers, or perhaps a pytest fixture
         # hasn't been removed.
         PanMemoryDB.active_dbs = weakref.WeakValueDictionary()
+
+
+class BufferedPanDB(AbstractPanDB):
+    """Write-behind buffer in front of another db.
+
+    Inserts update the `current` record in memory and queue the permanent records,
+    so they return without waiting for the disk or database. A background thread
+    writes the queued records with one batch per collection (and only the latest
+    `current` record of each type) when `max_records` are queued or every
+    `flush_interval` seconds. Other processes therefore see new records up to
+    `flush_interval` seconds late.
+
+    The buffer is flushed when the process exits. Call `flush` (or `close`) to
+    make sure everything is written, e.g. before shutting down.
+
+    Records that can't be written when they are flushed are dropped with a warning.
+    """
+
+    # Buffers shared by all users of the same db, by (db_type, db_name).
+    shared_dbs = dict()
+
+    @classmethod
+    def get_or_create(cls, db, db_type=None, **kwargs):
+        """Returns the shared buffer for the db, creating if needed.
+
+        Args:
+            db (`AbstractPanDB`): The db to buffer.
+            db_type (str, optional): The type of the db.
+            **kwargs: Options for a new `BufferedPanDB`.
+        """
+        key = (db_type, db.db_name)
+        buffered = cls.shared_dbs.get(key)
+        # A memory db is its own storage, so a new one needs a new buffer.
+        if buffered is None or (db_type == 'memory' and buffered.db is not db):
+            buffered = BufferedPanDB(db, **kwargs)
+            cls.shared_dbs[key] = buffered
+        return buffered
+
+    def __init__(self, db, max_records=100, flush_interval=5., **kwargs):
+        """Buffer the writes to `db`.
+
+        Args:
+            db (`AbstractPanDB`): The db to write to.
+            max_records (int, optional): Write when this many records are queued,
+                default 100.
+            flush_interval (float, optional): Maximum seconds that records are
+                queued, default 5.
+        """
+        super().__init__(db_name=db.db_name, collection_names=db.collection_names,
+                         logger=db.logger, **kwargs)
+        self.db = db
+        self.max_records = max_records
+        self.flush_interval = flush_interval
+
+        self._current = dict()
+        self._records = list()
+        self._pending_ids = dict()
+
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._stopping = False
+
+        atexit.register(self.close)
+
+    @property
+    def pending(self):
+        """Number of permanent records waiting to be written """
+        return len(self._records)
+
+    def insert_current(self, collection, obj, store_permanently=True):
+        self.validate_collection(collection)
+        storage_obj = self._make_storage_obj(collection, obj)
+        if storage_obj is None:
+            self._warn("Problem inserting object into current collection: {!r}".format(obj))
+            return None
+
+        with self._condition:
+            self._current[collection] = storage_obj
+            if store_permanently:
+                self._queue(collection, storage_obj)
+
+        self._start()
+        return str(storage_obj['_id'])
+
+    def insert(self, collection, obj):
+        self.validate_collection(collection)
+        storage_obj = self._make_storage_obj(collection, obj)
+        if storage_obj is None:
+            self._warn("Problem inserting object into collection: {!r}".format(obj))
+            return None
+
+        with self._condition:
+            self._queue(collection, storage_obj)
+
+        self._start()
+        return str(storage_obj['_id'])
+
+    def get_current(self, collection):
+        with self._condition:
+            obj = self._current.get(collection)
+        if obj is not None:
+            return copy.deepcopy(obj)
+        return self.db.get_current(collection)
+
+    def find(self, collection, obj_id):
+        with self._condition:
+            obj = self._pending_ids.get(str(obj_id))
+        if obj is not None:
+            return copy.deepcopy(obj)
+        return self.db.find(collection, obj_id)
+
+    def query(self, collection, start=None, end=None, fields=None):
+        self.flush()
+        return self.db.query(collection, start=start, end=end, fields=fields)
+
+    def clear_current(self, type):
+        with self._flush_lock:
+            with self._condition:
+                self._current.pop(type, None)
+            self.db.clear_current(type)
+
+    def flush(self):
+        """Write the buffered records """
+        with self._flush_lock:
+            with self._condition:
+                current = dict(self._current)
+                records = self._records
+                self._records = list()
+
+            for collection, obj in current.items():
+                try:
+                    self.db._write_current(collection, obj)
+                except Exception as e:
+                    self._warn("Problem inserting object into current collection: {}, {!r}".format(
+                        e, obj))
+
+            batches = dict()
+            for collection, obj in records:
+                batches.setdefault(collection, list()).append(obj)
+
+            for collection, objs in batches.items():
+                try:
+                    self.db._insert_many(collection, objs)
+                except Exception as e:
+                    self._warn("Problem inserting {} objects into collection {}: {}".format(
+                        len(objs), collection, e))
+
+            with self._condition:
+                for _, obj in records:
+                    self._pending_ids.pop(str(obj['_id']), None)
+                # Read the current records from the db from now on, unless replaced.
+                for collection, obj in current.items():
+                    if self._current.get(collection) is obj:
+                        del self._current[collection]
+
+    def close(self):
+        """Stop the background thread and write the buffered records """
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+        self.flush()
+
+    def _make_storage_obj(self, collection, obj):
+        obj = create_storage_obj(collection, obj, obj_id=self.db._make_id())
+        try:
+            # Fail now rather than when the record is written.
+            json_util.dumps(obj)
+        except Exception:
+            return None
+        # Store the values as they are now, not as the caller may change them before the flush.
+        return copy.deepcopy(obj)
+
+    def _queue(self, collection, obj):
+        self._records.append((collection, obj))
+        self._pending_ids[str(obj['_id'])] = obj
+        if len(self._records) >= self.max_records:
+            self._condition.notify_all()
+
+    def _start(self):
+        with self._condition:
+            stopped = self._stopping
+            if self._thread is None and not stopped:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.name = 'DBWriteThread'
+                self._thread.start()
+
+        # Write straight away once closed.
+        if stopped:
+            self.flush()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: self._stopping or len(self._records) >= self.max_records,
+                    timeout=self.flush_interval)
+                stopping = self._stopping
+
+            try:
+                self.flush()
+            except Exception as e:  # pragma: no cover
+                self._warn("Problem writing buffered records: {!r}".format(e))
+
+            if stopping:
+                break
@@ -1,11 +1,19 @@
+import base64
+import hashlib
+import json
 import os
+import random
 import re
+import threading
 import time
-import subprocess
-import shutil
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import fnmatch
 from warnings import warn
 from glob import glob
 
+import requests
+
 # Supporting a change in Google Cloud libraries by trying imports both ways:
 try:  # pragma: no cover
     # New way:
@@ -66,6 +74,9 @@ class PanStorage(object):
                 "or that you have executed 'gcloud auth'"
             )
 
+        # Resumable upload session URLs carry their own authorization.
+        self._http = requests.Session()
+
         self.logger.info("Connected to storage bucket {}", self.bucket_name)
 
     def upload_file(self, local_path, remote_path=None):
@@ -106,6 +117,114 @@ class PanStorage(object):
 
         return remote_path
 
+    def create_upload_session(self, remote_path, size, content_type=None):
+        """Start a resumable upload to the bucket.
+
+        The chunks of the file are then sent with `upload_chunk`. The session
+        stays valid for a week, so the URL can be saved to carry on with the
+        upload later, e.g. after a restart.
+
+        Args:
+            remote_path (str): Destination path in bucket.
+            size (int): Size of the file in bytes.
+            content_type (str, optional): Content type of the file.
+
+        Returns:
+            str: URL of the upload session.
+        """
+        blob = self.bucket.blob(remote_path)
+        return blob.create_resumable_upload_session(content_type=content_type, size=size)
+
+    def upload_chunk(self, session_url, data, offset, size, timeout=300):
+        """Send a chunk of a file for a resumable upload.
+
+        Note:
+            All but the last chunk must be a multiple of 256 KiB.
+
+        Args:
+            session_url (str): URL from `create_upload_session`.
+            data (bytes): The chunk.
+            offset (int): Position of the chunk in the file.
+            size (int): Size of the file in bytes.
+            timeout (float, optional): Seconds to wait for the bucket, default 300.
+
+        Returns:
+            tuple: The number of bytes stored so far and, once the upload is
+                complete, the base64 encoded MD5 of the object, otherwise None.
+        """
+        if data:
+            content_range = 'bytes {}-{}/{}'.format(offset, offset + len(data) - 1, size)
+        else:
+            content_range = 'bytes */{}'.format(size)
+
+        response = self._http.put(session_url,
+                                  data=data,
+                                  headers={'Content-Range': content_range},
+                                  timeout=timeout)
+
+        status = self._upload_status(response, size)
+        if status is None:
+            raise error.GoogleCloudError("Upload session expired: {}".format(session_url))
+        return status
+
+    def query_upload(self, session_url, size, timeout=60):
+        """Get the progress of a resumable upload.
+
+        Args:
+            session_url (str): URL from `create_upload_session`.
+            size (int): Size of the file in bytes.
+            timeout (float, optional): Seconds to wait for the bucket, default 60.
+
+        Returns:
+            tuple|None: As `upload_chunk`, or None if the session has expired
+                and the upload has to start again.
+        """
+        response = self._http.put(session_url,
+                                  headers={'Content-Range': 'bytes */{}'.format(size)},
+                                  timeout=timeout)
+        return self._upload_status(response, size)
+
+    def upload_files(self, files, manifest_file, **kwargs):
+        """Upload files to the bucket in parallel, see `UploadManager`.
+
+        Note:
+            As for `upload_file`, the name of the current unit will be
+            prepended to the remote paths.
+
+        Args:
+            files (dict): Remote paths in the bucket, keyed by the local path
+                of each file. The local path is used if the remote one is None.
+            manifest_file (str): JSON file recording the uploads.
+            **kwargs: Keyword args to be passed to `UploadManager`.
+
+        Returns:
+            dict: Remote path of each uploaded file, None if it failed.
+        """
+        uploads = OrderedDict()
+        for local_path, remote_path in files.items():
+            if remote_path is None:
+                remote_path = local_path
+            if not remote_path.startswith(self.unit_id):
+                remote_path = os.path.join(self.unit_id, remote_path)
+            uploads[local_path] = remote_path
+
+        return UploadManager(self, manifest_file, **kwargs).upload(uploads)
+
+    def _upload_status(self, response, size):
+        if response.status_code == 308:
+            # Range is missing if nothing has been stored yet.
+            stored = response.headers.get('Range')
+            if stored is None:
+                return 0, None
+            return int(stored.split('-')[-1]) + 1, None
+        elif response.status_code in (200, 201):
+            return size, response.json().get('md5Hash')
+        elif response.status_code in (404, 410):
+            return None
+
+        raise error.GoogleCloudError("Problem with upload ({}): {}".format(
+            response.status_code, response.text))
+
     def get_file_blob(self, blob_name):
         """Returns an individual blob (meta info about file).
 
@@ -286,10 +405,248 @@ class PanStorage(object):
         return headers
 
 
+class UploadManager(object):
+    """ Upload files in parallel, resuming where a previous upload stopped """
+
+    # States of an upload in the manifest.
+    UPLOADING = 'uploading'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    def __init__(self,
+                 storage,
+                 manifest_file,
+                 max_workers=4,
+                 chunk_size=8 * 1024 * 1024,
+                 max_rate=None,
+                 max_attempts=5,
+                 backoff=1.,
+                 max_backoff=60.):
+        """Upload files to a storage bucket.
+
+        Each file is sent in chunks with a resumable upload and checked
+        against its MD5 once complete. Progress is saved to `manifest_file`
+        after every chunk, so an upload that is interrupted, e.g. by a flaky
+        connection or a restart, carries on from the last chunk that was
+        stored, and files that are already uploaded are skipped.
+
+        A failed chunk is retried after a delay that doubles each time, until
+        the file has failed `max_attempts` times in a row.
+
+        Args:
+            storage (PanStorage): Bucket to upload to, or any object with the
+                `create_upload_session`, `upload_chunk` and `query_upload` methods.
+            manifest_file (str): JSON file recording the uploads.
+            max_workers (int, optional): Number of files uploaded at the same
+                time, default 4.
+            chunk_size (int, optional): Size of each chunk in bytes, must be a
+                multiple of 256 KiB, default 8 MiB.
+            max_rate (float, optional): Limit for the total upload rate in bytes
+                per second, default no limit.
+            max_attempts (int, optional): Number of attempts for each file, default 5.
+            backoff (float, optional): Seconds to wait before the first retry, default 1.
+            max_backoff (float, optional): Longest wait between retries, default 60.
+        """
+        assert chunk_size > 0 and chunk_size % (256 * 1024) == 0, \
+            "chunk_size must be a multiple of 256 KiB"
+
+        self.logger = get_root_logger()
+
+        self.storage = storage
+        self.manifest_file = manifest_file
+        self.max_workers = max_workers
+        self.chunk_size = chunk_size
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        self._rate_limiter = None
+        if max_rate:
+            self._rate_limiter = _RateLimiter(max_rate)
+
+        self._lock = threading.Lock()
+        self._manifest = dict()
+        self._load()
+
+    def upload(self, files):
+        """Upload the files and wait for them to finish.
+
+        Args:
+            files (dict): Remote paths in the bucket, keyed by the local path
+                of each file.
+
+        Returns:
+            dict: Remote path of each uploaded file, None if it failed.
+        """
+        results = OrderedDict()
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = [(local_path, executor.submit(self._upload_file, local_path, remote_path))
+                       for local_path, remote_path in files.items()]
+            for local_path, future in futures:
+                results[local_path] = future.result()
+
+        failed = [local_path for local_path, remote_path in results.items() if remote_path is None]
+        self.logger.debug("Uploaded {} files, {} failed", len(results) - len(failed), len(failed))
+
+        return results
+
+    def _upload_file(self, local_path, remote_path):
+        entry = self._get_entry(local_path, remote_path)
+        if entry['state'] == self.DONE:
+            self.logger.debug("Already uploaded: {}", local_path)
+            return remote_path
+
+        entry['state'] = self.UPLOADING
+        attempts = 0
+        while True:
+            offset = entry['offset']
+            try:
+                self._transfer(local_path, entry)
+                return remote_path
+            except Exception as err:
+                # Only count the failures in a row, a slow link may still be getting there.
+                if entry['offset'] > offset:
+                    attempts = 0
+                attempts += 1
+                if attempts >= self.max_attempts:
+                    self.logger.warning("Problem uploading file {}: {}", local_path, err)
+                    with self._lock:
+                        entry['state'] = self.FAILED
+                        self._save()
+                    return None
+
+                # Exponential backoff, with jitter so the workers don't retry together.
+                delay = min(self.max_backoff, self.backoff * 2 ** (attempts - 1))
+                delay *= random.uniform(0.5, 1)
+                self.logger.debug("Retrying upload of {} in {:.1f}s: {}", local_path, delay, err)
+                time.sleep(delay)
+
+    def _transfer(self, local_path, entry):
+        size = entry['size']
+        offset = 0
+        md5_hash = None
+
+        if entry['session_url'] is not None:
+            status = self.storage.query_upload(entry['session_url'], size)
+            if status is None:
+                self.logger.debug("Upload session expired, starting again: {}", local_path)
+                entry['session_url'] = None
+            else:
+                offset, md5_hash = status
+
+        if entry['session_url'] is None:
+            session_url = self.storage.create_upload_session(entry['remote_path'], size)
+            with self._lock:
+                entry['session_url'] = session_url
+                entry['offset'] = 0
+                self._save()
+
+        with open(local_path, 'rb') as f:
+            f.seek(offset)
+            while md5_hash is None:
+                data = f.read(self.chunk_size)
+                if self._rate_limiter is not None:
+                    self._rate_limiter.wait(len(data))
+
+                offset, md5_hash = self.storage.upload_chunk(entry['session_url'],
+                                                             data,
+                                                             offset,
+                                                             size)
+                # The bucket may have stored less than was sent.
+                f.seek(offset)
+
+                with self._lock:
+                    entry['offset'] = offset
+                    self._save()
+
+        with self._lock:
+            entry['session_url'] = None
+            if md5_hash != entry['md5']:
+                entry['offset'] = 0
+                self._save()
+                raise error.GoogleCloudError("Checksum mismatch for {}".format(local_path))
+
+            entry['state'] = self.DONE
+            self._save()
+
+        self.logger.debug("Uploaded {} to {}", local_path, entry['remote_path'])
+
+    def _get_entry(self, local_path, remote_path):
+        stat = os.stat(local_path)
+
+        with self._lock:
+            entry = self._manifest.get(local_path)
+
+        # The file hasn't changed since it was added to the manifest.
+        if (entry is not None and
+                entry['remote_path'] == remote_path and
+                entry['size'] == stat.st_size and
+                entry['mtime'] == stat.st_mtime):
+            return entry
+
+        entry = {
+            'remote_path': remote_path,
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+            'md5': _md5_hash(local_path),
+            'state': self.UPLOADING,
+            'session_url': None,
+            'offset': 0,
+        }
+        with self._lock:
+            self._manifest[local_path] = entry
+            self._save()
+
+        return entry
+
+    def _load(self):
+        try:
+            with open(self.manifest_file, 'r') as f:
+                self._manifest = json.load(f)
+        except FileNotFoundError:
+            pass
+        except ValueError as err:
+            self.logger.warning("Ignoring invalid upload manifest {}: {}", self.manifest_file, err)
+
+    def _save(self):
+        """Write the manifest, must be called with the lock held """
+        tmp_file = self.manifest_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(self._manifest, f, indent=2)
+        os.replace(tmp_file, self.manifest_file)
+
+
+class _RateLimiter(object):
+    """ Spaces out chunks shared between threads to keep to a rate in bytes per second """
+
+    def __init__(self, rate):
+        self.rate = rate
+        self._next_time = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self, num_bytes):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_time)
+            self._next_time = start + num_bytes / self.rate
+        time.sleep(start - now)
+
+
+def _md5_hash(filename):
+    """ Base64 encoded MD5 of a file, as given for objects in the bucket """
+    md5 = hashlib.md5()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            md5.update(block)
+    return base64.b64encode(md5.digest()).decode()
+
+
 def upload_observation_to_bucket(pan_id,
                                  dir_name,
                                  include_files='*.fz',
                                  bucket='panoptes-survey',
+                                 exclude_files=None,
+                                 storage=None,
                                  **kwargs):
     """Upload an observation directory to google cloud storage.
 
@@ -297,11 +654,9 @@ def upload_observation_to_bucket(pan_id,
     bucket. This assumes that observations are placed within `/images/fields`
     and follow the normal naming convention for observations.
 
-    Note:
-        This requires that the command line utility `gsutil` be installed
-        and that authentication has properly been set up.
-
-    TODO(wtgee): This could be merged into the PanStorage class.
+    The files are uploaded in parallel by an `UploadManager`, which records
+    them in `upload_manifest.json` in the directory. Running this again after
+    a failure only uploads the files, or the parts of them, that are missing.
 
     Args:
         pan_id (str): A string representing the unit id, e.g. PAN001.
@@ -310,10 +665,17 @@ def upload_observation_to_bucket(pan_id,
             compressed FITS files '.fz'.
         bucket (str, optional): The bucket to place the files in, defaults
             to 'panoptes-survey'.
-        **kwargs: Optional keywords: verbose
+        exclude_files (str, optional): Filename filter for files to skip.
+        storage (PanStorage, optional): Storage to upload to, default a
+            `PanStorage` for `bucket`.
+        **kwargs: Optional keywords: verbose, and the options of `UploadManager`,
+            e.g. max_workers, max_rate.
 
     Returns:
         str: A string path used to search for files.
+
+    Raises:
+        error.GoogleCloudError: If any of the files could not be uploaded.
     """
     if os.path.exists(dir_name) is False:
         raise OSError("Directory does not exist, cannot upload: {}".format(dir_name))
@@ -321,11 +683,7 @@ def upload_observation_to_bucket(pan_id,
     if re.match(r'PAN\d\d\d$', pan_id) is None:
         raise Exception("Invalid PANID. Must be of the form 'PANnnn'. Got: {!r}".format(pan_id))
 
-    gsutil = shutil.which('gsutil')
-    if gsutil is None:  # pragma: no cover
-        raise Exception('Cannot find gsutil, skipping upload')
-
-    verbose = kwargs.get('verbose', False)
+    verbose = kwargs.pop('verbose', False)
 
     def _print(msg):
         if verbose:
@@ -333,36 +691,32 @@ def upload_observation_to_bucket(pan_id,
 
     _print("Uploading {}".format(dir_name))
 
+    manifest_file = os.path.join(dir_name, 'upload_manifest.json')
+
     file_search_path = os.path.join(dir_name, include_files)
-    if glob(file_search_path):
+    local_paths = [fn for fn in sorted(glob(file_search_path))
+                   if os.path.isfile(fn) and
+                   not fn.startswith(manifest_file) and
+                   (exclude_files is None or not fnmatch(os.path.basename(fn), exclude_files))]
+
+    if local_paths:
         # Get just the observation path
         field_dir = dir_name.split('/fields/')[-1]
-        remote_path = os.path.normpath(os.path.join(
-            bucket,
-            pan_id,
-            field_dir
-        ))
-        destination = 'gs://{}/'.format(remote_path)
+        remote_dir = os.path.normpath(os.path.join(pan_id, field_dir))
 
-        script_name = os.path.join(os.environ['POCS'], 'scripts', 'upload_files.sh')
-        manifest_file = os.path.join(dir_name, 'upload_manifest.log')
-        run_cmd = [script_name, file_search_path, destination, manifest_file]
+        if storage is None:
+            storage = PanStorage(bucket)
 
-        if pan_id == 'PAN000':
-            run_cmd = [gsutil, 'PAN000 upload should fail']
+        files = OrderedDict((fn, os.path.join(remote_dir, os.path.basename(fn)))
+                            for fn in local_paths)
 
-        _print("Running: {}".format(run_cmd))
+        _print("Uploading {} files to {}/{}".format(len(files), bucket, remote_dir))
 
-        try:
-            completed_process = subprocess.run(
-                run_cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE
-            )
+        results = UploadManager(storage, manifest_file, **kwargs).upload(files)
 
-            if completed_process.returncode != 0:
-                raise Exception(completed_process.stderr)
-        except Exception as e:
-            raise error.GoogleCloudError("Problem with upload: {}".format(e))
+        failed = [fn for fn, remote_path in results.items() if remote_path is None]
+        if failed:
+            raise error.GoogleCloudError("Problem with upload of {} files: {}".format(
+                len(failed), failed))
 
     return file_search_path
@@ -1,5 +1,4 @@
 import numpy as np
-from scipy import interpolate
 
 
 class Horizon(object):
@@ -11,9 +10,14 @@ class Horizon(object):
     range.
 
     The list are points that are obstruction points beyond the default horizon.
+
+    The obstructions are sampled onto a regular azimuth grid (`horizon_line`)
+    when the `Horizon` is created, so that `min_altitude` only has to do a
+    cheap (vectorized) interpolation. The grid can be saved to and loaded from
+    a binary file with `save` and `load`.
     """
 
-    def __init__(self, obstructions=list(), default_horizon=30):
+    def __init__(self, obstructions=list(), default_horizon=30, resolution=1.):
         """Create a list of horizon obstruction points.
 
         Example:
@@ -35,10 +39,14 @@ class Horizon(object):
                 `default_horizon` defines a flat horizon.
             default_horizon (float, optional): A default horizon to be used whenever
                 there is no obstruction.
+            resolution (float, optional): Spacing in degrees of azimuth of the
+                precomputed `horizon_line`, default 1°.
 
         """
         super().__init__()
 
+        assert 0. < resolution <= 90., "Resolution must be between 0-90 degrees"
+
         obstruction_list = list()
         for obstruction in obstructions:
             assert isinstance(obstruction, list), "Obstructions must be lists"
@@ -66,10 +74,96 @@ class Horizon(object):
                 obstruction_line.append((alt, az))
             obstruction_list.append(sorted(obstruction_line, key=lambda point: point[1]))
 
-        self.obstructions = sorted(obstruction_list, key=lambda point: point[1])
+        self._set_obstructions(sorted(obstruction_list, key=lambda point: point[1]))
 
         self.default_horizon = default_horizon
-        self.horizon_line = np.ones(360) * self.default_horizon
+        self.resolution = float(resolution)
+
+        self.azimuth_grid = np.arange(0., 360., self.resolution)
+        self.horizon_line = np.ones(len(self.azimuth_grid)) * self.default_horizon
+
+        for obs_az, obs_alt in zip(self.az, self.alt):
+            in_obstruction = (self.azimuth_grid >= obs_az[0]) & (self.azimuth_grid <= obs_az[-1])
+
+            # Assign over index elements
+            self.horizon_line[in_obstruction] = np.interp(
+                self.azimuth_grid[in_obstruction], obs_az, obs_alt)
+
+    def min_altitude(self, az):
+        """Get the minimum altitude at the given azimuth(s).
+
+        The value is linearly interpolated between the points of `horizon_line`,
+        wrapping around at 360°.
+
+        Args:
+            az (float or numpy.array): Azimuth(s) in degrees.
+
+        Returns:
+            float or numpy.array: The minimum altitude(s) in degrees.
+        """
+        az = np.mod(az, 360.)
+
+        grid = np.append(self.azimuth_grid, 360.)
+        line = np.append(self.horizon_line, self.horizon_line[0])
+
+        return np.interp(az, grid, line)
+
+    def save(self, filename):
+        """Save the horizon to a binary file.
+
+        The file is a NumPy `.npz` archive that holds the precomputed
+        `horizon_line` along with the obstruction points, so `load` does not
+        need to check or sample the obstructions again.
+
+        Args:
+            filename (str): Path of the file to write. The `.npz` extension is
+                added by NumPy if not present.
+        """
+        points = [point for obstruction in self.obstructions for point in obstruction]
+
+        np.savez(
+            filename,
+            horizon_line=self.horizon_line,
+            resolution=self.resolution,
+            default_horizon=self.default_horizon,
+            points=np.array(points, dtype=float).reshape(-1, 2),
+            lengths=np.array([len(obstruction) for obstruction in self.obstructions],
+                             dtype=int),
+        )
+
+    @classmethod
+    def load(cls, filename):
+        """Load a horizon written by `save`.
+
+        Args:
+            filename (str): Path of the `.npz` file.
+
+        Returns:
+            `Horizon`: The horizon stored in the file.
+        """
+        with np.load(filename) as data:
+            horizon = cls.__new__(cls)
+
+            horizon.horizon_line = data['horizon_line']
+            horizon.resolution = float(data['resolution'])
+            horizon.default_horizon = data['default_horizon'].item()
+            horizon.azimuth_grid = np.arange(0., 360., horizon.resolution)
+
+            assert len(horizon.azimuth_grid) == len(horizon.horizon_line), \
+                "Horizon line does not match resolution"
+
+            obstructions = list()
+            start = 0
+            for length in data['lengths']:
+                obstructions.append([tuple(point) for point in
+                                     data['points'][start:start + length].tolist()])
+                start += length
+            horizon._set_obstructions(obstructions)
+
+        return horizon
+
+    def _set_obstructions(self, obstructions):
+        self.obstructions = obstructions
 
         # Make helper lists of the alt and az
         self.alt = list()
@@ -77,13 +171,3 @@ class Horizon(object):
         for obstruction in self.obstructions:
             self.alt.append([point[0] for point in obstruction])
             self.az.append([point[1] for point in obstruction])
-
-        for obs_az, obs_alt in zip(self.az, self.alt):
-            f = interpolate.interp1d(obs_az, obs_alt)
-
-            x_range = np.arange(obs_az[0], obs_az[-1] + 1)
-            new_y = f(x_range)
-
-            # Assign over index elements
-            for i, j in enumerate(x_range):
-                self.horizon_line[int(j)] = new_y[i]
@@ -2,9 +2,12 @@ import os
 import subprocess
 import shutil
 from contextlib import suppress
+from functools import lru_cache
 
 from warnings import warn
 
+import numpy as np
+
 from matplotlib import cm as colormap
 from matplotlib.backends.backend_agg import FigureCanvasAgg as FigureCanvas
 from matplotlib.figure import Figure
@@ -22,6 +25,12 @@ from pocs.utils import error
 from pocs.utils.images import fits as fits_utils
 from pocs.utils.images import focus as focus_utils
 
+try:
+    from PIL import Image as PILImage
+    from PIL import ImageDraw
+except ImportError:  # pragma: no cover
+    PILImage = None
+
 palette = copy(colormap.inferno)
 palette.set_over('w', 1.0)
 palette.set_under('k', 1.0)
@@ -79,11 +88,101 @@ def crop_data(data, box_width=200, center=None, verbose=False):
     return center
 
 
-def make_pretty_image(fname, title=None, timeout=15, link_latest=False, **kwargs):
+def measure_shift(reference, data, box_width=None, bin_size=1, min_snr=10.):
+    """ Measure the pixel shift of an image relative to a reference image
+
+    Uses FFT phase correlation: the normalised cross-power spectrum of the two
+    images transforms back to a sharp peak at the shift between them, which is
+    then refined to subpixel precision with a parabola through the peak.
+
+    The data is optionally cropped (see `crop_data`) and binned in square blocks
+    of `bin_size` pixels first. A `bin_size` of 2 removes the Bayer pattern of
+    colour sensors, which would otherwise correlate at a shift of zero.
+
+    Args:
+        reference (np.array): The reference image.
+        data (np.array): The image to measure, same shape as `reference`.
+        box_width (int, optional): Size of the box around the center to use,
+            defaults to the whole image.
+        bin_size (int, optional): Bin the data by this factor first, default 1.
+        min_snr (float, optional): Minimum height of the correlation peak in
+            standard deviations of the correlation surface, default 10.
+
+    Returns:
+        np.array: The (y, x) shift in pixels, i.e. a star at (y, x) in the
+            reference image is at (y + dy, x + dx) in `data`.
+
+    Raises:
+        error.PanError: If the images don't correlate, e.g. different fields
+            or clouds.
+    """
+    assert reference.shape == data.shape, "Images must be the same shape ({} != {})".format(
+        reference.shape, data.shape)
+
+    if box_width is not None:
+        reference = crop_data(reference, box_width=box_width)
+        data = crop_data(data, box_width=box_width)
+
+    images = list()
+    for d in (reference, data):
+        d = np.asarray(d, dtype=np.float64)
+
+        if bin_size > 1:
+            ny = d.shape[0] // bin_size
+            nx = d.shape[1] // bin_size
+            d = d[:ny * bin_size, :nx * bin_size]
+            d = d.reshape(ny, bin_size, nx, bin_size).sum(axis=(1, 3))
+
+        # Remove the background and taper the edges so they don't correlate.
+        d = d - np.median(d)
+        d *= np.outer(np.hanning(d.shape[0]), np.hanning(d.shape[1]))
+        images.append(d)
+
+    cross_power = np.fft.fft2(images[1]) * np.conj(np.fft.fft2(images[0]))
+    cross_power /= np.abs(cross_power) + np.finfo(np.float64).eps
+    correlation = np.fft.ifft2(cross_power).real
+
+    peak = np.unravel_index(np.argmax(correlation), correlation.shape)
+    snr = correlation[peak] / np.std(correlation)
+    if snr < min_snr:
+        raise error.PanError("No correlation between images (peak {:.1f} sigma)".format(snr))
+
+    shift = np.zeros(2)
+    for axis, size in enumerate(correlation.shape):
+        before = list(peak)
+        after = list(peak)
+        before[axis] = (peak[axis] - 1) % size
+        after[axis] = (peak[axis] + 1) % size
+
+        y0 = correlation[tuple(before)]
+        y1 = correlation[peak]
+        y2 = correlation[tuple(after)]
+
+        offset = 0.
+        denominator = y0 - 2 * y1 + y2
+        if denominator != 0:
+            offset = 0.5 * (y0 - y2) / denominator
+
+        # Peaks past half way are negative shifts.
+        position = peak[axis]
+        if position > size // 2:
+            position -= size
+
+        shift[axis] = position + offset
+
+    return shift * bin_size
+
+
+def make_pretty_image(fname, title=None, timeout=15, link_latest=False, full_plot=False,
+                      **kwargs):
     """Make a pretty image.
 
     This will create a jpg file from either a CR2 (Canon) or FITS file.
 
+    For a FITS file the image is either a quick preview (see `make_preview`),
+    or with `full_plot` a matplotlib plot with a colour bar and WCS grid,
+    which takes a few seconds for a full frame.
+
     Notes:
         See `$POCS/scripts/cr2_to_jpg.sh` for CR2 process.
 
@@ -93,7 +192,10 @@ def make_pretty_image(fname, title=None, timeout=15, link_latest=False, **kwargs
         timeout (int, optional): Timeout for conversion, default 15 seconds.
         link_latest (bool, optional): If the pretty picture should be linked to
             `$PANDIR/images/latest.jpg`, default False.
-        **kwargs {dict} -- Additional arguments to be passed to external script.
+        full_plot (bool, optional): Plot a FITS file with matplotlib instead of
+            making a preview, default False.
+        **kwargs {dict} -- Additional arguments to be passed to external script,
+            `make_preview` or the plot.
 
     Returns:
         str -- Filename of image that was created.
@@ -103,8 +205,10 @@ def make_pretty_image(fname, title=None, timeout=15, link_latest=False, **kwargs
         return None
     elif fname.endswith('.cr2'):
         pretty_path = _make_pretty_from_cr2(fname, title=title, timeout=timeout, **kwargs)
-    elif fname.endswith('.fits'):
+    elif fname.endswith('.fits') and (full_plot or PILImage is None):
         pretty_path = _make_pretty_from_fits(fname, title=title, **kwargs)
+    elif fname.endswith('.fits'):
+        pretty_path = _make_preview_from_fits(fname, title=title, **kwargs)
     else:
         warn("File must be a Canon CR2 or FITS file.")
         return None
@@ -128,6 +232,173 @@ def make_pretty_image(fname, title=None, timeout=15, link_latest=False, **kwargs
     return pretty_path
 
 
+def make_preview(data, filename, title=None, max_size=1024, clip_percent=99.9, quality=85,
+                 **kwargs):
+    """Write a quick JPEG preview of image data.
+
+    The data is binned down to at most `max_size` pixels on a side (which also
+    removes the Bayer pattern of colour sensors), stretched with a log stretch
+    between the percentiles given by `clip_percent` and coloured with the same
+    palette as the full plot. Integer data is stretched through a lookup table
+    that is cached for the stretch limits, so the same limits (e.g. a sequence
+    of frames of a field) don't recompute it.
+
+    Colour data, e.g. RGB24 frames, has a trailing axis of 3 (or 4, with alpha)
+    channels. Each channel is stretched with the same limits and the colours
+    are kept, rather than using the palette.
+
+    Arguments:
+        data (numpy.ndarray): 2D image data, e.g. straight from the camera readout,
+            or 3D colour data with the channels on the last axis.
+        filename (str): Name of the JPEG file to write.
+        title (str, optional): Text drawn at the top of the image, default None.
+        max_size (int, optional): Maximum width and height of the preview, default 1024.
+        clip_percent (float, optional): Percentage of the pixel values between the
+            limits of the stretch, default 99.9.
+        quality (int, optional): JPEG quality, default 85.
+
+    Returns:
+        str: The `filename`.
+    """
+    if PILImage is None:  # pragma: no cover
+        raise error.PanError("Pillow is needed to make previews")
+
+    data = np.asarray(data)
+    colour = data.ndim == 3 and data.shape[-1] in (3, 4)
+    if data.ndim != 2 and not colour:
+        raise ValueError("Need 2D image data or colour data with 3 or 4 channels, "
+                         "got shape {}".format(data.shape))
+    if colour:
+        data = data[..., :3]
+
+    bin_size = int(np.ceil(max(data.shape[:2]) / max_size))
+    if bin_size > 1:
+        data = bin_data(data, bin_size)
+
+    # Percentiles of a sample are close enough for the stretch.
+    sample = data[::4, ::4] if data.size > 2**18 else data
+    percentiles = [(100 - clip_percent) / 2, (100 + clip_percent) / 2]
+    lower, upper = np.nanpercentile(sample, percentiles)
+    lower = int(np.floor(lower))
+    upper = max(int(np.ceil(upper)), lower + 1)
+
+    if colour:
+        rgb = _log_stretch(data, lower, upper)
+    elif data.dtype.kind in 'ui' and data.dtype.itemsize <= 2:
+        lut = _preview_lut(data.dtype.str, lower, upper)
+        offset = np.iinfo(data.dtype).min
+        rgb = lut[data.astype(np.int64) - offset if offset else data]
+    else:
+        rgb = _preview_colours()[_log_stretch(data, lower, upper)]
+
+    # Flip to put the origin at the bottom, as in the plots.
+    image = PILImage.fromarray(np.ascontiguousarray(rgb[::-1]), mode='RGB')
+    if title:
+        draw = ImageDraw.Draw(image)
+        draw.rectangle([0, 0, image.width, 14], fill=(0, 0, 0))
+        draw.text((4, 2), title, fill=(255, 255, 255))
+
+    if os.path.dirname(filename):
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+    image.save(filename, format='JPEG', quality=quality)
+
+    return filename
+
+
+def bin_data(data, bin_size):
+    """Bin image data by summing square blocks of pixels.
+
+    The data is trimmed to a multiple of `bin_size` first. The sum is divided
+    by the number of pixels in a block, so integer data keeps its type and range.
+    Only the first two (spatial) axes are binned, so colour data with the
+    channels on a trailing axis keeps its channels.
+
+    Arguments:
+        data (numpy.ndarray): 2D image data, or 3D with the channels on the last axis.
+        bin_size (int): Size of the blocks.
+
+    Returns:
+        numpy.ndarray: The binned data, with the same dtype as `data`.
+    """
+    if data.ndim not in (2, 3):
+        raise ValueError("Need 2D or 3D image data, got shape {}".format(data.shape))
+
+    ny = data.shape[0] // bin_size
+    nx = data.shape[1] // bin_size
+    data = data[:ny * bin_size, :nx * bin_size]
+    shape = (ny, nx) + data.shape[2:]
+
+    # Adding strided views is faster than summing over the axes of a reshaped array.
+    if data.dtype.kind in 'ui':
+        binned = np.zeros(shape, dtype=np.int64)
+    else:
+        binned = np.zeros(shape, dtype=np.float64)
+    for i in range(bin_size):
+        for j in range(bin_size):
+            binned += data[i::bin_size, j::bin_size]
+
+    if data.dtype.kind in 'ui':
+        binned //= bin_size**2
+    else:
+        binned /= bin_size**2
+    return binned.astype(data.dtype)
+
+
+@lru_cache(maxsize=1)
+def _preview_colours():
+    """RGB colours of the palette, with white for values over the top """
+    colours = (palette(np.linspace(0, 1, 255))[:, :3] * 255).astype(np.uint8)
+    return np.vstack([colours, [[255, 255, 255]]]).astype(np.uint8)
+
+
+@lru_cache(maxsize=8)
+def _preview_lut(dtype, lower, upper):
+    """RGB colour of every value of an integer dtype for a stretch """
+    info = np.iinfo(np.dtype(dtype))
+    values = np.arange(info.min, info.max + 1)
+    return _preview_colours()[_log_stretch(values, lower, upper)]
+
+
+def _log_stretch(data, lower, upper, a=1000):
+    """Index into the preview colours of values, as astropy's `LogStretch` """
+    scaled = np.clip((data.astype(np.float32) - lower) / (upper - lower), 0, 1)
+    index = (254 * np.log1p(a * scaled) / np.log1p(a)).astype(np.uint8)
+    index[data >= upper] = 255
+    return index
+
+
+def _make_preview_from_fits(fname, title=None, **kwargs):
+    with open_fits(fname) as hdu:
+        header = hdu[0].header
+        data = hdu[0].data
+        if title is None:
+            title = _pretty_title(fname, header)
+        new_filename = make_preview(data, fname.replace('.fits', '.jpg'), title=title, **kwargs)
+
+    return new_filename
+
+
+def _pretty_title(fname, header):
+    field = header.get('FIELD', 'Unknown field')
+    exptime = header.get('EXPTIME', 'Unknown exptime')
+    filter_type = header.get('FILTER', 'Unknown filter')
+
+    try:
+        date_time = header['DATE-OBS']
+    except KeyError:
+        # If we don't have DATE-OBS, check filename for date
+        try:
+            basename = os.path.splitext(os.path.basename(fname))[0]
+            date_time = date_parser.parse(basename).isoformat()
+        except Exception:
+            # Otherwise use now
+            date_time = current_time(pretty=True)
+
+    date_time = date_time.replace('T', ' ', 1)
+
+    return '{} ({}s {}) {}'.format(field, exptime, filter_type, date_time)
+
+
 def _make_pretty_from_fits(fname=None,
                            title=None,
                            figsize=(10, 10 / 1.325),
@@ -144,24 +415,7 @@ def _make_pretty_from_fits(fname=None,
         wcs = WCS(header)
 
     if not title:
-        field = header.get('FIELD', 'Unknown field')
-        exptime = header.get('EXPTIME', 'Unknown exptime')
-        filter_type = header.get('FILTER', 'Unknown filter')
-
-        try:
-            date_time = header['DATE-OBS']
-        except KeyError:
-            # If we don't have DATE-OBS, check filename for date
-            try:
-                basename = os.path.splitext(os.path.basename(fname))[0]
-                date_time = date_parser.parse(basename).isoformat()
-            except Exception:
-                # Otherwise use now
-                date_time = current_time(pretty=True)
-
-        date_time = date_time.replace('T', ' ', 1)
-
-        title = '{} ({}s {}) {}'.format(field, exptime, filter_type, date_time)
+        title = _pretty_title(fname, header)
 
     norm = ImageNormalize(interval=PercentileInterval(clip_percent), stretch=LogStretch())
 
@@ -333,11 +587,12 @@ def clean_observation_dir(dir_name,
                           remove_jpgs=False,
                           include_timelapse=True,
                           timelapse_overwrite=False,
+                          max_workers=None,
                           **kwargs):
     """Clean an observation directory.
 
     For the given `dir_name`, will:
-        * Compress FITS files
+        * Compress FITS files (in parallel, see `fits_utils.fpack_files`)
         * Remove `.solved` files
         * Create timelapse from JPG files if present (optional, default True)
         * Remove JPG files (optional, default False).
@@ -349,7 +604,13 @@ def clean_observation_dir(dir_name,
         include_timelapse (bool, optional): If a timelapse should be created, default True.
         timelapse_overwrite (bool, optional): If timelapse file should be overwritten,
             default False.
+        max_workers (int, optional): Number of processes compressing FITS files,
+            default the number of CPUs.
         **kwargs: Can include `verbose`.
+
+    Raises:
+        error.PanError: If any of the FITS files could not be compressed, once
+            the rest of the directory has been cleaned.
     """
     verbose = kwargs.get('verbose', False)
 
@@ -364,11 +625,8 @@ def clean_observation_dir(dir_name,
 
     # Pack the fits files
     _print("Packing FITS files")
-    for f in _glob('*.fits'):
-        try:
-            fits_utils.fpack(f)
-        except Exception as e:  # pragma: no cover
-            warn('Could not compress fits file: {!r}'.format(e))
+    packed = fits_utils.fpack_files(_glob('*.fits'), max_workers=max_workers, verbose=verbose)
+    not_packed = sorted(fits_fname for fits_fname, fz_fname in packed.items() if fz_fname is None)
 
     # Remove .solved files
     _print('Removing .solved files')
@@ -402,3 +660,8 @@ def clean_observation_dir(dir_name,
                         warn('Could not delete file: {!r}'.format(e))
     except Exception as e:
         warn('Problem with cleanup creating timelapse: {!r}'.format(e))
+
+    # Fail so the cleanup is run again, e.g. by `pocs.housekeeping.Housekeeper`.
+    if not_packed:
+        raise error.PanError("Could not compress {} FITS files: {}".format(
+            len(not_packed), not_packed))
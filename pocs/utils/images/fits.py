@@ -1,15 +1,23 @@
 import os
+import re
 import shutil
 import subprocess
 
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import as_completed
 from warnings import warn
 
 from astropy.io import fits
 from astropy.wcs import WCS
+from astropy.wcs.utils import proj_plane_pixel_scales
 from astropy import units as u
 
 from pocs.utils import error
 
+# Blank header cards written after the header of an image, so keywords added later
+# (see `update_header`) fit in the existing header blocks and the file isn't rewritten.
+RESERVED_HEADER_CARDS = 72
+
 
 def solve_field(fname, timeout=15, solve_opts=None, **kwargs):
     """ Plate solves an image.
@@ -20,6 +28,12 @@ def solve_field(fname, timeout=15, solve_opts=None, **kwargs):
                                     defaults to 60 seconds.
         solve_opts(list, optional): List of options for solve-field.
         verbose(bool, optional):    Show output, defaults to False.
+        scale_low(float, optional): Lower limit of the pixel scale in arcsec/pixel,
+                                    used with `scale_high` instead of guessing
+                                    the scale.
+        scale_high(float, optional): Upper limit of the pixel scale in arcsec/pixel.
+        index_files(list, optional): Only use these astrometry.net index files,
+                                    written to a `.cfg` file next to `fname`.
     """
     verbose = kwargs.get('verbose', False)
     if verbose:
@@ -36,7 +50,6 @@ def solve_field(fname, timeout=15, solve_opts=None, **kwargs):
         options = solve_opts
     else:
         options = [
-            '--guess-scale',
             '--cpulimit', str(timeout),
             '--no-verify',
             '--no-plots',
@@ -62,6 +75,17 @@ def solve_field(fname, timeout=15, solve_opts=None, **kwargs):
             options.append('--radius')
             options.append(str(kwargs.get('radius')))
 
+        if 'scale_low' in kwargs and 'scale_high' in kwargs:
+            options.extend(['--scale-units', 'arcsecperpix',
+                            '--scale-low', str(kwargs.get('scale_low')),
+                            '--scale-high', str(kwargs.get('scale_high'))])
+        else:
+            options.append('--guess-scale')
+
+        if kwargs.get('index_files'):
+            options.append('--config')
+            options.append(_write_solve_config(fname, kwargs.get('index_files')))
+
     if fname.endswith('.fz'):
         options.append('--extension=1')
 
@@ -158,6 +182,7 @@ def get_solve_field(fname, replace=True, remove_extras=True, **kwargs):
             rdls = fname.replace(file_ext, '.rdls')
             axy = fname.replace(file_ext, '.axy')
             xyls = fname.replace(file_ext, '-indx.xyls')
+            cfg = fname.replace(file_ext, '.cfg')
 
             if replace and os.path.exists(new):
                 # Remove converted fits
@@ -170,7 +195,7 @@ def get_solve_field(fname, replace=True, remove_extras=True, **kwargs):
                 out_dict['solved_fits_file'] = new
 
             if remove_extras:
-                for f in [rdls, xyls, axy]:
+                for f in [rdls, xyls, axy, cfg]:
                     if os.path.exists(f):
                         os.remove(f)
 
@@ -190,6 +215,158 @@ def get_solve_field(fname, replace=True, remove_extras=True, **kwargs):
     return out_dict
 
 
+def get_solve_index_files(header):
+    """Get the index files that solved a field.
+
+    Astrometry.net lists the index files it loaded and the id (and healpix) of
+    the index with the matching quad as comments in the header of the solved file.
+
+    Args:
+        header (dict or astropy.io.fits.Header): Header of a solved FITS file,
+            e.g. as returned by `get_solve_field`.
+
+    Returns:
+        list: Paths of the matching index files, empty if not found.
+    """
+    comments = header.get('COMMENT', [])
+    if isinstance(comments, str):
+        comments = [comments]
+
+    index_paths = list()
+    index_id = None
+    healpix = -1
+    for comment in comments:
+        comment = str(comment).strip()
+
+        match = re.match(r'Index\(\d+\): (.+)$', comment)
+        if match and match.group(1).strip() not in index_paths:
+            index_paths.append(match.group(1).strip())
+
+        match = re.match(r'index id: (\d+)$', comment)
+        if match:
+            index_id = int(match.group(1))
+
+        match = re.match(r'index healpix: (-?\d+)$', comment)
+        if match:
+            healpix = int(match.group(1))
+
+    if index_id is None:
+        return list()
+
+    if healpix >= 0:
+        index_name = 'index-{}-{:02d}'.format(index_id, healpix)
+    else:
+        index_name = 'index-{}'.format(index_id)
+
+    return [path for path in index_paths
+            if os.path.basename(path).split('.')[0] == index_name]
+
+
+def get_solve_scale(header):
+    """Get the pixel scale of a solved field in arcsec/pixel.
+
+    Args:
+        header (dict or astropy.io.fits.Header): Header of a solved FITS file.
+
+    Returns:
+        float: The pixel scale or None if the header has no celestial WCS.
+    """
+    if not isinstance(header, fits.Header):
+        # E.g. from `get_solve_field`, which also has non-FITS keys.
+        header = fits.Header([
+            (key, value) for key, value in header.items()
+            if len(key) <= 8 and key not in ('COMMENT', 'HISTORY', '') and
+            isinstance(value, (str, int, float, bool))
+        ])
+
+    try:
+        wcs = WCS(header)
+    except Exception:
+        return None
+
+    if not wcs.is_celestial:
+        return None
+
+    scales = proj_plane_pixel_scales(wcs.celestial) * u.degree
+    return float(scales.to(u.arcsec).value.mean())
+
+
+class SolveCache(object):
+
+    def __init__(self, radius=2, scale_tolerance=0.1):
+        """Remember how fields were solved to make later solves faster.
+
+        After a field has been solved, e.g. the pointing image of an observation,
+        the pixel scale and the index files that matched are stored under a key
+        such as the field name. `get_hints` then returns the options for
+        `get_solve_field` that limit the search to those index files, a narrow
+        range of scales and a small `radius` around the RA/Dec in the header.
+
+        Args:
+            radius (float, optional): Search radius in degrees for hinted solves,
+                default 2.
+            scale_tolerance (float, optional): Fractional range around the known
+                pixel scale to search, default 0.1.
+        """
+        self.radius = radius
+        self.scale_tolerance = scale_tolerance
+        self._solves = dict()
+
+    def __contains__(self, key):
+        return key in self._solves
+
+    def get_hints(self, key):
+        """Get the `get_solve_field` options for a hinted solve.
+
+        Args:
+            key (str): Key of the field, e.g. the field name.
+
+        Returns:
+            dict: Options to pass along to `get_solve_field`, empty if the
+                field hasn't been solved before.
+        """
+        if key not in self._solves:
+            return dict()
+
+        solve = self._solves[key]
+
+        hints = {'radius': self.radius}
+        if solve['scale'] is not None:
+            hints['scale_low'] = solve['scale'] * (1 - self.scale_tolerance)
+            hints['scale_high'] = solve['scale'] * (1 + self.scale_tolerance)
+        if solve['index_files']:
+            hints['index_files'] = list(solve['index_files'])
+
+        return hints
+
+    def update(self, key, solve_info):
+        """Store the solution of a field.
+
+        Args:
+            key (str): Key of the field, e.g. the field name.
+            solve_info (dict): Header of the solved file, as returned by `get_solve_field`.
+        """
+        scale = get_solve_scale(solve_info)
+        if scale is None:
+            return
+
+        index_files = get_solve_index_files(solve_info)
+
+        # Keep the index files from an earlier solve if these comments are missing.
+        if not index_files and key in self._solves:
+            index_files = self._solves[key]['index_files']
+
+        self._solves[key] = {'scale': scale, 'index_files': index_files}
+
+    def remove(self, key):
+        """Forget the solution of a field, e.g. if a hinted solve failed """
+        self._solves.pop(key, None)
+
+    def clear(self):
+        """Forget all solutions """
+        self._solves.clear()
+
+
 def get_wcsinfo(fits_fname, verbose=False):
     """Returns the WCS information for a FITS file.
 
@@ -286,47 +463,66 @@ def get_wcsinfo(fits_fname, verbose=False):
     return wcs_info
 
 
-def fpack(fits_fname, unpack=False, verbose=False):
+def fpack(fits_fname, unpack=False, verbose=False, compression_type='RICE_1', overwrite=True):
     """Compress/Decompress a FITS file
 
-    Uses `fpack` (or `funpack` if `unpack=True`) to compress a FITS file
+    Tile compresses the image of a FITS file in-process, like the `fpack`
+    (or `funpack` if `unpack=True`) command line tools. The compressed file
+    has the name of the FITS file with `.fz` appended and holds the image in
+    its first extension, with an empty primary HDU. Any other image extensions
+    are compressed too and the other extensions (e.g. tables) are copied as
+    they are. The original file is removed once the new one has been written.
 
     Args:
         fits_fname ({str}): Name of a FITS file that contains a WCS.
         unpack ({bool}, optional): file should decompressed instead of compressed, default False.
         verbose ({bool}, optional): Verbose, default False.
+        compression_type (str, optional): Compression algorithm, default 'RICE_1'. See
+            `astropy.io.fits.CompImageHDU` for the others.
+        overwrite (bool, optional): Replace an existing output file, default True.
 
     Returns:
         str: Filename of compressed/decompressed file.
+
+    Raises:
+        OSError: If the file can't be read or the output can't be written.
     """
     assert os.path.exists(fits_fname), warn(
         "No file exists at: {}".format(fits_fname))
 
+    if unpack != fits_fname.endswith('.fz'):
+        warn("File is already {}: {}".format('unpacked' if unpack else 'packed', fits_fname))
+        return fits_fname
+
     if unpack:
-        fpack = shutil.which('funpack')
-        run_cmd = [fpack, '-D', fits_fname]
-        out_file = fits_fname.replace('.fz', '')
+        out_file = re.sub(r'\.fz$', '', fits_fname)
     else:
-        fpack = shutil.which('fpack')
-        run_cmd = [fpack, '-D', '-Y', fits_fname]
-        out_file = fits_fname.replace('.fits', '.fits.fz')
-
-    try:
-        assert fpack is not None
-    except AssertionError:
-        warn("fpack not found (try installing cfitsio). File has not been changed")
-        return fits_fname
+        out_file = fits_fname + '.fz'
 
     if verbose:
-        print("fpack command: {}".format(run_cmd))
-
-    proc = subprocess.Popen(run_cmd, stdout=subprocess.PIPE,
-                            stderr=subprocess.STDOUT, universal_newlines=True)
-    try:
-        output, errs = proc.communicate(timeout=5)
-    except subprocess.TimeoutExpired:
-        proc.kill()
-        output, errs = proc.communicate()
+        print("{} {} to {}".format('Unpacking' if unpack else 'Packing', fits_fname, out_file))
+
+    with fits.open(fits_fname, 'readonly') as hdu_list:
+        if unpack:
+            hdu = hdu_list[1]
+            new_hdu_list = fits.HDUList([fits.PrimaryHDU(hdu.data, header=hdu.header)])
+            for hdu in hdu_list[2:]:
+                if isinstance(hdu, fits.CompImageHDU):
+                    new_hdu_list.append(fits.ImageHDU(hdu.data, header=hdu.header))
+                else:
+                    new_hdu_list.append(hdu.copy())
+        else:
+            new_hdu_list = fits.HDUList([fits.PrimaryHDU()])
+            for hdu in hdu_list:
+                if isinstance(hdu, (fits.PrimaryHDU, fits.ImageHDU)):
+                    new_hdu_list.append(fits.CompImageHDU(hdu.data,
+                                                          header=hdu.header,
+                                                          compression_type=compression_type))
+                else:
+                    new_hdu_list.append(hdu.copy())
+        _write_hdu_list(new_hdu_list, out_file, overwrite=overwrite)
+
+    os.remove(fits_fname)
 
     return out_file
 
@@ -349,18 +545,84 @@ def funpack(*args, **kwargs):
     return fpack(*args, unpack=True, **kwargs)
 
 
-def write_fits(data, header, filename, logger=None, exposure_event=None):
+def fpack_files(fits_files, unpack=False, max_workers=None, verbose=False, **kwargs):
+    """Compress/Decompress FITS files in parallel.
+
+    Each file is compressed by `fpack` in a pool of worker processes. A file
+    that can't be compressed is left as it is.
+
+    Args:
+        fits_files (list of str): Names of the FITS files.
+        unpack (bool, optional): Decompress the files instead, default False.
+        max_workers (int, optional): Number of worker processes, default the
+            number of CPUs.
+        verbose (bool, optional): Verbose, default False.
+        **kwargs: Passed to `fpack`.
+
+    Returns:
+        dict: Name of the compressed/decompressed file for each of the `fits_files`,
+            or None for those that failed.
+    """
+    fits_files = list(fits_files)
+    results = dict()
+    if len(fits_files) == 0:
+        return results
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(fpack, fits_fname, unpack=unpack, **kwargs): fits_fname
+                   for fits_fname in fits_files}
+        for future in as_completed(futures):
+            fits_fname = futures[future]
+            try:
+                results[fits_fname] = future.result()
+            except Exception as e:
+                warn("Could not {} {}: {!r}".format('unpack' if unpack else 'pack', fits_fname, e))
+                results[fits_fname] = None
+            else:
+                if verbose:
+                    print("Done: {}".format(results[fits_fname]))
+
+    return results
+
+
+def write_fits(data, header, filename, logger=None, exposure_event=None, compress=False,
+               compression_type='RICE_1', reserve_cards=RESERVED_HEADER_CARDS):
     """
     Write FITS file to requested location
+
+    Args:
+        data (numpy.ndarray): The image data.
+        header (astropy.io.fits.Header): The header.
+        filename (str): Name of the file.
+        logger (logging.Logger, optional): Logger for the outcome.
+        exposure_event (threading.Event, optional): Set once the file has been written.
+        compress (bool, optional): Tile compress the image, as by `fpack`, default False.
+            `.fz` is added to the filename if not already there.
+        compression_type (str, optional): Compression algorithm, default 'RICE_1'.
+        reserve_cards (int, optional): Number of blank header cards to add for
+            keywords added later, default `RESERVED_HEADER_CARDS`.
+
+    Returns:
+        str: Name of the file written.
     """
     hdu = fits.PrimaryHDU(data, header=header)
+    for _ in range(reserve_cards):
+        hdu.header.append(fits.Card(), useblanks=False, bottom=True)
+    if compress:
+        if not filename.endswith('.fz'):
+            filename = filename + '.fz'
+        # The primary HDU fills in the keywords (BITPIX etc) the compressed HDU needs.
+        hdu = fits.CompImageHDU(hdu.data, header=hdu.header, compression_type=compression_type)
+        hdu_list = fits.HDUList([fits.PrimaryHDU(), hdu])
+    else:
+        hdu_list = fits.HDUList([hdu])
 
     # Create directories if required.
     if os.path.dirname(filename):
         os.makedirs(os.path.dirname(filename), mode=0o775, exist_ok=True)
 
     try:
-        hdu.writeto(filename)
+        hdu_list.writeto(filename)
     except OSError as err:
         if logger:
             logger.error('Error writing image to {}!'.format(filename))
@@ -372,29 +634,74 @@ def write_fits(data, header, filename, logger=None, exposure_event=None):
         if exposure_event:
             exposure_event.set()
 
+    return filename
+
+
+def set_observation_headers(header, info):
+    """Set the keywords of an observation in a FITS header.
+
+    Args:
+        header (astropy.io.fits.Header): The header to update.
+        info (dict): Metadata of the exposure, see `AbstractCamera.take_observation`.
+
+    Returns:
+        astropy.io.fits.Header: The `header`.
+    """
+    header.set('IMAGEID', info.get('image_id', ''))
+    header.set('SEQID', info.get('sequence_id', ''))
+    header.set('FIELD', info.get('field_name', ''))
+    header.set('RA-MNT', info.get('ra_mnt', ''), 'Degrees')
+    header.set('HA-MNT', info.get('ha_mnt', ''), 'Degrees')
+    header.set('DEC-MNT', info.get('dec_mnt', ''), 'Degrees')
+    header.set('EQUINOX', info.get('equinox', 2000.))  # Assume J2000
+    header.set('AIRMASS', info.get('airmass', ''), 'Sec(z)')
+    header.set('FILTER', info.get('filter', ''))
+    header.set('LAT-OBS', info.get('latitude', ''), 'Degrees')
+    header.set('LONG-OBS', info.get('longitude', ''), 'Degrees')
+    header.set('ELEV-OBS', info.get('elevation', ''), 'Meters')
+    header.set('MOONSEP', info.get('moon_separation', ''), 'Degrees')
+    header.set('MOONFRAC', info.get('moon_fraction', ''))
+    header.set('CREATOR', info.get('creator', ''), 'POCS Software version')
+    header.set('INSTRUME', info.get('camera_uid', ''), 'Camera ID')
+    header.set('OBSERVER', info.get('observer', ''), 'PANOPTES Unit ID')
+    header.set('ORIGIN', info.get('origin', ''))
+    header.set('RA-RATE', info.get('tracking_rate_ra', ''), 'RA Tracking Rate')
+
+    return header
+
 
 def update_headers(file_path, info):
+    """Set the keywords of an observation in the header of a FITS file.
+
+    See `set_observation_headers`.
+    """
+    update_header(file_path, set_observation_headers(fits.Header(), info))
+
+
+def update_header(file_path, values):
+    """Update the header of the image in a FITS file.
+
+    The file is updated in place if the new keywords fit in the blank cards
+    reserved by `write_fits`, otherwise astropy rewrites the file.
+
+    Args:
+        file_path (str): Name of the FITS file, may be compressed (`.fz`).
+        values (dict or astropy.io.fits.Header): Values to set, by keyword. A
+            value may be a (value, comment) tuple.
+    """
+    ext = 0
+    if file_path.endswith('.fz'):
+        ext = 1
+
+    if isinstance(values, fits.Header):
+        values = {card.keyword: (card.value, card.comment) for card in values.cards}
+
     with fits.open(file_path, 'update') as f:
-        hdu = f[0]
-        hdu.header.set('IMAGEID', info.get('image_id', ''))
-        hdu.header.set('SEQID', info.get('sequence_id', ''))
-        hdu.header.set('FIELD', info.get('field_name', ''))
-        hdu.header.set('RA-MNT', info.get('ra_mnt', ''), 'Degrees')
-        hdu.header.set('HA-MNT', info.get('ha_mnt', ''), 'Degrees')
-        hdu.header.set('DEC-MNT', info.get('dec_mnt', ''), 'Degrees')
-        hdu.header.set('EQUINOX', info.get('equinox', 2000.))  # Assume J2000
-        hdu.header.set('AIRMASS', info.get('airmass', ''), 'Sec(z)')
-        hdu.header.set('FILTER', info.get('filter', ''))
-        hdu.header.set('LAT-OBS', info.get('latitude', ''), 'Degrees')
-        hdu.header.set('LONG-OBS', info.get('longitude', ''), 'Degrees')
-        hdu.header.set('ELEV-OBS', info.get('elevation', ''), 'Meters')
-        hdu.header.set('MOONSEP', info.get('moon_separation', ''), 'Degrees')
-        hdu.header.set('MOONFRAC', info.get('moon_fraction', ''))
-        hdu.header.set('CREATOR', info.get('creator', ''), 'POCS Software version')
-        hdu.header.set('INSTRUME', info.get('camera_uid', ''), 'Camera ID')
-        hdu.header.set('OBSERVER', info.get('observer', ''), 'PANOPTES Unit ID')
-        hdu.header.set('ORIGIN', info.get('origin', ''))
-        hdu.header.set('RA-RATE', info.get('tracking_rate_ra', ''), 'RA Tracking Rate')
+        header = f[ext].header
+        for keyword, value in values.items():
+            if not isinstance(value, tuple):
+                value = (value, )
+            header.set(keyword, *value)
 
 
 def getheader(fn, *args, **kwargs):
@@ -437,3 +744,29 @@ def getval(fn, *args, **kwargs):
     if fn.endswith('.fz'):
         ext = 1
     return fits.getval(fn, *args, ext=ext, **kwargs)
+
+
+def _write_solve_config(fname, index_files):
+    """Write an astrometry.net backend config that only loads `index_files` """
+    file_ext = os.path.splitext(fname)[1]
+    config_path = fname.replace(file_ext, '.cfg')
+    with open(config_path, 'w') as f:
+        f.write('inparallel\n')
+        for index_file in index_files:
+            f.write('index {}\n'.format(index_file))
+
+    return config_path
+
+
+def _write_hdu_list(hdu_list, filename, overwrite=True):
+    """Write to a temporary file then move it into place, so a failed write leaves no file """
+    if not overwrite and os.path.exists(filename):
+        raise OSError("File exists: {}".format(filename))
+
+    tmp_file = filename + '.tmp'
+    try:
+        hdu_list.writeto(tmp_file, overwrite=True)
+        os.replace(tmp_file, filename)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
@@ -71,6 +71,26 @@ def mask_saturated(data, saturation_level=None, threshold=0.9, dtype=np.float64)
     return np.ma.array(data, mask=(data > saturation_level), dtype=dtype)
 
 
+def peak_bracketed(metric, num_points=2):
+    """Check if the maximum of a focus sweep has been found.
+
+    The peak is bracketed when the best value is not the first one and is followed
+    by at least `num_points` values, i.e. the sweep has passed the best focus.
+
+    Args:
+        metric (sequence) -- Focus metric values, in order of focus position.
+        num_points (int, optional) -- Number of values needed after the best one,
+            default 2.
+
+    Returns:
+        bool: True if the peak is bracketed.
+    """
+    if len(metric) == 0:
+        return False
+    imax = int(np.argmax(metric))
+    return imax > 0 and len(metric) - 1 - imax >= num_points
+
+
 def _vollath_F4_y(data):
     A1 = (data[1:] * data[:-1]).mean()
     A2 = (data[2:] * data[:-2]).mean()
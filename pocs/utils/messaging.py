@@ -1,6 +1,8 @@
 import datetime
 import re
+import time
 import zmq
+import zmq.asyncio
 
 import yaml
 
@@ -9,9 +11,11 @@ from astropy.time import Time
 from bson import ObjectId
 from json import dumps
 from json import loads
+from collections import OrderedDict
 
 from pocs.utils import current_time
 from pocs.utils import CountdownTimer
+from pocs.utils import serializers
 from pocs.utils.logger import get_root_logger
 
 
@@ -76,22 +80,60 @@ class PanMessaging(object):
     PanMessaging converts the provided message topic and value into
     a byte array of this format:
         <topic-name><space><serialized-value>
+
+    Publishers created with `encoding='binary'` instead send each message
+    as three frames: the topic name, a header and the message value in
+    the binary (msgpack) encoding of `pocs.utils.serializers.dumps_binary`.
+    The value is not scrubbed, so registered types such as Quantity, Time,
+    datetime and ObjectId are received as the same types. The header is
+    `HEADER_MAGIC` followed by a byte for the encoding version and a byte
+    for the format, so that subscribers can decode every version they
+    know and skip messages from newer peers.
+
+    Subscribers accept both kinds of message, so mixed peers work as long
+    as publishers only switch to the binary encoding once all subscribers
+    on the bus have been updated (see the `messaging.encoding` config item).
     """
     logger = get_root_logger()
 
     # Topic names must consist of the characters.
     topic_name_re = re.compile('[a-zA-Z][-a-zA-Z0-9_.:]*')
 
-    def __init__(self, **kwargs):
+    # Class of the zmq context, and so of the sockets.
+    context_class = zmq.Context
+
+    # Encodings of the messages sent by publishers.
+    encodings = ('json', 'binary')
+
+    # Start of the header frame of multi-frame messages, then the version and format.
+    HEADER_MAGIC = b'PM'
+    BINARY_FORMAT = 1
+
+    def __init__(self, encoding='json', **kwargs):
         """Do not call this directly."""
+        if encoding not in self.encodings:
+            raise ValueError('Unknown message encoding: {}'.format(encoding))
+
         # Create a new context
-        self.context = zmq.Context()
+        self.context = self.context_class()
         self.socket = None
+        self.encoding = encoding
+        self._header = self.HEADER_MAGIC + bytes([serializers.BINARY_VERSION,
+                                                  self.BINARY_FORMAT])
 
     @classmethod
-    def create_forwarder(cls, sub_port, pub_port, ready_fn=None, done_fn=None):
-        subscriber, publisher = PanMessaging.create_forwarder_sockets(sub_port, pub_port)
-        PanMessaging.run_forwarder(subscriber, publisher, ready_fn=ready_fn, done_fn=done_fn)
+    def create_forwarder(cls, sub_port, pub_port, ready_fn=None, done_fn=None, **kwargs):
+        """Run a `MessageHub` forwarding from `sub_port` to `pub_port`.
+
+        Args:
+            sub_port (int): Port the publishers send to.
+            pub_port (int): Port the subscribers receive from.
+            ready_fn (callable, optional): Called once the hub is running.
+            done_fn (callable, optional): Called once the hub has stopped.
+            **kwargs: Options of `MessageHub`, e.g. `cache_topics`.
+        """
+        hub = MessageHub(sub_port, pub_port, **kwargs)
+        hub.run(ready_fn=ready_fn, done_fn=done_fn)
 
     @classmethod
     def create_forwarder_sockets(cls, sub_port, pub_port):
@@ -121,16 +163,19 @@ class PanMessaging(object):
                 done_fn()
 
     @classmethod
-    def create_publisher(cls, port, bind=False, connect=True):
+    def create_publisher(cls, port, bind=False, connect=True, encoding='json'):
         """ Create a publisher
 
         Args:
             port (int): The port (on localhost) to bind to.
+            encoding (str, optional): Encoding of the messages, 'json' (default)
+                for single frame JSON messages that all peers can read, or
+                'binary' for multi-frame binary messages.
 
         Returns:
             A ZMQ PUB socket
         """
-        obj = cls()
+        obj = cls(encoding=encoding)
 
         obj.logger.debug("Creating publisher. Binding to port {} ".format(port))
 
@@ -181,6 +226,19 @@ class PanMessaging(object):
                 match topic_name_re.
             message:   Message to be sent (a string or a dict).
         """
+        self.socket.send_multipart(self.encode_message(topic, message), flags=zmq.NOBLOCK)
+
+    def encode_message(self, topic, message):
+        """Encode a message as the frames to send.
+
+        Args:
+            topic(str):   Name of topic to send on. The name must
+                match topic_name_re.
+            message:   Message to be sent (a string or a dict).
+
+        Returns:
+            list of bytes: The frames of the message.
+        """
         if not isinstance(topic, str):
             raise ValueError('Topic name must be a string')
         elif not self.topic_name_re.fullmatch(topic):
@@ -191,20 +249,20 @@ class PanMessaging(object):
                 'message': message,
                 'timestamp': current_time(pretty=True),
             }
-        elif isinstance(message, dict):
-            message = self.scrub_message(message)
-        else:
+        elif not isinstance(message, dict):
             raise ValueError('Message value must be a string or dict')
 
-        msg_object = dumps(message, skipkeys=True)
-
-        full_message = '{} {}'.format(topic, msg_object)
-
         if topic == 'PANCHAT':
             self.logger.info("{} {}".format(topic, message['message']))
 
-        # Send the message
-        self.socket.send_string(full_message, flags=zmq.NOBLOCK)
+        if self.encoding == 'binary':
+            return [topic.encode(), self._header, serializers.dumps_binary(message)]
+
+        msg_object = dumps(self.scrub_message(message), skipkeys=True)
+
+        full_message = '{} {}'.format(topic, msg_object)
+
+        return [full_message.encode()]
 
     def receive_message(self, blocking=True, flags=0, timeout_ms=0):
         """Receive a message
@@ -220,7 +278,8 @@ class PanMessaging(object):
                 a message to arrive. Only applies if blocking is True.
 
         Returns:
-            tuple(str, dict): Tuple containing the topic and a dict
+            tuple(str, dict): Tuple containing the topic and a dict. The dict is
+                None if the message could not be decoded.
         """
         topic = None
         msg_obj = None
@@ -235,17 +294,51 @@ class PanMessaging(object):
             # as necessary.
             flags = flags | zmq.NOBLOCK
         try:
-            message = self.socket.recv_string(flags=flags)
+            frames = self.socket.recv_multipart(flags=flags)
         except Exception as e:
             pass
         else:
-            topic, msg = message.split(' ', maxsplit=1)
+            topic, msg_obj = self.decode_message(frames)
+
+        return topic, msg_obj
+
+    def decode_message(self, frames):
+        """Decode the frames of a message.
+
+        Args:
+            frames (list of bytes): The frames received, either a single
+                "topic json" frame or the topic, header and binary value.
+
+        Returns:
+            tuple(str, dict): The topic and the message value, None if the
+                message can't be decoded.
+        """
+        if len(frames) == 1:
+            topic, msg = frames[0].decode().split(' ', maxsplit=1)
             try:
                 msg_obj = loads(msg)
             except Exception:
                 msg_obj = yaml.load(msg)
+            return topic, msg_obj
 
-        return topic, msg_obj
+        topic = frames[0].decode()
+        header = frames[1] if len(frames) == 3 else b''
+        if (header[:len(self.HEADER_MAGIC)] != self.HEADER_MAGIC or
+                len(header) != len(self.HEADER_MAGIC) + 2):
+            self.logger.warning("Invalid message on topic {}", topic)
+            return topic, None
+
+        version, msg_format = header[len(self.HEADER_MAGIC):]
+        if version > serializers.BINARY_VERSION or msg_format != self.BINARY_FORMAT:
+            self.logger.warning("Skipping message on topic {} with version {} and format {}",
+                                topic, version, msg_format)
+            return topic, None
+
+        try:
+            return topic, serializers.loads_binary(frames[2])
+        except ValueError as e:
+            self.logger.warning("Can't decode message on topic {}: {}", topic, e)
+            return topic, None
 
     def close(self):
         """Close the socket """
@@ -281,3 +374,249 @@ class PanMessaging(object):
             result[k] = v
 
         return result
+
+
+class AsyncPanMessaging(PanMessaging):
+    """PanMessaging for asyncio programs.
+
+    Created in the same way as `PanMessaging`, with `create_publisher` and
+    `create_subscriber`, but the sockets are asyncio sockets, so one event
+    loop can serve many publishers and subscribers without a thread or a
+    polling loop for each. The messages are the same, so async and sync
+    peers can be mixed.
+
+    `send_message` and `receive_message` are coroutines, and subscribers
+    can be iterated over until they are closed:
+
+        subscriber = AsyncPanMessaging.create_subscriber(6511, 'PANCHAT')
+        async for topic, msg_obj in subscriber:
+            ...
+
+    The instances must be used from a single event loop.
+    """
+    context_class = zmq.asyncio.Context
+
+    async def send_message(self, topic, message):
+        """Send a message on a topic, see `PanMessaging.send_message` """
+        await self.socket.send_multipart(self.encode_message(topic, message))
+
+    async def receive_message(self, timeout_ms=None):
+        """Receive a message
+
+        Args:
+            timeout_ms (int, optional): Time in milliseconds to wait for a
+                message, default wait until there is one.
+
+        Returns:
+            tuple(str, dict): Tuple containing the topic and a dict, or
+                (None, None) if there is no message before the timeout.
+        """
+        if timeout_ms is not None:
+            events = await self.socket.poll(timeout=timeout_ms, flags=zmq.POLLIN)
+            if not events:
+                return None, None
+
+        frames = await self.socket.recv_multipart()
+        return self.decode_message(frames)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return await self.receive_message()
+        except zmq.ZMQError:
+            if self.socket.closed:
+                raise StopAsyncIteration
+            raise
+
+
+class MessageHub(object):
+    """Forwards messages from publishers to subscribers.
+
+    The hub receives the messages of all the publishers on one port and sends
+    them to all the subscribers on another. Unlike a plain zmq forwarder it:
+
+      * Keeps the last message of each topic starting with one of `cache_topics`
+        and sends it to subscribers when they subscribe, so e.g. a new web UI
+        gets the STATUS without waiting for the next one. A subscriber that
+        subscribes to a topic another subscriber already receives gets a
+        second copy of the cached message. Only topics of state that is safe
+        to repeat should be cached, never commands.
+      * Counts the messages, bytes and drops of each topic, see `topic_stats`,
+        and publishes these counts every `stats_interval` seconds on
+        `stats_topic`.
+
+    ZeroMQ silently drops the messages for a subscriber whose queue is full.
+    With `nodrop=True` the hub is told instead and counts the message as
+    dropped, but then the message isn't sent to any subscriber, so this is
+    for finding where the bus saturates rather than for normal running.
+    """
+    logger = get_root_logger()
+
+    def __init__(self, sub_port, pub_port, cache_topics=None, stats_interval=60,
+                 stats_topic='HUB-STATS', nodrop=False):
+        """Create the hub and bind its ports.
+
+        Args:
+            sub_port (int): Port the publishers send to.
+            pub_port (int): Port the subscribers receive from.
+            cache_topics (list of str, optional): Prefixes of the topics to cache,
+                default none.
+            stats_interval (float, optional): Seconds between stats messages,
+                default 60. None to not send them.
+            stats_topic (str, optional): Topic of the stats messages.
+            nodrop (bool, optional): Count the messages that can't be queued for
+                a subscriber (and don't send them), default False.
+        """
+        self.sub_port = sub_port
+        self.pub_port = pub_port
+        self.cache_topics = tuple(cache_topics or ())
+        self.stats_interval = stats_interval
+        self.stats_topic = stats_topic
+
+        self.logger.info('Creating message hub for {} -> {}', sub_port, pub_port)
+
+        self.context = zmq.Context()
+
+        self.frontend = self.context.socket(zmq.SUB)
+        self.frontend.bind('tcp://*:{}'.format(sub_port))
+        self.frontend.setsockopt(zmq.SUBSCRIBE, b'')
+
+        # An XPUB socket receives the subscriptions, here every one so that
+        # each new subscriber gets the cached messages.
+        self.backend = self.context.socket(zmq.XPUB)
+        self.backend.setsockopt(zmq.XPUB_VERBOSE, 1)
+        if nodrop:
+            self.backend.setsockopt(zmq.XPUB_NODROP, 1)
+        self.backend.bind('tcp://*:{}'.format(pub_port))
+
+        self.last_messages = OrderedDict()
+        self._counts = dict()
+        self._last_counts = dict()
+        self._last_stats_time = time.monotonic()
+        self._running = False
+
+    def run(self, ready_fn=None, done_fn=None):
+        """Forward messages until `stop` is called or the process is interrupted.
+
+        Args:
+            ready_fn (callable, optional): Called once the hub is running.
+            done_fn (callable, optional): Called once the hub has stopped.
+        """
+        poller = zmq.Poller()
+        poller.register(self.frontend, zmq.POLLIN)
+        poller.register(self.backend, zmq.POLLIN)
+
+        self._running = True
+        try:
+            if ready_fn:
+                ready_fn()
+
+            while self._running:
+                events = dict(poller.poll(100))
+
+                if self.backend in events:
+                    self._handle_subscription(self.backend.recv())
+
+                if self.frontend in events:
+                    self.forward(self.frontend.recv_multipart())
+
+                if (self.stats_interval is not None and
+                        time.monotonic() - self._last_stats_time >= self.stats_interval):
+                    self.send_stats()
+        except KeyboardInterrupt:
+            pass
+        except Exception as e:
+            self.logger.warning(e)
+            self.logger.warning("bringing down message hub")
+        finally:
+            self.logger.info('Message hub for {} -> {} stopping', self.sub_port, self.pub_port)
+            self.close()
+            if done_fn:
+                done_fn()
+
+    def stop(self):
+        """Stop `run`, from another thread """
+        self._running = False
+
+    def close(self):
+        """Close the sockets """
+        self.frontend.close()
+        self.backend.close()
+        self.context.term()
+
+    def forward(self, frames):
+        """Send a message to the subscribers.
+
+        Args:
+            frames (list of bytes): Frames of the message, the first of which
+                starts with the topic.
+        """
+        topic = frames[0].split(b' ', 1)[0].decode(errors='replace')
+
+        counts = self._counts.setdefault(topic, [0, 0, 0])
+        counts[0] += 1
+        counts[1] += sum(len(frame) for frame in frames)
+
+        if self.cache_topics and topic.startswith(self.cache_topics):
+            self.last_messages[topic] = frames
+
+        if not self._send(frames):
+            counts[2] += 1
+
+    def topic_stats(self):
+        """Counts of the messages of each topic.
+
+        Returns:
+            dict: For each topic the total `messages`, `bytes` and `dropped`
+                messages, and the `message_rate` and `byte_rate` per second
+                since the last call.
+        """
+        now = time.monotonic()
+        elapsed = max(now - self._last_stats_time, 1e-6)
+        self._last_stats_time = now
+
+        stats = dict()
+        for topic, (messages, num_bytes, dropped) in self._counts.items():
+            last_messages, last_bytes, _ = self._last_counts.get(topic, (0, 0, 0))
+            stats[topic] = {
+                'messages': messages,
+                'bytes': num_bytes,
+                'dropped': dropped,
+                'message_rate': round((messages - last_messages) / elapsed, 3),
+                'byte_rate': round((num_bytes - last_bytes) / elapsed, 3),
+            }
+            self._last_counts[topic] = (messages, num_bytes, dropped)
+
+        return stats
+
+    def send_stats(self):
+        """Send the `topic_stats` on the stats topic """
+        stats = self.topic_stats()
+        self.logger.debug("Message hub {} -> {} stats: {}", self.sub_port, self.pub_port, stats)
+
+        message = '{} {}'.format(self.stats_topic, dumps({
+            'timestamp': current_time(pretty=True),
+            'topics': stats,
+        }))
+        self._send([message.encode()])
+
+    def _handle_subscription(self, message):
+        """Send the cached messages to a new subscription """
+        if not message or message[0] != 1:
+            return
+
+        prefix = message[1:].decode(errors='replace')
+        for topic, frames in self.last_messages.items():
+            if topic.startswith(prefix):
+                self.logger.debug("Sending cached {} message for subscription to '{}'",
+                                  topic, prefix)
+                self._send(frames)
+
+    def _send(self, frames):
+        try:
+            self.backend.send_multipart(frames, flags=zmq.NOBLOCK)
+            return True
+        except zmq.Again:
+            return False
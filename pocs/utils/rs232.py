@@ -1,5 +1,6 @@
 """Provides SerialData, a PySerial wrapper."""
 
+import collections
 import json
 import operator
 import serial
@@ -23,11 +24,180 @@ def _parse_json(line, logger, min_error_pos=0):
         if e.pos >= min_error_pos and line[e.pos:].startswith('nan'):
             new_line = line[0:e.pos] + 'NaN' + line[e.pos + 3:]
             return _parse_json(new_line, logger, min_error_pos=e.pos + 1)
-        logger.debug('Exception while parsing JSON: %r', e)
-        logger.debug('Erroneous JSON: %r', line)
+        if logger:
+            logger.debug('Exception while parsing JSON: %r', e)
+            logger.debug('Erroneous JSON: %r', line)
         return None
 
 
+class JsonLineParser(object):
+    """Splits a stream of bytes into lines and decodes the lines of JSON.
+
+    Bytes are added with `feed` as they arrive, in chunks of any size, and are
+    kept in a buffer until the end of their line arrives. A line that can't be
+    decoded is counted as an error and skipped; if it ends with a complete
+    JSON object (e.g. a fragment left from before a reset followed by a full
+    report) that object is still decoded. A line longer than `max_line_length`
+    is dropped up to the next newline, so that a device sending garbage can't
+    fill the memory.
+
+    `stats` reports the throughput, error rate and latency.
+    """
+
+    def __init__(self, max_line_length=4096, logger=None):
+        """Create a parser.
+
+        Args:
+            max_line_length (int, optional): Longest line kept, default 4096 bytes.
+            logger (`logging.logger` or None, optional): A logger instance. If left as None
+                then `pocs.utils.logger.get_root_logger` will be called.
+        """
+        self.max_line_length = max_line_length
+        self.logger = logger or get_root_logger()
+
+        self._buffer = bytearray()
+        self._discarding = False
+        self._line_start = None
+        self.reset_stats()
+
+    def feed(self, data, timestamp=None):
+        """Add bytes from the device.
+
+        Args:
+            data (bytes): The bytes read.
+            timestamp (optional): Timestamp of the readings completed by the
+                data, default the current time as for `SerialData.get_reading`.
+
+        Returns:
+            list: (timestamp, decoded value) of each complete line of JSON.
+        """
+        if not data:
+            return list()
+
+        now = time.monotonic()
+        if timestamp is None:
+            timestamp = time.strftime('%Y-%m-%dT%H:%M:%S %Z', time.gmtime())
+        if self._first_time is None:
+            self._first_time = now
+        self._last_time = now
+        self._num_bytes += len(data)
+
+        if self._line_start is None:
+            self._line_start = now
+
+        readings = list()
+        start = len(self._buffer)
+        self._buffer += data
+        while True:
+            end = self._buffer.find(b'\n', start)
+            if end < 0:
+                break
+            line = bytes(self._buffer[:end])
+            del self._buffer[:end + 1]
+            start = 0
+
+            if self._discarding:
+                self._discarding = False
+            else:
+                value = self._parse_line(line, now)
+                if value is not None:
+                    readings.append((timestamp, value))
+            self._line_start = now if self._buffer else None
+
+        if len(self._buffer) > self.max_line_length:
+            self.logger.debug('Dropping line longer than {} bytes', self.max_line_length)
+            self._buffer.clear()
+            self._discarding = True
+            self._num_errors += 1
+            self._line_start = None
+
+        return readings
+
+    def clear(self):
+        """Drop the bytes of the incomplete line """
+        self._buffer.clear()
+        self._discarding = False
+        self._line_start = None
+
+    def reset_stats(self):
+        """Restart the counts of `stats` """
+        self._num_bytes = 0
+        self._num_lines = 0
+        self._num_readings = 0
+        self._num_errors = 0
+        self._total_latency = 0.
+        self._max_latency = 0.
+        self._first_time = None
+        self._last_time = None
+
+    def stats(self):
+        """Throughput, error rate and latency since the last `reset_stats`.
+
+        Returns:
+            dict: The numbers of `bytes`, `lines`, `readings` and `errors`, the
+                `error_rate` (errors per line), `bytes_per_second` and
+                `readings_per_second` from the first to the last data, and the
+                `mean_latency` and `max_latency`, the seconds from the arrival
+                of the first byte of a line to its end.
+        """
+        duration = 0.
+        if self._first_time is not None:
+            duration = self._last_time - self._first_time
+
+        def rate(count):
+            return count / duration if duration > 0 else 0.
+
+        return {
+            'bytes': self._num_bytes,
+            'lines': self._num_lines,
+            'readings': self._num_readings,
+            'errors': self._num_errors,
+            'error_rate': self._num_errors / self._num_lines if self._num_lines else 0.,
+            'bytes_per_second': rate(self._num_bytes),
+            'readings_per_second': rate(self._num_readings),
+            'mean_latency': self._total_latency / self._num_lines if self._num_lines else 0.,
+            'max_latency': self._max_latency,
+        }
+
+    @property
+    def num_lines(self):
+        """Number of complete lines seen, including those with errors """
+        return self._num_lines
+
+    def _parse_line(self, line, now):
+        line = line.strip()
+        if not line:
+            return None
+
+        self._num_lines += 1
+        if self._line_start is not None:
+            latency = now - self._line_start
+            self._total_latency += latency
+            self._max_latency = max(self._max_latency, latency)
+
+        try:
+            text = line.decode('ascii')
+        except UnicodeDecodeError:
+            self._num_errors += 1
+            self.logger.debug('Non-ASCII line: {!r}', line)
+            return None
+
+        value = _parse_json(text, self.logger)
+        if not value:
+            # Resync on a complete object at the end of the line.
+            pos = text.find('{', 1)
+            while value is None and pos > 0:
+                value = _parse_json(text[pos:], None)
+                pos = text.find('{', pos + 1)
+
+            self._num_errors += 1
+            if not value:
+                return None
+
+        self._num_readings += 1
+        return value
+
+
 # Note: get_serial_port_info is replaced by tests to override the normal
 # behavior, so don't change the name without fixing the tests.
 def get_serial_port_info():
@@ -132,6 +302,10 @@ class SerialData(object):
 
         self.ser = serial.serial_for_url(port, do_not_open=True)
 
+        # Splits the input of get_and_parse_reading into lines.
+        self.parser = JsonLineParser(logger=self.logger)
+        self._readings = collections.deque()
+
         # Configure the PySerial class.
         self.ser.baudrate = baudrate
         self.ser.bytesize = serial.EIGHTBITS
@@ -269,21 +443,50 @@ class SerialData(object):
     def get_and_parse_reading(self, retry_limit=5):
         """Reads a line of JSON text and returns the decoded value, along with the current time.
 
+        The input is read in chunks of whatever has arrived (waiting up to the timeout
+        for the first byte) and split into lines by `parser`, so more than one reading
+        may be decoded by a read; the others are returned by the next calls. Mixing
+        this with `read` may split a line between the two.
+
         Args:
-            retry_limit: Number of lines to read in an attempt to get one that parses as JSON.
+            retry_limit: Number of lines to read in an attempt to get one that parses as JSON,
+                and of reads that time out before giving up.
 
         Returns:
             A pair (tuple) of (timestamp, decoded JSON line). The timestamp is the time of
-            completion of the readline operation.
+            arrival of the end of the line.
         """
-        for _ in range(max(1, retry_limit)):
-            (ts, line) = self.get_reading()
-            if not line:
+        retry_limit = max(1, retry_limit)
+        num_timeouts = 0
+        first_line = self.parser.num_lines
+        while not self._readings:
+            if (num_timeouts >= retry_limit or
+                    self.parser.num_lines - first_line >= retry_limit):
+                return None
+
+            data = self.read_available()
+            if not data:
+                num_timeouts += 1
                 continue
-            data = _parse_json(line, self.logger)
-            if data:
-                return (ts, data)
-        return None
+
+            self._readings.extend(self.parser.feed(data))
+
+        return self._readings.popleft()
+
+    def read_available(self):
+        """Read the bytes that have arrived, waiting up to the timeout for the first one.
+
+        Returns:
+            Bytes read from the port, empty if none arrived before the timeout.
+        """
+        assert self.ser
+        assert self.ser.isOpen()
+        data = self.ser.read(1)
+        if data:
+            waiting = self.ser.in_waiting
+            if waiting:
+                data += self.ser.read(waiting)
+        return data
 
     def reset_input_buffer(self):
         """Clear buffered data from connected port/device.
@@ -294,6 +497,8 @@ class SerialData(object):
         requires tossing out a fragment of a line).
         """
         self.ser.reset_input_buffer()
+        self.parser.clear()
+        self._readings.clear()
 
     def __del__(self):
         """Close the serial device on delete.
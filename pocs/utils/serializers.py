@@ -1,4 +1,20 @@
+import struct
+
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
+
+import numpy as np
+
+from astropy import units as u
+from astropy.time import Time
 from bson import json_util
+from bson import ObjectId
+
+try:  # pragma: no cover
+    import msgpack
+except ImportError:  # pragma: no cover
+    msgpack = None
 
 
 def dumps(obj):
@@ -63,3 +79,332 @@ def loads_file(file_path):
         obj = loads(f.read())
 
     return obj
+
+
+##################################################################################################
+# Binary encoding
+##################################################################################################
+
+# Version of the binary encoding. Increment when the encoding of a registered
+# type changes, so that readers can tell which messages they can decode.
+BINARY_VERSION = 1
+
+# Registered types: a list of (code, class, encode, decode). `encode` returns
+# the bytes for an object of the class and `decode` the object from them.
+_binary_types = list()
+
+
+def register_binary_type(code, cls, encode, decode):
+    """Register the binary encoding of a type.
+
+    Objects of a registered type are stored as msgpack extension values and
+    decoded to the same type, rather than being turned into plain values.
+
+    Args:
+        code (int): Extension type code, 0 to 127. Codes of the types registered
+            in this module are below 16.
+        cls (type): The class to encode, including subclasses.
+        encode (callable): Function of an object returning bytes.
+        decode (callable): Function of the bytes returning the object.
+    """
+    if not 0 <= code <= 127:
+        raise ValueError('Extension type code must be 0 to 127, got {}'.format(code))
+
+    for i, (other_code, other_cls, _, _) in enumerate(_binary_types):
+        if other_code == code or other_cls is cls:
+            del _binary_types[i]
+            break
+
+    _binary_types.append((code, cls, encode, decode))
+
+
+def dumps_binary(obj):
+    """Dump an object to the binary (msgpack) encoding.
+
+    Dicts, lists, tuples, strings, bytes, numbers (including numpy scalars and
+    arrays), booleans and None are stored as msgpack values. Registered types
+    (by default `astropy.units.Quantity`, `astropy.time.Time`, `bson.ObjectId`
+    and `datetime.datetime`) are stored as extension values, and anything else
+    as its string.
+
+    The `msgpack` package is used if installed, otherwise an equivalent pure
+    Python encoder, so the output can be read by either.
+
+    Args:
+        obj: An object to serialize.
+
+    Returns:
+        bytes: Serialized representation of object.
+    """
+    if msgpack is not None:
+        return msgpack.packb(obj, default=_to_msgpack, use_bin_type=True)
+
+    out = bytearray()
+    _pack(obj, out)
+    return bytes(out)
+
+
+def loads_binary(data):
+    """Load an object from the binary (msgpack) encoding.
+
+    Args:
+        data (bytes): Serialized representation of the object.
+
+    Returns:
+        The loaded object, with registered types decoded.
+
+    Raises:
+        ValueError: If the data is not valid.
+    """
+    if msgpack is not None:
+        try:
+            return msgpack.unpackb(data, ext_hook=_from_ext, raw=False)
+        except msgpack.exceptions.UnpackException as e:
+            raise ValueError('Invalid binary data: {}'.format(e))
+
+    try:
+        obj, offset = _unpack(memoryview(data), 0)
+    except (IndexError, struct.error, UnicodeDecodeError) as e:
+        raise ValueError('Invalid binary data: {}'.format(e))
+    if offset != len(data):
+        raise ValueError('Invalid binary data: {} extra bytes'.format(len(data) - offset))
+    return obj
+
+
+def _to_msgpack(obj):
+    """Convert an object msgpack can't store, the `default` of `msgpack.packb` """
+    for code, cls, encode, _ in _binary_types:
+        if isinstance(obj, cls):
+            return msgpack.ExtType(code, encode(obj))
+
+    return _to_plain(obj)
+
+
+def _to_plain(obj):
+    """Numpy values as lists or Python scalars, anything else as its string """
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+
+    return str(obj)
+
+
+def _from_ext(code, data):
+    for other_code, _, _, decode in _binary_types:
+        if other_code == code:
+            return decode(bytes(data))
+
+    raise ValueError('Unknown extension type: {}'.format(code))
+
+
+def _pack(obj, out):
+    """Pure Python msgpack encoder, appending the encoding of `obj` to `out` """
+    if obj is None:
+        out.append(0xc0)
+    elif obj is True:
+        out.append(0xc3)
+    elif obj is False:
+        out.append(0xc2)
+    elif isinstance(obj, int):
+        if 0 <= obj < 0x80:
+            out.append(obj)
+        elif -32 <= obj < 0:
+            out.append(obj & 0xff)
+        elif -2**63 <= obj < 2**63:
+            out += _INT64.pack(0xd3, obj)
+        elif 0 <= obj < 2**64:
+            out += _UINT64.pack(0xcf, obj)
+        else:
+            _pack(str(obj), out)
+    elif isinstance(obj, float):
+        out += _FLOAT64.pack(0xcb, obj)
+    elif isinstance(obj, str):
+        data = obj.encode('utf-8')
+        _pack_header(out, len(data), 0xa0, 32, 0xd9, 0xda, 0xdb)
+        out += data
+    elif isinstance(obj, (bytes, bytearray, memoryview)):
+        data = bytes(obj)
+        _pack_header(out, len(data), None, 0, 0xc4, 0xc5, 0xc6)
+        out += data
+    elif isinstance(obj, dict):
+        _pack_header(out, len(obj), 0x80, 16, None, 0xde, 0xdf)
+        for key, value in obj.items():
+            _pack(key, out)
+            _pack(value, out)
+    elif isinstance(obj, (list, tuple)):
+        _pack_header(out, len(obj), 0x90, 16, None, 0xdc, 0xdd)
+        for value in obj:
+            _pack(value, out)
+    else:
+        for code, cls, encode, _ in _binary_types:
+            if isinstance(obj, cls):
+                data = encode(obj)
+                _pack_ext_header(out, len(data), code)
+                out += data
+                break
+        else:
+            _pack(_to_plain(obj), out)
+
+
+def _pack_header(out, size, fix_code, fix_size, code8, code16, code32):
+    if fix_code is not None and size < fix_size:
+        out.append(fix_code | size)
+    elif code8 is not None and size < 0x100:
+        out += struct.pack('>BB', code8, size)
+    elif size < 0x10000:
+        out += struct.pack('>BH', code16, size)
+    else:
+        out += struct.pack('>BI', code32, size)
+
+
+def _pack_ext_header(out, size, code):
+    if size in _FIXEXT_CODES:
+        out += struct.pack('>Bb', _FIXEXT_CODES[size], code)
+    elif size < 0x100:
+        out += struct.pack('>BBb', 0xc7, size, code)
+    elif size < 0x10000:
+        out += struct.pack('>BHb', 0xc8, size, code)
+    else:
+        out += struct.pack('>BIb', 0xc9, size, code)
+
+
+def _unpack(data, offset):
+    """Pure Python msgpack decoder, returning the object at `offset` and the next offset """
+    code = data[offset]
+    offset += 1
+
+    if code < 0x80:
+        return code, offset
+    if code >= 0xe0:
+        return code - 0x100, offset
+    if code <= 0x8f:
+        return _unpack_map(data, offset, code & 0x0f)
+    if code <= 0x9f:
+        return _unpack_array(data, offset, code & 0x0f)
+    if code <= 0xbf:
+        return _unpack_str(data, offset, code & 0x1f)
+    if code == 0xc0:
+        return None, offset
+    if code == 0xc2:
+        return False, offset
+    if code == 0xc3:
+        return True, offset
+
+    if code in _SIZED_CODES:
+        kind, size_format = _SIZED_CODES[code]
+        size = struct.unpack_from(size_format, data, offset)[0]
+        offset += struct.calcsize(size_format)
+        if kind == 'str':
+            return _unpack_str(data, offset, size)
+        if kind == 'bin':
+            return bytes(data[offset:offset + size]), offset + size
+        if kind == 'array':
+            return _unpack_array(data, offset, size)
+        if kind == 'map':
+            return _unpack_map(data, offset, size)
+        return _unpack_ext(data, offset, size)
+
+    if code in _FIXEXT_SIZES:
+        return _unpack_ext(data, offset, _FIXEXT_SIZES[code])
+
+    if code in _NUMBER_FORMATS:
+        number_format = _NUMBER_FORMATS[code]
+        value = struct.unpack_from(number_format, data, offset)[0]
+        return value, offset + struct.calcsize(number_format)
+
+    raise ValueError('Invalid binary data: unknown code {:#x}'.format(code))
+
+
+def _unpack_str(data, offset, size):
+    end = offset + size
+    if end > len(data):
+        raise IndexError('string past the end of the data')
+    return str(data[offset:end], 'utf-8'), end
+
+
+def _unpack_array(data, offset, size):
+    values = list()
+    for _ in range(size):
+        value, offset = _unpack(data, offset)
+        values.append(value)
+    return values, offset
+
+
+def _unpack_map(data, offset, size):
+    values = dict()
+    for _ in range(size):
+        key, offset = _unpack(data, offset)
+        values[key], offset = _unpack(data, offset)
+    return values, offset
+
+
+def _unpack_ext(data, offset, size):
+    code = struct.unpack_from('>b', data, offset)[0]
+    offset += 1
+    end = offset + size
+    if end > len(data):
+        raise IndexError('extension past the end of the data')
+    return _from_ext(code, data[offset:end]), end
+
+
+_INT64 = struct.Struct('>Bq')
+_UINT64 = struct.Struct('>BQ')
+_FLOAT64 = struct.Struct('>Bd')
+
+_FIXEXT_CODES = {1: 0xd4, 2: 0xd5, 4: 0xd6, 8: 0xd7, 16: 0xd8}
+_FIXEXT_SIZES = {code: size for size, code in _FIXEXT_CODES.items()}
+
+_SIZED_CODES = {
+    0xc4: ('bin', '>B'), 0xc5: ('bin', '>H'), 0xc6: ('bin', '>I'),
+    0xc7: ('ext', '>B'), 0xc8: ('ext', '>H'), 0xc9: ('ext', '>I'),
+    0xd9: ('str', '>B'), 0xda: ('str', '>H'), 0xdb: ('str', '>I'),
+    0xdc: ('array', '>H'), 0xdd: ('array', '>I'),
+    0xde: ('map', '>H'), 0xdf: ('map', '>I'),
+}
+
+_NUMBER_FORMATS = {
+    0xca: '>f', 0xcb: '>d',
+    0xcc: '>B', 0xcd: '>H', 0xce: '>I', 0xcf: '>Q',
+    0xd0: '>b', 0xd1: '>h', 0xd2: '>i', 0xd3: '>q',
+}
+
+
+def _encode_quantity(quantity):
+    return dumps_binary([quantity.value, quantity.unit.to_string()])
+
+
+def _decode_quantity(data):
+    value, unit = loads_binary(data)
+    return u.Quantity(value, unit)
+
+
+def _encode_time(time):
+    return dumps_binary([time.isot, time.scale])
+
+
+def _decode_time(data):
+    isot, scale = loads_binary(data)
+    return Time(isot, format='isot', scale=scale)
+
+
+def _encode_datetime(date):
+    offset = date.utcoffset()
+    if offset is not None:
+        offset = offset.total_seconds()
+    return dumps_binary([date.year, date.month, date.day, date.hour, date.minute, date.second,
+                         date.microsecond, offset])
+
+
+def _decode_datetime(data):
+    values = loads_binary(data)
+    tzinfo = None
+    if values[-1] is not None:
+        tzinfo = timezone(timedelta(seconds=values[-1]))
+    return datetime(*values[:-1], tzinfo=tzinfo)
+
+
+register_binary_type(1, u.Quantity, _encode_quantity, _decode_quantity)
+register_binary_type(2, Time, _encode_time, _decode_time)
+register_binary_type(3, ObjectId, lambda object_id: object_id.binary, ObjectId)
+register_binary_type(4, datetime, _encode_datetime, _decode_datetime)
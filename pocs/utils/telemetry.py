@@ -0,0 +1,403 @@
+import json
+import os
+
+from collections import OrderedDict
+from datetime import datetime
+from datetime import timedelta
+from datetime import timezone
+
+import numpy as np
+
+# Fixed columns of the weather archive, the values from `peas.weather.AAGCloudSensor`.
+WEATHER_COLUMNS = OrderedDict([
+    ('date', 'M8[ms]'),
+    ('safe', '?'),
+    ('ambient_temp_C', 'f4'),
+    ('sky_temp_C', 'f4'),
+    ('rain_sensor_temp_C', 'f4'),
+    ('rain_frequency', 'f4'),
+    ('wind_speed_KPH', 'f4'),
+    ('internal_voltage_V', 'f4'),
+    ('ldr_resistance_Ohm', 'f4'),
+    ('pwm_value', 'f4'),
+    ('sky_condition', 'U16'),
+    ('wind_condition', 'U16'),
+    ('gust_condition', 'U16'),
+    ('rain_condition', 'U16'),
+])
+
+
+class TelemetryArchive(object):
+    """Columnar archive of the records of a collection, e.g. weather.
+
+    Records are stored in one directory per (UTC) day, with one file of raw
+    values per column and a `columns.json` file with the type of each column.
+    A day of one column can therefore be loaded without reading the other
+    columns and without any parsing, as a memory-mapped numpy array.
+
+    The columns are either fixed (`WEATHER_COLUMNS` is used for the weather),
+    or added as they are found in the records. Nested values are flattened
+    into columns named with the keys joined by dots, e.g. the environment
+    record ``{'camera_board': {'humidity': 40}}`` has a column
+    ``camera_board.humidity``. Missing values are stored as NaN (NaT for
+    dates), False or an empty string.
+
+    The archive can be written as records come in (see `append`) or from a
+    database (see `export`). Only one process should write to an archive.
+    """
+
+    def __init__(self, directory, collection, columns=None):
+        """Archive of a collection.
+
+        Args:
+            directory (str): Base directory of the archive.
+            collection (str): Name of the collection, the sub-directory used.
+            columns (dict, optional): Names and numpy types of the fixed columns,
+                default `WEATHER_COLUMNS` for the weather and found from the
+                records for other collections.
+        """
+        self.collection = collection
+        self.directory = os.path.join(directory, collection)
+
+        if columns is None and collection == 'weather':
+            columns = WEATHER_COLUMNS
+
+        self.fixed_columns = None
+        if columns is not None:
+            self.fixed_columns = OrderedDict([('date', 'M8[ms]')])
+            self.fixed_columns.update(columns)
+
+        self._schemas = dict()
+
+    def days(self):
+        """Sorted days in the archive, as YYYYMMDD strings """
+        try:
+            return sorted(d for d in os.listdir(self.directory)
+                          if os.path.exists(self._schema_file(d)))
+        except FileNotFoundError:
+            return list()
+
+    def columns(self, day):
+        """Names and numpy types of the columns of a day """
+        return OrderedDict(self._get_schema(day))
+
+    def append(self, records):
+        """Add records to the archive.
+
+        Args:
+            records (list of dict): Either records from the db, with the values
+                in `data`, or dicts of values with a `date` item.
+
+        Returns:
+            int: The number of records added.
+        """
+        days = OrderedDict()
+        for record in records:
+            date, values = _split_record(record)
+            if date is None:
+                continue
+            day = date.astype(datetime).strftime('%Y%m%d')
+            days.setdefault(day, list()).append((date, values))
+
+        for day, rows in days.items():
+            self._append_rows(day, rows)
+
+        return sum(len(rows) for rows in days.values())
+
+    def export(self, db, start=None, end=None, batch_size=1000):
+        """Add the records of the collection in a db to the archive.
+
+        Records with a date that is already in the archive are skipped, e.g.
+        those appended as they came in, so an export can safely be run again.
+
+        Args:
+            db (`pocs.utils.database.AbstractPanDB`): The db to read.
+            start (datetime.datetime, optional): Earliest date to export.
+            end (datetime.datetime, optional): Export records before this date.
+            batch_size (int, optional): Records written at a time, default 1000.
+
+        Returns:
+            int: The number of records added.
+        """
+        num_records = 0
+        batch = list()
+        archived_dates = dict()
+        for record in db.query(self.collection, start=start, end=end):
+            date = _record_date(record)
+            if date is None:
+                continue
+
+            date = _to_datetime64(date)
+            day = date.astype(datetime).strftime('%Y%m%d')
+            if day not in archived_dates:
+                archived_dates[day] = self._archived_dates(day)
+            if date in archived_dates[day]:
+                continue
+            archived_dates[day].add(date)
+
+            batch.append(record)
+            if len(batch) >= batch_size:
+                num_records += self.append(batch)
+                batch = list()
+
+        return num_records + self.append(batch)
+
+    def read(self, day, columns=None):
+        """Load a day of the archive.
+
+        Args:
+            day (str): The day as YYYYMMDD.
+            columns (list of str, optional): Columns to load, default all. Columns
+                not in the archive are skipped.
+
+        Returns:
+            dict: Read-only, memory-mapped array of each column.
+        """
+        schema = self._get_schema(day)
+        num_rows = self._num_rows(day, schema)
+
+        if columns is None:
+            columns = schema.keys()
+
+        arrays = OrderedDict()
+        for name in columns:
+            if name not in schema:
+                continue
+            dtype = np.dtype(schema[name])
+            if num_rows == 0:
+                arrays[name] = np.empty(0, dtype=dtype)
+            else:
+                arrays[name] = np.memmap(self._column_file(day, name), dtype=dtype, mode='r',
+                                         shape=(num_rows, ))
+
+        return arrays
+
+    def read_range(self, start=None, end=None, columns=None):
+        """Load the records in a range of time.
+
+        Args:
+            start (datetime.datetime, optional): Earliest date, UTC if it has no time zone.
+            end (datetime.datetime, optional): Records must be before this date.
+            columns (list of str, optional): Columns to load, default all.
+
+        Returns:
+            dict: Array of each column (copies, not memory-mapped).
+        """
+        if start is not None:
+            start = _to_datetime64(start)
+        if end is not None:
+            end = _to_datetime64(end)
+
+        if columns is not None and 'date' not in columns:
+            columns = ['date'] + list(columns)
+
+        first_day = start.astype(datetime).strftime('%Y%m%d') if start is not None else ''
+        last_day = end.astype(datetime).strftime('%Y%m%d') if end is not None else '99999999'
+
+        parts = list()
+        for day in self.days():
+            if day < first_day or day > last_day:
+                continue
+
+            arrays = self.read(day, columns=columns)
+            keep = np.ones(len(arrays['date']), dtype=bool)
+            if start is not None:
+                keep &= arrays['date'] >= start
+            if end is not None:
+                keep &= arrays['date'] < end
+            parts.append({name: values[keep] for name, values in arrays.items()})
+
+        names = OrderedDict()
+        for part in parts:
+            for name, values in part.items():
+                names.setdefault(name, values.dtype)
+
+        result = OrderedDict()
+        for name, dtype in names.items():
+            result[name] = np.concatenate([
+                part[name] if name in part else _missing_values(dtype, len(part['date']))
+                for part in parts
+            ]).astype(dtype, copy=False)
+
+        return result
+
+    def _archived_dates(self, day):
+        """Set of the dates archived for a day """
+        dates = self.read(day, columns=['date']).get('date')
+        if dates is None:
+            return set()
+        return set(np.array(dates))
+
+    def _append_rows(self, day, rows):
+        os.makedirs(self._day_directory(day), exist_ok=True)
+
+        schema = self._get_schema(day)
+        num_rows = self._num_rows(day, schema)
+        changed = len(schema) == 0
+
+        if self.fixed_columns is not None:
+            if changed:
+                schema.update(self.fixed_columns)
+        else:
+            schema.setdefault('date', 'M8[ms]')
+            for _, values in rows:
+                for name, value in values.items():
+                    if name not in schema:
+                        dtype = _get_dtype(value)
+                        if dtype is None:
+                            continue
+                        schema[name] = dtype
+                        changed = True
+
+                        # Fill in the earlier rows of a new column.
+                        with open(self._column_file(day, name), 'wb') as f:
+                            f.write(_missing_values(np.dtype(dtype), num_rows).tobytes())
+
+        for name, dtype in schema.items():
+            dtype = np.dtype(dtype)
+            if name == 'date':
+                column = np.array([date for date, _ in rows], dtype=dtype)
+            else:
+                column = _missing_values(dtype, len(rows))
+                for i, (_, values) in enumerate(rows):
+                    value = values.get(name)
+                    if value is None:
+                        continue
+                    try:
+                        column[i] = _to_datetime64(value) if dtype.kind == 'M' else value
+                    except (TypeError, ValueError, AttributeError):
+                        pass
+
+            with open(self._column_file(day, name), 'ab') as f:
+                f.write(column.tobytes())
+
+        if changed:
+            self._write_schema(day, schema)
+
+    def _get_schema(self, day):
+        try:
+            return self._schemas[day]
+        except KeyError:
+            pass
+
+        try:
+            with open(self._schema_file(day), 'r') as f:
+                schema = json.load(f, object_pairs_hook=OrderedDict)
+        except FileNotFoundError:
+            schema = OrderedDict()
+
+        self._schemas[day] = schema
+        return schema
+
+    def _write_schema(self, day, schema):
+        tmp_file = self._schema_file(day) + '.tmp'
+        with open(tmp_file, 'w') as f:
+            json.dump(schema, f, indent=2)
+        os.replace(tmp_file, self._schema_file(day))
+
+    def _num_rows(self, day, schema):
+        """Rows in all columns, after trimming any rows partly written by a crash """
+        sizes = dict()
+        for name, dtype in schema.items():
+            try:
+                size = os.path.getsize(self._column_file(day, name))
+                sizes[name] = size // np.dtype(dtype).itemsize
+            except FileNotFoundError:
+                sizes[name] = 0
+
+        num_rows = min(sizes.values()) if sizes else 0
+        for name, size in sizes.items():
+            if size > num_rows:
+                os.truncate(self._column_file(day, name),
+                            num_rows * np.dtype(schema[name]).itemsize)
+
+        return num_rows
+
+    def _day_directory(self, day):
+        return os.path.join(self.directory, day)
+
+    def _schema_file(self, day):
+        return os.path.join(self._day_directory(day), 'columns.json')
+
+    def _column_file(self, day, name):
+        return os.path.join(self._day_directory(day), name + '.bin')
+
+
+def flatten_record(data, prefix=''):
+    """Flatten nested dicts and lists into a dict with dotted keys.
+
+    Args:
+        data (dict): The values, e.g. the `data` of a db record.
+        prefix (str, optional): Prefix for the keys.
+
+    Returns:
+        dict: The values that are not a dict or list, by dotted key.
+    """
+    if isinstance(data, dict):
+        items = data.items()
+    else:
+        items = enumerate(data)
+
+    values = dict()
+    for key, value in items:
+        name = '{}{}'.format(prefix, key)
+        if isinstance(value, (dict, list, tuple)):
+            values.update(flatten_record(value, prefix=name + '.'))
+        else:
+            values[name] = value
+
+    return values
+
+
+def _record_values(record):
+    """Values of a db record or dict of values """
+    if 'data' in record and isinstance(record['data'], dict):
+        return record['data']
+    return record
+
+
+def _record_date(record):
+    """Date of a db record or dict of values, None if it has no date """
+    return record.get('date', _record_values(record).get('date'))
+
+
+def _split_record(record):
+    """Date and flat values of a db record or dict of values """
+    values = _record_values(record)
+    date = _record_date(record)
+
+    if date is None:
+        return None, None
+
+    values = flatten_record({key: value for key, value in values.items() if key != 'date'})
+    return _to_datetime64(date), values
+
+
+def _to_datetime64(date):
+    """Datetime (UTC if no time zone), ISO string or unix time as a numpy datetime64 in ms """
+    if isinstance(date, datetime) and date.tzinfo is not None:
+        date = date.astimezone(timezone.utc).replace(tzinfo=None)
+    if isinstance(date, (int, float)):
+        date = datetime(1970, 1, 1) + timedelta(seconds=date)
+    return np.datetime64(date, 'ms')
+
+
+def _get_dtype(value):
+    """Numpy type of the column for a value, or None if it can't be stored """
+    if isinstance(value, (bool, np.bool_)):
+        return '?'
+    if isinstance(value, (int, float, np.number)):
+        return 'f8'
+    if isinstance(value, datetime):
+        return 'M8[ms]'
+    if isinstance(value, str):
+        return 'U32'
+    return None
+
+
+def _missing_values(dtype, size):
+    if dtype.kind == 'f':
+        return np.full(size, np.nan, dtype=dtype)
+    if dtype.kind == 'M':
+        return np.full(size, np.datetime64('NaT'), dtype=dtype)
+    return np.zeros(size, dtype=dtype)
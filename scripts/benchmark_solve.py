@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from pocs.images import Image
+from pocs.utils import error
+from pocs.utils.images import fits as fits_utils
+
+
+def time_solves(fits_file, num_solves, **kwargs):
+    """Solve copies of `fits_file` and return the wall-time of each solve """
+    times = list()
+    for _ in range(num_solves):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            image = Image(shutil.copy(fits_file, tmpdir))
+
+            start = time.monotonic()
+            try:
+                image.solve_field(skip_solved=False, **kwargs)
+            except (error.SolveError, error.Timeout) as e:
+                print('Solve failed: {}'.format(e))
+                continue
+            times.append(time.monotonic() - start)
+
+    return times
+
+
+def print_times(name, times):
+    if len(times) == 0:
+        print('{:10} no solves'.format(name))
+    else:
+        print('{:10} {:3d} solves  mean {:6.2f} s  median {:6.2f} s  max {:6.2f} s'.format(
+            name, len(times), np.mean(times), np.median(times), np.max(times)))
+
+
+if __name__ == '__main__':
+    data_dir = os.path.join(os.getenv('POCS'), 'pocs', 'tests', 'data')
+
+    parser = argparse.ArgumentParser(
+        description='Compare blind and hinted plate solves of the bundled test images.')
+    parser.add_argument(
+        '--fits-file', default=os.path.join(data_dir, 'unsolved.fits'),
+        help='Image to solve, default the unsolved test image.')
+    parser.add_argument(
+        '--solved-file', default=os.path.join(data_dir, 'solved.fits.fz'),
+        help='Earlier solve of the same field used for the hints, default the solved test image.')
+    parser.add_argument(
+        '--num-solves', default=3, type=int, help='Number of solves of each kind.')
+    parser.add_argument(
+        '--radius', default=2., type=float, help='Search radius in degrees for hinted solves.')
+    args = parser.parse_args()
+
+    cache = fits_utils.SolveCache(radius=args.radius)
+    cache.update('benchmark', fits_utils.getheader(args.solved_file))
+    hints = cache.get_hints('benchmark')
+    print('Hints: {}'.format(hints))
+
+    print_times('Blind', time_solves(args.fits_file, args.num_solves))
+    print_times('Hinted', time_solves(args.fits_file, args.num_solves, **hints))
@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+
+import argparse
+import time
+
+from dateutil.parser import parse as date_parser
+
+from pocs.utils.config import load_config
+from pocs.utils.database import PanDB
+from pocs.utils.telemetry import TelemetryArchive
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Export weather and environment records to the columnar telemetry archive.')
+    parser.add_argument(
+        '--archive-dir', default=None,
+        help='Archive directory, default the telemetry_archive directory in the peas config.')
+    parser.add_argument(
+        '--collection', action='append', dest='collections',
+        help='Collection to export, can be repeated. Default weather and environment.')
+    parser.add_argument('--start', default=None, help='Earliest date (UTC) to export.')
+    parser.add_argument('--end', default=None, help='Export records before this date (UTC).')
+    parser.add_argument('--db-type', default=None, help='Database type, default from the config.')
+    parser.add_argument('--db-name', default=None, help='Database name, default from the config.')
+    args = parser.parse_args()
+
+    archive_dir = args.archive_dir
+    if archive_dir is None:
+        archive_dir = load_config(config_files='peas')['telemetry_archive']['directory']
+
+    start = date_parser(args.start) if args.start else None
+    end = date_parser(args.end) if args.end else None
+
+    db = PanDB(db_type=args.db_type, db_name=args.db_name)
+
+    for collection in args.collections or ['weather', 'environment']:
+        t0 = time.monotonic()
+        archive = TelemetryArchive(archive_dir, collection)
+        num_records = archive.export(db, start=start, end=end)
+        print('{:12} {:8d} records in {:.1f} s'.format(
+            collection, num_records, time.monotonic() - t0))
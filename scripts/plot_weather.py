@@ -38,7 +38,7 @@ class WeatherPlotter(object):
 
     """ Plot weather information for a given time span """
 
-    def __init__(self, date_string=None, data_file=None, *args, **kwargs):
+    def __init__(self, date_string=None, data_file=None, archive_dir=None, *args, **kwargs):
         super(WeatherPlotter, self).__init__()
         self.args = args
         self.kwargs = kwargs
@@ -69,7 +69,7 @@ class WeatherPlotter(object):
 
         self.twilights = self.get_twilights(location_cfg)
 
-        self.table = self.get_table_data(data_file)
+        self.table = self.get_table_data(data_file, archive_dir=archive_dir)
 
         if self.table is None:
             warnings.warn("No data")
@@ -117,10 +117,11 @@ class WeatherPlotter(object):
         self.plot_pwm_vs_time()
         self.save_plot(plot_filename=output_file)
 
-    def get_table_data(self, data_file):
+    def get_table_data(self, data_file, archive_dir=None):
         """ Get the table data
 
-        If a `data_file` (csv) is passed, read from that, otherwise use mongo
+        If a `data_file` (csv) is passed, read from that, otherwise use the columnar
+        archive in `archive_dir` (see `pocs.utils.telemetry`) or else the database
 
         """
         table = None
@@ -137,7 +138,19 @@ class WeatherPlotter(object):
                       'U15', bool, 'f4',
                       'f4', 'O')
 
-        if data_file is not None:
+        if data_file is None and archive_dir is not None:
+            from pocs.utils.telemetry import TelemetryArchive
+
+            print('  Retrieving data from archive')
+            archive = TelemetryArchive(archive_dir, 'weather')
+            columns = archive.read_range(self.start, self.end, columns=col_names)
+            if len(columns) == 0 or len(columns['date']) == 0:
+                return None
+
+            table = Table([columns.get(name, np.full(len(columns['date']), np.nan))
+                           for name in col_names], names=col_names)
+            table['date'] = columns['date'].astype(dt)
+        elif data_file is not None:
             if data_file.endswith('.json'):
                 weather_entries = list()
                 with open(data_file) as df:
@@ -153,16 +166,13 @@ class WeatherPlotter(object):
                 table = Table.from_pandas(pd.read_csv(data_file, parse_dates=True))
         else:
             # -------------------------------------------------------------------------
-            # Grab data from Mongo
+            # Grab data from the database
             # -------------------------------------------------------------------------
-            import pymongo
             from pocs.utils.database import PanDB
 
-            print('  Retrieving data from Mongo database')
+            print('  Retrieving data from database')
             db = PanDB()
-            entries = [x for x in db.weather.find(
-                {'date': {'$gt': self.start, '$lt': self.end}}).sort([
-                    ('date', pymongo.ASCENDING)])]
+            entries = db.query('weather', self.start, self.end, fields=col_names)
 
             table = Table(names=col_names, dtype=col_dtypes)
 
@@ -754,11 +764,14 @@ if __name__ == '__main__':
                         help="Filename for data file")
     parser.add_argument("-o", "--plot_file", type=str, dest="plot_file", default=None,
                         help="Filename for generated plot")
+    parser.add_argument("-a", "--archive", type=str, dest="archive_dir", default=None,
+                        help="Directory of the telemetry archive to read")
     parser.add_argument('--plotly-user', help="Username for plotly publishing")
     parser.add_argument('--plotly-api-key', help="API for plotly publishing")
     args = parser.parse_args()
 
-    wp = WeatherPlotter(date_string=args.date, data_file=args.data_file)
+    wp = WeatherPlotter(date_string=args.date, data_file=args.data_file,
+                        archive_dir=args.archive_dir)
     wp.make_plot(args.plot_file)
 
     if args.plotly_user and args.plotly_api_key:
@@ -7,7 +7,7 @@ import time
 
 from pocs.utils.config import load_config
 from pocs.utils.logger import get_root_logger
-from pocs.utils.messaging import PanMessaging
+from pocs.utils.messaging import MessageHub
 
 the_root_logger = None
 
@@ -25,21 +25,23 @@ def say(fmt, *args, error=False):
         the_root_logger.info(msg)
 
 
-def run_forwarder(sub_port, pub_port, sub, pub):
+def run_forwarder(hub):
     try:
-        PanMessaging.run_forwarder(sub, pub)
+        hub.run()
     finally:
-        say('Forwarder for {} -> {} has stopped', sub_port, pub_port)
+        say('Forwarder for {} -> {} has stopped', hub.sub_port, hub.pub_port)
 
 
-def run_forwarders(port_pairs):
+def run_forwarders(port_pairs, stats_interval=60, nodrop=False):
+    """Run a hub for each (sub_port, pub_port, cache_topics) of `port_pairs` """
     the_root_logger.info('Creating sockets')
 
-    socket_pairs = []
-    for sub, pub in port_pairs:
-        say('Creating sockets for {} -> {}', sub, pub)
+    hubs = []
+    for sub, pub, cache_topics in port_pairs:
+        say('Creating sockets for {} -> {}, caching topics {}', sub, pub, cache_topics)
         try:
-            socket_pairs.append(PanMessaging.create_forwarder_sockets(sub, pub))
+            hubs.append(MessageHub(sub, pub, cache_topics=cache_topics,
+                                   stats_interval=stats_interval, nodrop=nodrop))
         except Exception as e:
             say('Unable to create sockets: {}', e, error=True)
             sys.exit(1)
@@ -47,12 +49,9 @@ def run_forwarders(port_pairs):
     say('Starting forwarders')
 
     threads = []
-    for ports, sockets in zip(port_pairs, socket_pairs):
-        sub_port, pub_port = ports
-        name = 'fwd_{}_to_{}'.format(sub_port, pub_port)
-        sub, pub = sockets
-        t = threading.Thread(
-            target=run_forwarder, name=name, args=(sub_port, pub_port, sub, pub), daemon=True)
+    for hub in hubs:
+        name = 'fwd_{}_to_{}'.format(hub.sub_port, hub.pub_port)
+        t = threading.Thread(target=run_forwarder, name=name, args=(hub, ), daemon=True)
         the_root_logger.info('Starting thread {}', name)
         t.start()
         threads.append(t)
@@ -100,7 +99,25 @@ if __name__ == '__main__':
     parser.add_argument(
         '--from_config',
         action='store_true',
-        help='Read ports from the pocs.yaml and pocs_local.yaml config files.')
+        help='Read ports from the pocs.yaml and pocs_local.yaml config files, and the '
+        'topics cached for the message port from messaging.cache_topics.')
+    parser.add_argument(
+        '--cache-topic',
+        dest='cache_topics',
+        action='append',
+        default=[],
+        help='Prefix of topics for which the last message is sent to new subscribers, '
+        'for the ports given with --pair and --port.')
+    parser.add_argument(
+        '--stats-interval',
+        default=60.,
+        type=float,
+        help='Seconds between the HUB-STATS messages with the counts of each topic.')
+    parser.add_argument(
+        '--nodrop',
+        action='store_true',
+        help='Count the messages that a subscriber is too slow to receive. The message '
+        'is then not sent to any subscriber.')
     args = parser.parse_args()
 
     def arg_error(msg):
@@ -121,19 +138,23 @@ if __name__ == '__main__':
 
     sub_and_pub_pairs = []
 
-    def add_pair(sub, pub=None):
+    def add_pair(sub, pub=None, cache_topics=None):
         validate_unique_port(sub)
         if pub is None:
             pub = sub + 1
         elif sub == pub:
             arg_error('Port pair {} -> {} invalid. Ports must be distinct.'.format(sub, pub))
         validate_unique_port(pub)
-        sub_and_pub_pairs.append((sub, pub))
+        if cache_topics is None:
+            cache_topics = args.cache_topics
+        sub_and_pub_pairs.append((sub, pub, cache_topics))
 
     if args.from_config:
         config = load_config(config_files=['pocs'])
-        add_pair(config['messaging']['cmd_port'])
-        add_pair(config['messaging']['msg_port'])
+        # Never cache the commands, a new subscriber must not act on an old one.
+        add_pair(config['messaging']['cmd_port'], cache_topics=[])
+        add_pair(config['messaging']['msg_port'],
+                 cache_topics=config['messaging'].get('cache_topics', []))
 
     if args.pairs:
         for sub, pub in args.pairs:
@@ -148,4 +169,4 @@ if __name__ == '__main__':
 
     the_root_logger = get_root_logger()
 
-    run_forwarders(sub_and_pub_pairs)
+    run_forwarders(sub_and_pub_pairs, stats_interval=args.stats_interval, nodrop=args.nodrop)
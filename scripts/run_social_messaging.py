@@ -1,14 +1,12 @@
 #!/usr/bin/env python
 
 import argparse
+import asyncio
 import sys
-import threading
-import time
-import zmq
 
 from pocs.utils.config import load_config
 from pocs.utils.logger import get_root_logger
-from pocs.utils.messaging import PanMessaging
+from pocs.utils.messaging import AsyncPanMessaging
 from pocs.utils.social_twitter import SocialTwitter
 from pocs.utils.social_slack import SocialSlack
 
@@ -28,66 +26,38 @@ def say(fmt, *args, error=False):
         the_root_logger.info(msg)
 
 
-def check_social_messages_loop(msg_port, social_twitter, social_slack):
-    cmd_social_subscriber = PanMessaging.create_subscriber(msg_port, 'PANCHAT')
-
-    poller = zmq.Poller()
-    poller.register(cmd_social_subscriber.socket, zmq.POLLIN)
+async def check_social_messages(msg_port, social_twitter, social_slack):
+    cmd_social_subscriber = AsyncPanMessaging.create_subscriber(msg_port, 'PANCHAT')
+    loop = asyncio.get_event_loop()
 
     try:
-        while True:
-            # Poll for messages
-            sockets = dict(poller.poll(500))  # 500 ms timeout
-
-            if cmd_social_subscriber.socket in sockets and \
-                    sockets[cmd_social_subscriber.socket] == zmq.POLLIN:
-
-                topic, msg_obj = cmd_social_subscriber.receive_message(flags=zmq.NOBLOCK)
+        async for topic, msg_obj in cmd_social_subscriber:
+            if msg_obj is None:
+                continue
 
-                # Check the various social sinks
-                if social_twitter is not None:
-                    social_twitter.send_message(msg_obj['message'], msg_obj['timestamp'])
-
-                if social_slack is not None:
-                    social_slack.send_message(msg_obj['message'], msg_obj['timestamp'])
-
-            time.sleep(1)
-    except KeyboardInterrupt:
-        pass
+            # Check the various social sinks. Sending blocks, so is done in
+            # the default executor to keep receiving messages.
+            for sink in (social_twitter, social_slack):
+                if sink is not None:
+                    await loop.run_in_executor(
+                        None, sink.send_message, msg_obj['message'], msg_obj['timestamp'])
+    finally:
+        cmd_social_subscriber.close()
 
 
 def run_social_sinks(msg_port, social_twitter, social_slack):
     the_root_logger.info('Creating sockets')
 
-    threads = []
-    
-    name='social_messaging'
-
-    t = threading.Thread(
-            target=check_social_messages_loop, name=name, args=(msg_port, social_twitter, social_slack), daemon=True)
-    the_root_logger.info('Starting thread {}', name)
-    t.start()
-    threads.append(t)
+    loop = asyncio.get_event_loop()
+    task = loop.create_task(check_social_messages(msg_port, social_twitter, social_slack))
 
-    time.sleep(0.05)
-    if not any([t.is_alive() for t in threads]):
-        say('Failed to start social sinks thread!', error=True)
-        sys.exit(1)
-    else:
-        the_root_logger.info('Started social messaging')
-        print()
-        print('Hit Ctrl-c to stop')
+    the_root_logger.info('Started social messaging')
+    print()
+    print('Hit Ctrl-c to stop')
     try:
-        # Keep running until they've all died.
-        while threads:
-            for t in threads:
-                t.join(timeout=100)
-                if t.is_alive():
-                    continue
-                say('Thread {} has stopped', t.name, error=True)
-                threads.remove(t)
-                break
-        # If we get here, then the forwarders died for some reason.
+        loop.run_until_complete(task)
+        # If we get here, then the subscriber stopped for some reason.
+        say('Social messaging has stopped', error=True)
         sys.exit(1)
     except KeyboardInterrupt:
         sys.exit(0)
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+
+import argparse
+import json
+import sys
+
+from astropy import units as u
+from astropy.time import Time
+
+from pocs.scheduler.simulation import ScheduleSimulation
+from pocs.utils import current_time
+
+
+def print_results(results):
+    print('{:23} {:>9} {:>10}  {}'.format('Time', 'Wall (ms)', 'Merit', 'Observation'))
+    for result in results:
+        merit = '{:10.2f}'.format(result['merit']) if result['merit'] is not None else ' ' * 10
+        print('{:23} {:9.1f} {}  {}'.format(
+            result['time'], result['wall_time'] * 1000, merit, result['observation'] or '-'))
+
+
+def print_summary(summary):
+    print()
+    print('Calls: {calls}  Decisions: {decisions}  Changes: {changed}'.format(**summary))
+    print('{:30} {:>10} {:>10} {:>10}'.format('Wall time (ms)', 'Mean', 'Median', 'Max'))
+
+    rows = [('Total', summary['total'])] + list(summary['constraints'].items())
+    for name, stats in rows:
+        print('{:30} {:10.2f} {:10.2f} {:10.2f}'.format(
+            name, stats['mean'] * 1000, stats['median'] * 1000, stats['max'] * 1000))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Replay the scheduler over one or more nights without hardware.')
+    parser.add_argument(
+        '--fields-file',
+        default=None,
+        help='Fields file to schedule, relative to the targets directory. '
+             'Defaults to the scheduler fields_file in the config.')
+    parser.add_argument(
+        '--start',
+        default=None,
+        help='Time from which to start, e.g. "2018-09-01 12:00:00" (UTC). Defaults to now.')
+    parser.add_argument(
+        '--nights', default=1, type=int, help='Number of nights to simulate.')
+    parser.add_argument(
+        '--step', default=5., type=float, help='Minutes between scheduling decisions.')
+    parser.add_argument(
+        '--output', default=None, help='Write the results and summary to this JSON file.')
+    parser.add_argument(
+        '--quiet', action='store_true', help='Only print the summary.')
+    args = parser.parse_args()
+
+    if args.nights < 1 or args.step <= 0:
+        print('--nights and --step must be positive', file=sys.stderr)
+        sys.exit(1)
+
+    start_time = Time(args.start) if args.start else current_time()
+
+    simulation = ScheduleSimulation(fields_file=args.fields_file)
+    results = simulation.run(start_time, num_nights=args.nights, time_step=args.step * u.minute)
+    summary = simulation.summary()
+
+    if not args.quiet:
+        print_results(results)
+    print_summary(summary)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'results': results, 'summary': summary}, f, indent=2)
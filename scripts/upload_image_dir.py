@@ -12,6 +12,8 @@ def main(directory,
          remove_jpgs=False,
          overwrite=False,
          make_timelapse=False,
+         max_workers=None,
+         max_rate=None,
          verbose=False,
          **kwargs):
     """Upload images from the given directory.
@@ -30,25 +32,37 @@ def main(directory,
         raise error.GoogleCloudError("Can't upload without a valid pan_id in the config")
 
     _print("Cleaning observation directory: {}".format(directory))
+    clean_error = None
     try:
         clean_observation_dir(directory,
                               remove_jpgs=remove_jpgs,
                               include_timelapse=make_timelapse,
                               timelapse_overwrite=overwrite,
+                              max_workers=max_workers,
                               verbose=verbose,
                               **kwargs)
     except Exception as e:
-        raise error.PanError('Cannot clean observation dir: {}'.format(e))
+        # Still upload the files, including any FITS files that couldn't be compressed.
+        clean_error = e
+        print('Problem cleaning observation dir: {}'.format(e))
 
     if upload:
         _print("Uploading to storage bucket")
 
+        # Options for the uploads, e.g. max_rate to limit the bandwidth used.
+        upload_options = dict(config.get('panoptes_network', {}).get('uploads', {}))
+        if max_rate is not None:
+            upload_options['max_rate'] = max_rate
+
         upload_observation_to_bucket(
             pan_id,
             directory,
             include_files='*',
-            exclude_files='upload_manifest.log',
-            verbose=verbose, **kwargs)
+            verbose=verbose, **upload_options, **kwargs)
+
+    # Fail after the upload so the cleanup is tried again.
+    if clean_error is not None:
+        raise error.PanError('Cannot clean observation dir: {}'.format(clean_error))
 
     return directory
 
@@ -68,6 +82,10 @@ if __name__ == '__main__':
                         help='Create a timelapse from the jpgs (requires ffmpeg), default False.')
     parser.add_argument('--overwrite', action='store_true', default=False,
                         help='Overwrite any existing files (such as timelapse), default False.')
+    parser.add_argument('--max_workers', default=None, type=int,
+                        help='Number of processes compressing FITS files, default number of CPUs.')
+    parser.add_argument('--max_rate', default=None, type=float,
+                        help='Upload rate limit in bytes per second, default from the config.')
     parser.add_argument('--verbose', action='store_true', default=False, help='Verbose.')
 
     args = parser.parse_args()